@@ -21,10 +21,16 @@ export const API_CONFIG = {
     TEST_CONNECTION: '/auth/test/',
     // Location endpoints
     UPDATE_LOCATION: '/locations/update-location/',
+    UPDATE_LOCATION_BATCH: '/locations/update-location/batch/',
     DRIVER_LOCATION: '/locations/driver-location/',
     VAN_LOCATION: '/locations/van-location/',
     LOCATION_HISTORY: '/locations/location-history/',
     TOGGLE_GPS: '/locations/toggle-gps/',
+    TRACKING_POLICY: '/locations/tracking-policy/',
+    // Notification endpoints
+    REGISTER_DEVICE: '/notifications/register-device/',
+    UNREGISTER_DEVICE: '/notifications/unregister-device/',
+    ARRIVED_AT_SCHOOL: '/notifications/arrived-at-school/',
   },
 };
 
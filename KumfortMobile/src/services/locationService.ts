@@ -1,6 +1,7 @@
 import { Platform, Alert, Linking } from 'react-native';
 import * as Location from 'expo-location';
 import { getApiUrl } from '../config/api';
+import { encodePoints, POINTS_MEDIA_TYPE } from './pointCodec';
 
 export interface LocationData {
   latitude: number;
@@ -11,10 +12,42 @@ export interface LocationData {
   altitude?: number;
 }
 
+// Upload policy decided by the server from speed, nearby stops and schedule
+export interface TrackingPolicy {
+  tracking_enabled: boolean;
+  mode: 'disabled' | 'off_shift' | 'parked' | 'approaching_stop' | 'moving';
+  interval_seconds: number;
+  distance_filter_meters: number;
+}
+
+// Matches LOCATION_BATCH_MAX_POINTS on the server
+const MAX_PENDING_POINTS = 500;
+
+const DEFAULT_POLICY: TrackingPolicy = {
+  tracking_enabled: true,
+  mode: 'moving',
+  interval_seconds: 30,
+  distance_filter_meters: 10,
+};
+
+// GPS accuracy per policy mode; a parked or off-shift van doesn't need the
+// high-power fix
+const MODE_ACCURACY: Record<TrackingPolicy['mode'], Location.Accuracy> = {
+  moving: Location.Accuracy.High,
+  approaching_stop: Location.Accuracy.High,
+  parked: Location.Accuracy.Balanced,
+  off_shift: Location.Accuracy.Low,
+  disabled: Location.Accuracy.Lowest,
+};
+
 class LocationService {
   private watchId: Location.LocationSubscription | null = null;
   private isTracking = false;
-  private updateInterval: NodeJS.Timeout | null = null;
+  private updateTimeout: NodeJS.Timeout | null = null;
+  private policy: TrackingPolicy = DEFAULT_POLICY;
+  private onLocationUpdate: ((location: LocationData) => void) | null = null;
+  // Points that failed to upload, sent together with the next one
+  private pendingPoints: object[] = [];
 
   async requestPermissions(): Promise<boolean> {
     try {
@@ -49,7 +82,7 @@ class LocationService {
   async getCurrentLocation(): Promise<LocationData | null> {
     try {
       const location = await Location.getCurrentPositionAsync({
-        accuracy: Location.Accuracy.High,
+        accuracy: MODE_ACCURACY[this.policy.mode] ?? Location.Accuracy.High,
         timeInterval: 1000,
       });
 
@@ -84,34 +117,11 @@ class LocationService {
       }
 
       this.isTracking = true;
+      this.onLocationUpdate = onLocationUpdate;
 
-      // Start watching position changes
-      this.watchId = await Location.watchPositionAsync(
-        {
-          accuracy: Location.Accuracy.High,
-          timeInterval: 10000, // Update every 10 seconds
-          distanceInterval: 10, // Update every 10 meters
-        },
-        (location) => {
-          const locationData: LocationData = {
-            latitude: location.coords.latitude,
-            longitude: location.coords.longitude,
-            accuracy: location.coords.accuracy,
-            speed: location.coords.speed,
-            heading: location.coords.heading,
-            altitude: location.coords.altitude,
-          };
-          onLocationUpdate(locationData);
-        }
-      );
-
-      // Also send periodic updates to server
-      this.updateInterval = setInterval(async () => {
-        const location = await this.getCurrentLocation();
-        if (location) {
-          await this.sendLocationToServer(location);
-        }
-      }, 30000); // Send to server every 30 seconds
+      // Watch the GPS and send updates to the server at the rate the server asks for
+      await this.applyPolicy((await this.fetchTrackingPolicy()) || DEFAULT_POLICY, true);
+      this.scheduleNextUpload();
 
       return true;
     } catch (error) {
@@ -126,33 +136,138 @@ class LocationService {
       this.watchId.remove();
       this.watchId = null;
     }
+    this.onLocationUpdate = null;
 
-    if (this.updateInterval) {
-      clearInterval(this.updateInterval);
-      this.updateInterval = null;
+    if (this.updateTimeout) {
+      clearTimeout(this.updateTimeout);
+      this.updateTimeout = null;
     }
 
     this.isTracking = false;
   }
 
+  // Adopt a new policy, re-subscribing the GPS watcher when its rate or
+  // accuracy changes so the phone actually samples less when parked
+  private async applyPolicy(policy: TrackingPolicy, force = false): Promise<void> {
+    const previous = this.policy;
+    this.policy = policy;
+    const changed =
+      force ||
+      previous.interval_seconds !== policy.interval_seconds ||
+      previous.distance_filter_meters !== policy.distance_filter_meters ||
+      MODE_ACCURACY[previous.mode] !== MODE_ACCURACY[policy.mode];
+    if (!changed || !this.isTracking || !this.onLocationUpdate) {
+      return;
+    }
+
+    const onLocationUpdate = this.onLocationUpdate;
+    const subscription = await Location.watchPositionAsync(
+      {
+        accuracy: MODE_ACCURACY[policy.mode] ?? Location.Accuracy.High,
+        timeInterval: policy.interval_seconds * 1000,
+        distanceInterval: policy.distance_filter_meters,
+      },
+      (location) => {
+        const locationData: LocationData = {
+          latitude: location.coords.latitude,
+          longitude: location.coords.longitude,
+          accuracy: location.coords.accuracy,
+          speed: location.coords.speed,
+          heading: location.coords.heading,
+          altitude: location.coords.altitude,
+        };
+        onLocationUpdate(locationData);
+      }
+    );
+    // Tracking may have stopped while subscribing
+    if (!this.isTracking) {
+      subscription.remove();
+      return;
+    }
+    this.watchId?.remove();
+    this.watchId = subscription;
+  }
+
+  private scheduleNextUpload(): void {
+    if (!this.isTracking) {
+      return;
+    }
+
+    this.updateTimeout = setTimeout(async () => {
+      if (this.policy.tracking_enabled) {
+        const location = await this.getCurrentLocation();
+        if (location) {
+          await this.sendLocationToServer(location);
+        }
+      } else {
+        await this.applyPolicy((await this.fetchTrackingPolicy()) || this.policy);
+      }
+      this.scheduleNextUpload();
+    }, this.policy.interval_seconds * 1000);
+  }
+
+  private async fetchTrackingPolicy(): Promise<TrackingPolicy | null> {
+    try {
+      const response = await fetch(getApiUrl('/locations/tracking-policy/'), {
+        headers: {
+          'Authorization': `Token ${await this.getAuthToken()}`,
+        },
+      });
+      if (!response.ok) {
+        return null;
+      }
+      const data = await response.json();
+      return data.policy || null;
+    } catch (error) {
+      console.error('Error fetching tracking policy:', error);
+      return null;
+    }
+  }
+
   private async sendLocationToServer(location: LocationData): Promise<void> {
+    // Stamp the point now so a retry or a late upload keeps its real time and
+    // is stored only once by the server
+    const point = {
+      ...location,
+      recorded_at: new Date().toISOString(),
+      idempotency_key: `${Date.now()}-${Math.random().toString(36).slice(2, 10)}`,
+    };
+    const points = [...this.pendingPoints, point].slice(-MAX_PENDING_POINTS);
+
     try {
-      const apiUrl = getApiUrl('/locations/update-location/');
+      const isBatch = points.length > 1;
+      const apiUrl = isBatch
+        ? getApiUrl('/locations/update-location/batch/')
+        : getApiUrl('/locations/update-location/');
+      // Buffered batches go in the compact binary format, about a tenth of the JSON size
       const response = await fetch(apiUrl, {
         method: 'POST',
         headers: {
-          'Content-Type': 'application/json',
+          'Content-Type': isBatch ? POINTS_MEDIA_TYPE : 'application/json',
+          'Accept': 'application/json',
           'Authorization': `Token ${await this.getAuthToken()}`,
         },
-        body: JSON.stringify(location),
+        body: isBatch
+          ? encodePoints(points.map((p: any) => ({ ...p, timestamp: p.recorded_at })))
+          : JSON.stringify(point),
       });
 
       if (!response.ok) {
         const errorData = await response.json();
         console.error('Failed to send location to server:', errorData);
+        // Keep the points for the next upload unless the server rejected them
+        this.pendingPoints = response.status >= 500 ? points : [];
+        return;
+      }
+
+      this.pendingPoints = [];
+      const data = await response.json();
+      if (data.policy) {
+        await this.applyPolicy(data.policy);
       }
     } catch (error) {
       console.error('Error sending location to server:', error);
+      this.pendingPoints = points;
     }
   }
 
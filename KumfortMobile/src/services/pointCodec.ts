@@ -0,0 +1,160 @@
+// Compact binary encoding of GPS points, the "application/vnd.kumfort.points"
+// format decoded by locations/wire.py on the server. Points are stored column
+// by column as zigzag varint deltas of scaled integers, and idempotency keys
+// are front-coded, so a buffered batch is about a tenth the size of its JSON.
+
+export const POINTS_MEDIA_TYPE = 'application/vnd.kumfort.points';
+
+const VERSION = 1;
+
+// Same order and scales as FIELDS in locations/wire.py
+const FIELDS: { name: string; scale: number | null }[] = [
+  { name: 'id', scale: 1 },
+  { name: 'timestamp', scale: 1000 },
+  { name: 'latitude', scale: 1e6 },
+  { name: 'longitude', scale: 1e6 },
+  { name: 'accuracy', scale: 10 },
+  { name: 'speed', scale: 10 },
+  { name: 'heading', scale: 10 },
+  { name: 'altitude', scale: 10 },
+  { name: 'dwell_seconds', scale: 1 },
+  { name: 'idempotency_key', scale: null },
+];
+
+// Plain arithmetic instead of bit operators: millisecond times need more than 32 bits
+const writeVarint = (out: number[], value: number): void => {
+  while (value > 0x7f) {
+    out.push((value % 128) + 0x80);
+    value = Math.floor(value / 128);
+  }
+  out.push(value);
+};
+
+const readVarint = (data: Uint8Array, position: { offset: number }): number => {
+  let result = 0;
+  let multiplier = 1;
+  for (;;) {
+    if (position.offset >= data.length) {
+      throw new Error('Unexpected end of points payload');
+    }
+    const byte = data[position.offset++];
+    result += (byte & 0x7f) * multiplier;
+    if (byte < 0x80) {
+      return result;
+    }
+    multiplier *= 128;
+  }
+};
+
+const zigzag = (value: number): number => (value >= 0 ? value * 2 : -value * 2 - 1);
+const unzigzag = (value: number): number => (value % 2 === 0 ? value / 2 : -(value + 1) / 2);
+
+const toMillis = (value: unknown): number => {
+  if (typeof value === 'string') {
+    return Date.parse(value);
+  }
+  const number = Number(value);
+  // Seconds or milliseconds, like the server accepts
+  return Math.round(number > 1e11 ? number : number * 1000);
+};
+
+const utf8 = (text: string): number[] => Array.from(unescape(encodeURIComponent(text)), (c) => c.charCodeAt(0));
+const fromUtf8 = (bytes: Uint8Array): string => decodeURIComponent(escape(String.fromCharCode(...bytes)));
+
+export const encodePoints = (points: Record<string, any>[]): Uint8Array => {
+  const out: number[] = [0x4b, 0x50, VERSION]; // "KP"
+  const columns: number[] = [];
+  let mask = 0;
+
+  FIELDS.forEach((field, bit) => {
+    const present = points.map((point) => point[field.name] !== undefined && point[field.name] !== null);
+    if (!present.some(Boolean)) {
+      return;
+    }
+    mask += 2 ** bit;
+
+    const payload: number[] = [];
+    const values = points.filter((_, i) => present[i]).map((point) => point[field.name]);
+    if (field.scale === null) {
+      let previous: number[] = [];
+      for (const value of values) {
+        const key = utf8(String(value));
+        let shared = 0;
+        while (shared < key.length && shared < previous.length && key[shared] === previous[shared]) {
+          shared++;
+        }
+        writeVarint(payload, shared);
+        writeVarint(payload, key.length - shared);
+        payload.push(...key.slice(shared));
+        previous = key;
+      }
+    } else {
+      let previous = 0;
+      for (const value of values) {
+        const scaled = field.name === 'timestamp' ? toMillis(value) : Math.round(Number(value) * field.scale);
+        writeVarint(payload, zigzag(scaled - previous));
+        previous = scaled;
+      }
+    }
+
+    if (present.every(Boolean)) {
+      columns.push(0);
+    } else {
+      columns.push(1);
+      for (let i = 0; i < points.length; i += 8) {
+        let byte = 0;
+        present.slice(i, i + 8).forEach((isPresent, j) => {
+          byte |= isPresent ? 1 << j : 0;
+        });
+        columns.push(byte);
+      }
+    }
+    writeVarint(columns, payload.length);
+    columns.push(...payload);
+  });
+
+  writeVarint(out, points.length);
+  writeVarint(out, mask);
+  return Uint8Array.from([...out, ...columns]);
+};
+
+export const decodePoints = (data: Uint8Array): Record<string, any>[] => {
+  if (data[0] !== 0x4b || data[1] !== 0x50 || data[2] !== VERSION) {
+    throw new Error('Not a points payload');
+  }
+  const position = { offset: 3 };
+  const count = readVarint(data, position);
+  const mask = readVarint(data, position);
+  const points: Record<string, any>[] = Array.from({ length: count }, () => ({}));
+
+  FIELDS.forEach((field, bit) => {
+    if (Math.floor(mask / 2 ** bit) % 2 === 0) {
+      return;
+    }
+    let rows = points.map((_, i) => i);
+    if (readVarint(data, position)) {
+      const bitmap = data.slice(position.offset, position.offset + Math.ceil(count / 8));
+      position.offset += bitmap.length;
+      rows = rows.filter((i) => bitmap[i >> 3] & (1 << (i & 7)));
+    }
+    const end = readVarint(data, position) + position.offset;
+
+    let previousKey = new Uint8Array(0);
+    let previous = 0;
+    for (const row of rows) {
+      if (field.scale === null) {
+        const shared = readVarint(data, position);
+        const size = readVarint(data, position);
+        const key = new Uint8Array([...previousKey.slice(0, shared), ...data.slice(position.offset, position.offset + size)]);
+        position.offset += size;
+        points[row][field.name] = fromUtf8(key);
+        previousKey = key;
+      } else {
+        previous += unzigzag(readVarint(data, position));
+        points[row][field.name] = previous / field.scale;
+      }
+    }
+    position.offset = end;
+  });
+  return points;
+};
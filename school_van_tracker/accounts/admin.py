@@ -1,17 +1,28 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User, OTPVerification
+from school_van_tracker.admin_utils import LargeTableAdminMixin
+from .models import School, User, OTPVerification
+
+
+@admin.register(School)
+class SchoolAdmin(admin.ModelAdmin):
+    list_display = ('name', 'slug', 'database', 'is_active', 'created_at')
+    list_filter = ('is_active', 'database')
+    search_fields = ('name', 'slug')
+    prepopulated_fields = {'slug': ('name',)}
+    # Moving a school's data needs `manage.py move_school`, not an edit here
+    readonly_fields = ('database', 'created_at', 'updated_at')
 
 @admin.register(User)
 class CustomUserAdmin(UserAdmin):
-    list_display = ('phone_number', 'user_type', 'first_name', 'last_name', 'is_active', 'created_at')
-    list_filter = ('user_type', 'is_active', 'is_staff', 'created_at')
+    list_display = ('phone_number', 'user_type', 'first_name', 'last_name', 'school', 'is_active', 'created_at')
+    list_filter = ('user_type', 'school', 'is_active', 'is_staff', 'created_at')
     search_fields = ('phone_number', 'first_name', 'last_name')
     ordering = ('-created_at',)
     
     fieldsets = (
         (None, {'fields': ('phone_number', 'password')}),
-        ('Personal info', {'fields': ('first_name', 'last_name', 'address', 'emergency_contact')}),
+        ('Personal info', {'fields': ('first_name', 'last_name', 'school', 'address', 'emergency_contact')}),
         ('Permissions', {'fields': ('is_active', 'is_staff', 'is_superuser', 'user_type')}),
         ('Important dates', {'fields': ('last_login', 'created_at', 'updated_at')}),
     )
@@ -24,9 +35,10 @@ class CustomUserAdmin(UserAdmin):
     )
 
 @admin.register(OTPVerification)
-class OTPVerificationAdmin(admin.ModelAdmin):
+class OTPVerificationAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('phone_number', 'otp_code', 'is_verified', 'attempts', 'created_at', 'expires_at')
-    list_filter = ('is_verified', 'created_at')
-    search_fields = ('phone_number',)
+    list_filter = ('is_verified',)
+    date_hierarchy = 'created_at'
+    prefix_search_fields = ('phone_number',)
     readonly_fields = ('otp_code', 'created_at', 'expires_at')
     ordering = ('-created_at',)
@@ -0,0 +1,58 @@
+"""
+Token authentication with a short-lived cache in front of the token lookup.
+
+Drivers post locations every few seconds and parents poll van positions, so
+the token -> user join DRF runs on every request adds up. Lookups are cached
+for ``AUTH_TOKEN_CACHE_TTL`` seconds and dropped when the token is deleted
+(logout) or the user is saved (see ``accounts.signals``).
+
+The authenticated user's school becomes the current school for the request
+(see ``school_van_tracker.tenancy``).
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from school_van_tracker.tenancy import activate_school
+
+
+def token_cache_key(key):
+    return f"auth:token:{hashlib.sha256(key.encode()).hexdigest()}"
+
+
+def user_token_cache_key(user_id):
+    return f"auth:user-token:{user_id}"
+
+
+def invalidate_token(key):
+    cache.delete(token_cache_key(key))
+
+
+def invalidate_user(user_id):
+    key = cache.get(user_token_cache_key(user_id))
+    if key:
+        cache.delete_many([token_cache_key(key), user_token_cache_key(user_id)])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        user, token = self._authenticate_credentials(key)
+        # Route the request's location reads and writes to the user's school
+        activate_school(user.school_id)
+        return (user, token)
+
+    def _authenticate_credentials(self, key):
+        user = cache.get(token_cache_key(key))
+        if user is not None:
+            return (user, Token(key=key, user=user))
+
+        user, token = super().authenticate_credentials(key)
+        ttl = settings.AUTH_TOKEN_CACHE_TTL
+        cache.set_many({
+            token_cache_key(key): user,
+            user_token_cache_key(user.pk): key,
+        }, timeout=ttl)
+        return (user, token)
@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.checks import Error, Warning, register
+from django.utils.module_loading import import_string
+
+from school_van_tracker.cache_utils import is_process_local_cache
+
+from .otp_store import CacheOTPStore
+
+
+@register()
+def check_otp_store(app_configs, **kwargs):
+    """A cache-stored OTP must be visible to the worker that verifies it"""
+    if issubclass(import_string(settings.OTP_STORE), CacheOTPStore) and is_process_local_cache():
+        return [
+            Error(
+                "OTP_STORE keeps codes in a per-process cache, so an OTP sent by one worker "
+                "is missing on the worker that verifies it.",
+                hint="Set REDIS_URL, or use accounts.otp_store.DatabaseOTPStore.",
+                id="accounts.E001",
+            )
+        ]
+    return []
+
+
+@register()
+def check_rate_limit_cache(app_configs, **kwargs):
+    """Rate-limit counters must be shared by every worker to hold across them"""
+    if settings.RATE_LIMIT_ENABLED and settings.RATE_LIMITS and is_process_local_cache():
+        return [
+            Warning(
+                "Rate limits are counted in a per-process cache, so each worker enforces its own "
+                "limits and a client spread over N workers gets N times the allowance.",
+                hint="Set REDIS_URL.",
+                id="accounts.W001",
+            )
+        ]
+    return []
@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from accounts.models import OTPVerification
+
+
+class Command(BaseCommand):
+    help = "Delete expired and verified OTP rows older than the retention window, in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--retention-hours",
+            type=float,
+            default=settings.OTP_RETENTION_HOURS,
+            help="Keep rows newer than this many hours (default: OTP_RETENTION_HOURS)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.OTP_PURGE_BATCH_SIZE,
+            help="Rows deleted per statement (default: OTP_PURGE_BATCH_SIZE)",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0,
+            help="Seconds to pause between batches to let other writers in",
+        )
+
+    def handle(self, *args, **options):
+        deleted = OTPVerification.purge_stale(
+            retention=timezone.timedelta(hours=options["retention_hours"]),
+            batch_size=options["batch_size"],
+            sleep=options["sleep"],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} stale OTP rows"))
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.1 on 2026-10-19 00:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0002_alter_user_user_type"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="otpverification",
+            index=models.Index(
+                fields=["phone_number", "-created_at"],
+                name="accounts_ot_phone_n_2a8efa_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="otpverification",
+            index=models.Index(
+                fields=["created_at"], name="accounts_ot_created_dffff8_idx"
+            ),
+        ),
+    ]
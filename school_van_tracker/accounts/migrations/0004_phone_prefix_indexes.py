@@ -0,0 +1,37 @@
+# Generated by Django 5.1.1 on 2026-10-19 01:08
+
+from django.db import migrations
+
+# Postgres can only use an index for LIKE 'prefix%' under the C collation or
+# with the pattern operator class. Other databases are left alone.
+PREFIX_INDEXES = [
+    ("accounts_user_phone_prefix", "accounts_user"),
+    ("accounts_otp_phone_prefix", "accounts_otpverification"),
+]
+
+
+def create_prefix_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, table in PREFIX_INDEXES:
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {name} ON {table} (phone_number varchar_pattern_ops)"
+        )
+
+
+def drop_prefix_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, _ in PREFIX_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0003_otpverification_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_prefix_indexes, drop_prefix_indexes),
+    ]
@@ -1,9 +1,33 @@
+from django.conf import settings
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin
 from django.db import models
 from phonenumber_field.modelfields import PhoneNumberField
 from django.utils import timezone
 import random
 import string
+import time
+
+class School(models.Model):
+    """
+    A school and its data: vans, children and location history.
+    ``database`` is the alias its high-volume tables live on (see
+    school_van_tracker.tenancy).
+    """
+    name = models.CharField(max_length=200)
+    slug = models.SlugField(max_length=50, unique=True)
+    database = models.CharField(
+        max_length=50, default="default",
+        help_text="Database alias holding this school's locations and rollups"
+    )
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ["name"]
+    
+    def __str__(self):
+        return self.name
 
 class User(AbstractBaseUser, PermissionsMixin):
     # Production-ready user types for school van tracking system
@@ -19,6 +43,11 @@ class User(AbstractBaseUser, PermissionsMixin):
     last_name = models.CharField(max_length=30, blank=True)
     address = models.TextField(blank=True, null=True)
     emergency_contact = PhoneNumberField(blank=True, null=True)
+    # The school a driver or staff member works for; parents' children can
+    # be at several schools, see ChildVanAssignment.school
+    school = models.ForeignKey(
+        School, on_delete=models.SET_NULL, null=True, blank=True, related_name="users"
+    )
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
     is_superuser = models.BooleanField(default=False)
@@ -47,11 +76,45 @@ class OTPVerification(models.Model):
     
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["phone_number", "-created_at"]),
+            models.Index(fields=["created_at"]),
+        ]
+    
+    @classmethod
+    def purge_stale(cls, retention=None, batch_size=None, sleep=0):
+        """
+        Delete expired and verified OTPs older than the retention window in
+        batches, so a large backlog never holds a long lock on the table.
+        Returns the number of rows deleted.
+        """
+        if retention is None:
+            retention = timezone.timedelta(hours=settings.OTP_RETENTION_HOURS)
+        batch_size = batch_size or settings.OTP_PURGE_BATCH_SIZE
+        
+        cutoff = timezone.now() - retention
+        expired_cutoff = cutoff - timezone.timedelta(minutes=settings.OTP_EXPIRY_MINUTES)
+        stale = cls.objects.filter(
+            models.Q(created_at__lt=expired_cutoff) |
+            models.Q(is_verified=True, created_at__lt=cutoff)
+        ).order_by()
+        
+        total = 0
+        while True:
+            pks = list(stale.values_list("pk", flat=True)[:batch_size])
+            if not pks:
+                return total
+            deleted, _ = cls.objects.filter(pk__in=pks).delete()
+            total += deleted
+            if sleep:
+                time.sleep(sleep)
     
     def save(self, *args, **kwargs):
         if not self.pk:
-            self.otp_code = self.generate_otp()
-            self.expires_at = timezone.now() + timezone.timedelta(minutes=10)
+            if not self.otp_code:
+                self.otp_code = self.generate_otp()
+            if not self.expires_at:
+                self.expires_at = timezone.now() + timezone.timedelta(minutes=settings.OTP_EXPIRY_MINUTES)
         super().save(*args, **kwargs)
     
     def generate_otp(self):
@@ -61,7 +124,7 @@ class OTPVerification(models.Model):
         return timezone.now() > self.expires_at
     
     def is_valid(self):
-        return not self.is_expired() and not self.is_verified and self.attempts < 3
+        return not self.is_expired() and not self.is_verified and self.attempts < settings.OTP_MAX_ATTEMPTS
     
     def __str__(self):
         return f"OTP for {self.phone_number}: {self.otp_code}"
@@ -0,0 +1,145 @@
+"""
+Storage backends for OTP codes.
+
+``CacheOTPStore`` (the default with a shared cache) keeps the live code in the
+cache and counts verification attempts with atomic ``incr``, so issuing and
+checking an OTP never writes to the database. The entry outlives the code by
+another expiry period, so a late attempt is told the code expired. A new
+code starts with a fresh attempt count; guessing across resends is bounded
+by the send-otp rate limit.
+
+``DatabaseOTPStore`` keeps the original ``OTPVerification`` table behaviour
+and is the default when the cache is per process (LocMem), where a code
+issued by one worker would be missing on the next. With ``OTP_AUDIT_DB``
+enabled the cache store also records each OTP in ``OTPVerification`` as an
+audit trail.
+"""
+import secrets
+import string
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+from phonenumber_field.phonenumber import to_python
+
+from .models import OTPVerification
+
+VERIFIED = "verified"
+INVALID = "invalid"
+EXPIRED = "expired"
+TOO_MANY_ATTEMPTS = "too_many_attempts"
+
+
+def generate_otp_code():
+    return "".join(secrets.choice(string.digits) for _ in range(settings.OTP_LENGTH))
+
+
+def normalize_phone(phone_number):
+    """E.164 for a valid number, else the input without whitespace"""
+    number = to_python(phone_number)
+    if number and number.is_valid():
+        return number.as_e164
+    return "".join(str(phone_number).split())
+
+
+class BaseOTPStore:
+    """Interface every OTP store implements"""
+
+    def issue(self, phone_number):
+        """Create a new OTP for ``phone_number``, replacing any previous one. Returns the code."""
+        raise NotImplementedError
+
+    def verify(self, phone_number, otp_code):
+        """Check ``otp_code`` and consume it on success. Returns one of the status constants."""
+        raise NotImplementedError
+
+
+class CacheOTPStore(BaseOTPStore):
+    """OTP codes in the cache, expiring on their own"""
+
+    def _code_key(self, phone_number):
+        return f"otp:code:{normalize_phone(phone_number)}"
+
+    def _attempts_key(self, phone_number):
+        return f"otp:attempts:{normalize_phone(phone_number)}"
+
+    def issue(self, phone_number):
+        code = generate_otp_code()
+        expiry = settings.OTP_EXPIRY_MINUTES * 60
+        # Kept for a second expiry period to tell "expired" from "wrong"
+        cache.set_many({
+            self._code_key(phone_number): (code, time.time() + expiry),
+            self._attempts_key(phone_number): 0,
+        }, timeout=2 * expiry)
+
+        if settings.OTP_AUDIT_DB:
+            OTPVerification.objects.create(phone_number=phone_number, otp_code=code)
+        return code
+
+    def verify(self, phone_number, otp_code):
+        code_key = self._code_key(phone_number)
+        stored = cache.get(code_key)
+        if stored is None:
+            return INVALID
+        stored_code, expires_at = stored
+        if time.time() > expires_at:
+            return EXPIRED
+
+        try:
+            attempts = cache.incr(self._attempts_key(phone_number))
+        except ValueError:
+            # Attempts counter expired together with the code
+            return INVALID
+        if attempts > settings.OTP_MAX_ATTEMPTS:
+            return TOO_MANY_ATTEMPTS
+
+        if not secrets.compare_digest(str(stored_code), str(otp_code)):
+            return INVALID
+
+        # delete() reports whether the key was still there, so two concurrent
+        # requests with the right code can't both log in
+        if not cache.delete(code_key):
+            return INVALID
+        cache.delete(self._attempts_key(phone_number))
+
+        if settings.OTP_AUDIT_DB:
+            OTPVerification.objects.filter(
+                phone_number=phone_number,
+                otp_code=otp_code,
+                is_verified=False
+            ).update(is_verified=True, attempts=attempts)
+        return VERIFIED
+
+
+class DatabaseOTPStore(BaseOTPStore):
+    """OTP codes as OTPVerification rows"""
+
+    def issue(self, phone_number):
+        return OTPVerification.objects.create(phone_number=phone_number).otp_code
+
+    def verify(self, phone_number, otp_code):
+        otp_verification = OTPVerification.objects.filter(
+            phone_number=phone_number,
+            otp_code=otp_code,
+            is_verified=False
+        ).first()
+        if otp_verification is None:
+            return INVALID
+
+        if not otp_verification.is_valid():
+            otp_verification.attempts += 1
+            otp_verification.save(update_fields=["attempts"])
+            if otp_verification.is_expired():
+                return EXPIRED
+            if otp_verification.attempts >= settings.OTP_MAX_ATTEMPTS:
+                return TOO_MANY_ATTEMPTS
+            return INVALID
+
+        otp_verification.is_verified = True
+        otp_verification.save(update_fields=["is_verified"])
+        return VERIFIED
+
+
+def get_otp_store():
+    return import_string(settings.OTP_STORE)()
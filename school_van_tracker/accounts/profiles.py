@@ -0,0 +1,71 @@
+"""
+Profile serialization and cached "is this number registered?" lookups.
+
+``profile/`` is served from ``request.user``, which token authentication
+already caches (``accounts.authentication``), so it needs no cache of its
+own.
+
+The login screen calls ``check-user/`` as the phone number is typed.
+Answers are cached by phone number, and unknown numbers are cached too (a
+negative entry) for ``missing_seconds``. Saving or deleting a user
+(``accounts.signals``) drops the entries for its current and previous
+number, so a number registered through ``send-otp/`` is found at once.
+
+Changes made with ``QuerySet.update()`` skip the signals and show up when
+the entries expire (``PROFILE_CACHE``). Invalidation only reaches other
+workers through a shared cache, so with a per-process cache (LocMem) the
+TTLs default to a minute.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import User
+from .otp_store import normalize_phone
+
+# Cached for numbers with no account
+MISSING = "missing"
+
+
+def phone_cache_key(phone_number):
+    # The same number typed with or without spaces shares an entry
+    normalized = normalize_phone(phone_number)
+    return f"accounts:phone:{hashlib.sha256(normalized.encode()).hexdigest()}"
+
+
+def serialize_profile(user):
+    return {
+        "id": user.id,
+        "phone_number": str(user.phone_number),
+        "user_type": user.user_type,
+        "first_name": user.first_name,
+        "last_name": user.last_name,
+        "address": user.address,
+        "emergency_contact": str(user.emergency_contact) if user.emergency_contact else None,
+        "created_at": user.created_at,
+        "is_active": user.is_active,
+    }
+
+
+def lookup_phone(phone_number):
+    """check-user/ fields for the user with ``phone_number``, or None if there is none"""
+    key = phone_cache_key(phone_number)
+    summary = cache.get(key)
+    if summary is None:
+        user = User.objects.filter(phone_number=phone_number).first()
+        if user is None:
+            cache.set(key, MISSING, settings.PROFILE_CACHE["missing_seconds"])
+            return None
+        summary = {
+            "user_type": user.user_type,
+            "first_name": user.first_name,
+            "last_name": user.last_name,
+            "is_active": user.is_active,
+        }
+        cache.set(key, summary, settings.PROFILE_CACHE["seconds"])
+    return None if summary == MISSING else summary
+
+
+def invalidate_phone(phone_number):
+    cache.delete(phone_cache_key(phone_number))
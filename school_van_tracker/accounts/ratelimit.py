@@ -0,0 +1,195 @@
+"""
+Cache-backed sliding-window rate limiting for the public auth endpoints.
+
+Limits live in ``settings.RATE_LIMITS`` keyed by endpoint scope, with separate
+rates per phone number and per client IP, e.g.::
+
+    RATE_LIMITS = {
+        "send_otp": {"phone": "1/60s", "ip": "10/10m"},
+    }
+
+Limits of up to ``SLIDING_LOG_MAX_LIMIT`` requests keep an exact sliding
+log: the times of the accepted requests inside the window, under a short
+``add()`` lock so concurrent requests can't both take the last slot. "1/60s"
+then means one request per 60 seconds, not up to two windows' worth.
+
+Larger limits use the sliding-window-counter approximation: two fixed
+windows in the cache, the previous one weighted by how much of it still
+overlaps, updated with atomic ``incr``.
+
+Either way a check is a few cache round trips and never touches the
+database. Every response of a limited view carries ``Retry-After``: the
+seconds until the client may send the next request (0 when it may now).
+
+The counters are only shared between workers through a shared cache; with
+a per-process cache (LocMem) each worker enforces its own limits
+(``accounts.W001``).
+"""
+import math
+import re
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+from .otp_store import normalize_phone
+
+_PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+_RATE_RE = re.compile(r"^\s*(\d+)\s*/\s*(\d*)\s*([smhd])\s*$")
+
+# Limits up to this many requests per window use the exact sliding log
+SLIDING_LOG_MAX_LIMIT = 10
+# Tries at the sliding log's lock before the request is turned away
+_LOCK_TRIES = 20
+
+
+def parse_rate(rate):
+    """Parse '5/m', '1/60s' or '10/10m' into (limit, window_seconds)"""
+    match = _RATE_RE.match(rate)
+    if not match:
+        raise ValueError(f"Invalid rate limit: {rate!r}")
+    limit, multiplier, unit = match.groups()
+    return int(limit), int(multiplier or 1) * _PERIODS[unit]
+
+
+def hit(key, limit, window, now=None):
+    """
+    Record one request against ``key``.
+
+    Returns (allowed, retry_after_seconds): whether this request is allowed,
+    and how long until the next one would be. Rejected requests are not
+    counted, so a client that backs off for ``retry_after`` seconds gets
+    through.
+    """
+    now = time.time() if now is None else now
+    if limit <= SLIDING_LOG_MAX_LIMIT:
+        return _hit_log(key, limit, window, now)
+    return _hit_counter(key, limit, window, now)
+
+
+def _hit_log(key, limit, window, now):
+    log_key = f"ratelimit:{key}:log"
+    lock_key = f"ratelimit:{key}:lock"
+    for _ in range(_LOCK_TRIES):
+        if cache.add(lock_key, 1, timeout=5):
+            break
+        time.sleep(0.005)
+    else:
+        # Another request for the same key holds the lock; turn this one away
+        return False, 1
+    try:
+        log = [stamp for stamp in cache.get(log_key, []) if stamp > now - window]
+        allowed = len(log) < limit
+        if allowed:
+            log.append(now)
+            cache.set(log_key, log, timeout=math.ceil(window))
+    finally:
+        cache.delete(lock_key)
+    if len(log) < limit:
+        return allowed, 0
+    # The oldest request in the window has to slide out first
+    return allowed, max(1, math.ceil(log[-limit] + window - now))
+
+
+def _hit_counter(key, limit, window, now):
+    current_window = int(now // window)
+    elapsed = now - current_window * window
+    current_key = f"ratelimit:{key}:{current_window}"
+    previous_key = f"ratelimit:{key}:{current_window - 1}"
+
+    cache.add(current_key, 0, timeout=window * 2)
+    try:
+        current = cache.incr(current_key)
+    except ValueError:
+        # Key expired between add() and incr()
+        cache.set(current_key, 1, timeout=window * 2)
+        current = 1
+    previous = cache.get(previous_key, 0)
+
+    weight = 1 - elapsed / window
+    if previous * weight + current <= limit:
+        if previous * weight + current + 1 <= limit:
+            return True, 0
+        return True, _retry_after(previous, current, limit, window, elapsed)
+
+    try:
+        cache.decr(current_key)
+    except ValueError:
+        pass
+    return False, _retry_after(previous, current - 1, limit, window, elapsed)
+
+
+def _retry_after(previous, current, limit, window, elapsed):
+    """Seconds until one more request fits under the sliding window"""
+    if current < limit and previous:
+        # Wait for enough of the previous window to slide out
+        wait = window * (1 - (limit - current - 1) / previous) - elapsed
+    else:
+        # Current window is full; it becomes the weighted previous window
+        wait = (window - elapsed) + window * max(0, 1 - (limit - 1) / max(current, 1))
+    return max(1, math.ceil(wait))
+
+
+def get_client_ip(request):
+    """
+    The client address from ``RATE_LIMIT_IP_HEADER``. In X-Forwarded-For each
+    proxy appends the address it got the request from, and the client can
+    put anything before that, so the entry taken is the one added by the
+    outermost of the ``RATE_LIMIT_PROXY_HOPS`` trusted proxies.
+    """
+    value = request.META.get(settings.RATE_LIMIT_IP_HEADER) or request.META.get("REMOTE_ADDR", "")
+    entries = [entry.strip() for entry in value.split(",") if entry.strip()]
+    if not entries:
+        return "unknown"
+    return entries[-min(max(settings.RATE_LIMIT_PROXY_HOPS, 1), len(entries))]
+
+
+def get_phone_key(request):
+    phone_number = request.data.get("phone_number") if hasattr(request, "data") else None
+    if not phone_number:
+        return None
+    # "+91 98765 43210" and "+919876543210" share a limit
+    return normalize_phone(phone_number)
+
+
+def rate_limit(scope):
+    """
+    Reject requests over the configured limits for ``scope`` with a 429.
+    Every response gets a ``Retry-After`` header with the seconds until the
+    next request is allowed. Place it below ``@api_view`` so
+    ``request.data`` is available.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if not settings.RATE_LIMIT_ENABLED:
+                return view_func(request, *args, **kwargs)
+
+            limits = settings.RATE_LIMITS.get(scope, {})
+            identities = {
+                "ip": get_client_ip(request),
+                "phone": get_phone_key(request),
+            }
+            next_allowed = 0
+            for kind, rate in limits.items():
+                identity = identities.get(kind)
+                if not identity:
+                    continue
+                limit, window = parse_rate(rate)
+                allowed, retry_after = hit(f"{scope}:{kind}:{identity}", limit, window)
+                if not allowed:
+                    response = Response(
+                        {"error": "Too many requests. Please try again later.", "retry_after": retry_after},
+                        status=status.HTTP_429_TOO_MANY_REQUESTS
+                    )
+                    response["Retry-After"] = str(retry_after)
+                    return response
+                next_allowed = max(next_allowed, retry_after)
+            response = view_func(request, *args, **kwargs)
+            response["Retry-After"] = str(next_allowed)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,32 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import invalidate_token, invalidate_user
+from .profiles import invalidate_phone
+
+User = get_user_model()
+
+
+@receiver(post_delete, sender=Token)
+def drop_cached_token(sender, instance, **kwargs):
+    invalidate_token(instance.key)
+
+
+@receiver(post_init, sender=User)
+def remember_phone_number(sender, instance, **kwargs):
+    # The number as loaded, whose check-user/ entry drop_cached_user clears
+    # when it changes; read from __dict__ so a deferred field isn't fetched
+    instance._loaded_phone_number = instance.__dict__.get("phone_number")
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def drop_cached_user(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
+    invalidate_phone(instance.phone_number)
+    previous = getattr(instance, "_loaded_phone_number", None)
+    if previous and previous != instance.phone_number:
+        invalidate_phone(previous)
+    instance._loaded_phone_number = instance.phone_number
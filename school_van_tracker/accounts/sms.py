@@ -0,0 +1,187 @@
+"""
+Pluggable SMS delivery for OTP messages.
+
+Views never talk to an SMS provider directly. They call ``queue_otp_sms`` which
+hands the message to a background dispatcher so the HTTP response can be
+returned as soon as the OTP is persisted. The provider is chosen with the
+``SMS_BACKEND`` setting, mirroring how Django picks an ``EMAIL_BACKEND``.
+
+The background queue lives in the web process and is not persisted:
+delivery is at most once. Messages still queued when the process exits are
+lost, and the user has to ask for the code again. ``SMS_ASYNC=False`` sends
+inline when the response must say whether the text went out.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# Messages "sent" through the locmem backend, like django.core.mail.outbox
+outbox = []
+
+
+class SMSNotConfigured(Exception):
+    """The backend can't send anything; retrying won't help"""
+
+
+class BaseSMSBackend:
+    """Interface every SMS backend implements"""
+
+    is_configured = True
+
+    def send(self, phone_number, body):
+        """Deliver a single message. Raise on failure so it can be retried."""
+        raise NotImplementedError
+
+
+class TwilioBackend(BaseSMSBackend):
+    """Send SMS through Twilio, reusing one client (and its HTTP pool)"""
+
+    def __init__(self):
+        self.account_sid = os.getenv('TWILIO_ACCOUNT_SID')
+        self.auth_token = os.getenv('TWILIO_AUTH_TOKEN')
+        self.from_number = os.getenv('TWILIO_PHONE_NUMBER')
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_configured(self):
+        return all([self.account_sid, self.auth_token, self.from_number])
+
+    def get_client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from twilio.rest import Client
+                    self._client = Client(self.account_sid, self.auth_token)
+        return self._client
+
+    def send(self, phone_number, body):
+        if not self.is_configured:
+            raise SMSNotConfigured("Twilio credentials not configured")
+
+        message = self.get_client().messages.create(
+            body=body,
+            from_=self.from_number,
+            to=str(phone_number)
+        )
+        logger.info(f"SMS sent successfully to {phone_number}, SID: {message.sid}")
+        return message.sid
+
+
+class ConsoleBackend(BaseSMSBackend):
+    """Log messages instead of sending them (local development)"""
+
+    def send(self, phone_number, body):
+        logger.info(f"📨 SMS to {phone_number}: {body}")
+        return None
+
+
+class LocMemBackend(BaseSMSBackend):
+    """Keep messages in ``accounts.sms.outbox`` (tests)"""
+
+    def send(self, phone_number, body):
+        outbox.append({"to": str(phone_number), "body": body})
+        return len(outbox)
+
+
+class SMSDispatcher:
+    """Background queue that delivers SMS with retries and exponential backoff"""
+
+    def __init__(self, backend, max_retries=3, backoff=1.0):
+        self.backend = backend
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            with self._lock:
+                if self._worker is None or not self._worker.is_alive():
+                    self._worker = threading.Thread(
+                        target=self._run, name="sms-dispatcher", daemon=True
+                    )
+                    self._worker.start()
+
+    def enqueue(self, phone_number, body):
+        self._ensure_worker()
+        self._queue.put((phone_number, body))
+
+    def deliver(self, phone_number, body):
+        """Send one message now, retrying with backoff. Returns True on success."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.backend.send(phone_number, body)
+                return True
+            except SMSNotConfigured as e:
+                logger.error(f"❌ SMS to {phone_number} not sent: {str(e)}")
+                return False
+            except Exception as e:
+                if attempt >= self.max_retries:
+                    logger.error(f"Failed to send SMS to {phone_number} after {attempt + 1} attempts: {str(e)}")
+                    return False
+                delay = self.backoff * (2 ** attempt)
+                logger.warning(f"SMS to {phone_number} failed ({str(e)}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+        return False
+
+    def join(self):
+        """Block until every queued message has been processed"""
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            phone_number, body = self._queue.get()
+            try:
+                self.deliver(phone_number, body)
+            finally:
+                self._queue.task_done()
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                backend = import_string(settings.SMS_BACKEND)()
+                _dispatcher = SMSDispatcher(
+                    backend,
+                    max_retries=settings.SMS_MAX_RETRIES,
+                    backoff=settings.SMS_RETRY_BACKOFF,
+                )
+    return _dispatcher
+
+
+def reset_dispatcher():
+    """Drop the cached dispatcher so a changed SMS_BACKEND takes effect"""
+    global _dispatcher
+    with _dispatcher_lock:
+        _dispatcher = None
+
+
+def queue_otp_sms(phone_number, otp_code):
+    """
+    Queue the OTP text for delivery. Returns True once it has been handed off
+    (or, with SMS_ASYNC off, sent), False if it can't be sent.
+    """
+    body = f"Your Kumfort OTP is: {otp_code}. Valid for {settings.OTP_EXPIRY_MINUTES} minutes."
+    dispatcher = get_dispatcher()
+    if not dispatcher.backend.is_configured:
+        logger.error(f"❌ SMS to {phone_number} not sent: {settings.SMS_BACKEND} is not configured")
+        return False
+    if settings.SMS_ASYNC:
+        dispatcher.enqueue(phone_number, body)
+        return True
+    return dispatcher.deliver(phone_number, body)
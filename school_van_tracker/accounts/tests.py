@@ -1,3 +1,387 @@
-from django.test import TestCase
+import time
+from io import StringIO
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from . import checks, otp_store, profiles, ratelimit, sms
+from .models import OTPVerification, User
+
+
+class FlakyBackend(sms.BaseSMSBackend):
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+
+    def send(self, phone_number, body):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise ConnectionError("provider unavailable")
+        return "SM123"
+
+
+@override_settings(SMS_BACKEND="accounts.sms.LocMemBackend", SMS_ASYNC=False, SMS_RETRY_BACKOFF=0)
+class SMSDeliveryTests(TestCase):
+    def setUp(self):
+        sms.reset_dispatcher()
+        sms.outbox.clear()
+        cache.clear()
+        self.client = APIClient()
+
+    def tearDown(self):
+        sms.reset_dispatcher()
+
+    def test_send_otp_delivers_through_configured_backend(self):
+        response = self.client.post("/api/auth/send-otp/", {"phone_number": "+919876543210"}, format="json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data["sms_sent"])
+        self.assertEqual(len(sms.outbox), 1)
+        self.assertEqual(sms.outbox[0]["to"], "+919876543210")
+        self.assertRegex(sms.outbox[0]["body"], r"OTP is: \d{6}\.")
+
+    @override_settings(SMS_ASYNC=True)
+    def test_async_dispatch_delivers_in_background(self):
+        sms.queue_otp_sms("+919876543210", "123456")
+        sms.get_dispatcher().join()
+
+        self.assertEqual(len(sms.outbox), 1)
+
+    def test_dispatcher_retries_with_backoff(self):
+        backend = FlakyBackend(failures=2)
+        dispatcher = sms.SMSDispatcher(backend, max_retries=3, backoff=0)
+
+        self.assertTrue(dispatcher.deliver("+919876543210", "hi"))
+        self.assertEqual(backend.calls, 3)
+
+    @override_settings(SMS_BACKEND="accounts.sms.TwilioBackend", SMS_RETRY_BACKOFF=10)
+    def test_unconfigured_backend_reports_the_sms_as_not_sent(self):
+        backend = sms.TwilioBackend()
+        backend.account_sid = None
+        self.assertFalse(sms.SMSDispatcher(backend, backoff=10).deliver("+919876543210", "hi"))
+
+        sms.get_dispatcher().backend.account_sid = None
+        for async_ in (False, True):
+            with self.settings(SMS_ASYNC=async_):
+                self.assertFalse(sms.queue_otp_sms("+919876543210", "123456"))
+
+    def test_dispatcher_gives_up_after_max_retries(self):
+        backend = FlakyBackend(failures=10)
+        dispatcher = sms.SMSDispatcher(backend, max_retries=2, backoff=0)
+
+        self.assertFalse(dispatcher.deliver("+919876543210", "hi"))
+        self.assertEqual(backend.calls, 3)
+
+
+@override_settings(SMS_BACKEND="accounts.sms.LocMemBackend", SMS_ASYNC=False)
+class RateLimitTests(TestCase):
+    def setUp(self):
+        sms.reset_dispatcher()
+        cache.clear()
+        self.client = APIClient()
+
+    def tearDown(self):
+        sms.reset_dispatcher()
+
+    def test_parse_rate(self):
+        self.assertEqual(ratelimit.parse_rate("5/m"), (5, 60))
+        self.assertEqual(ratelimit.parse_rate("1/60s"), (1, 60))
+        self.assertEqual(ratelimit.parse_rate("10/10m"), (10, 600))
+        with self.assertRaises(ValueError):
+            ratelimit.parse_rate("ten per minute")
+
+    def test_sliding_window_weights_previous_window(self):
+        for _ in range(20):
+            self.assertTrue(ratelimit.hit("k", 20, 60, now=30)[0])
+
+        # Halfway into the next window, half of the previous 20 still count
+        for _ in range(10):
+            self.assertTrue(ratelimit.hit("k", 20, 60, now=90)[0])
+        allowed, retry_after = ratelimit.hit("k", 20, 60, now=90)
+        self.assertFalse(allowed)
+        self.assertGreater(retry_after, 0)
+
+    def test_small_limits_slide_exactly(self):
+        self.assertEqual(ratelimit.hit("k", 1, 60, now=100), (True, 60))
+        self.assertEqual(ratelimit.hit("k", 1, 60, now=130), (False, 30))
+        # One minute after the last accepted request, not two
+        self.assertEqual(ratelimit.hit("k", 1, 60, now=160), (True, 60))
+
+        for now in (0, 10, 20):
+            self.assertTrue(ratelimit.hit("three", 3, 60, now=now)[0])
+        self.assertEqual(ratelimit.hit("three", 3, 60, now=30), (False, 30))
+        self.assertEqual(ratelimit.hit("three", 3, 60, now=60), (True, 10))
+
+    def test_send_otp_throttled_per_phone_without_db_lookup(self):
+        data = {"phone_number": "+919876543210"}
+        self.assertEqual(self.client.post("/api/auth/send-otp/", data, format="json").status_code, 200)
+
+        with self.assertNumQueries(0):
+            response = self.client.post("/api/auth/send-otp/", data, format="json")
+
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response)
+
+    def test_phone_limit_is_per_normalised_number_and_announced(self):
+        response = self.client.post("/api/auth/send-otp/", {"phone_number": "+919876543210"}, format="json")
+        self.assertEqual((response.status_code, response["Retry-After"]), (200, "60"))
+
+        response = self.client.post("/api/auth/send-otp/", {"phone_number": "+91 98765 43210"}, format="json")
+        self.assertEqual(response.status_code, 429)
+
+        response = self.client.post("/api/auth/check-user/", {"phone_number": "+919876543210"}, format="json")
+        self.assertEqual(response["Retry-After"], "0")
+
+    @override_settings(RATE_LIMITS={"check_user_exists": {"ip": "2/m"}})
+    def test_check_user_exists_throttled_per_ip(self):
+        for phone in ["+919876543210", "+919876543211"]:
+            response = self.client.post("/api/auth/check-user/", {"phone_number": phone}, format="json")
+            self.assertEqual(response.status_code, 200)
+
+        response = self.client.post("/api/auth/check-user/", {"phone_number": "+919876543212"}, format="json")
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], str(response.data["retry_after"]))
+
+
+    @override_settings(RATE_LIMITS={"check_user_exists": {"ip": "2/m"}}, RATE_LIMIT_IP_HEADER="HTTP_X_FORWARDED_FOR")
+    def test_forwarded_for_entries_before_the_proxy_are_ignored(self):
+        # The client rotates the leftmost entry; the proxy appends 203.0.113.7
+        for spoofed in ["10.0.0.1", "10.0.0.2", "10.0.0.3"]:
+            response = self.client.post(
+                "/api/auth/check-user/", {"phone_number": "+919876543210"}, format="json",
+                HTTP_X_FORWARDED_FOR=f"{spoofed}, 203.0.113.7"
+            )
+        self.assertEqual(response.status_code, 429)
+
+        request = RequestFactory().get("/", HTTP_X_FORWARDED_FOR="10.0.0.1, 203.0.113.7, 198.51.100.2")
+        with self.settings(RATE_LIMIT_PROXY_HOPS=2):
+            self.assertEqual(ratelimit.get_client_ip(request), "203.0.113.7")
+        with self.settings(RATE_LIMIT_PROXY_HOPS=5):
+            self.assertEqual(ratelimit.get_client_ip(request), "10.0.0.1")
+
+    def test_per_process_cache_is_flagged(self):
+        locmem = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+        with self.settings(CACHES=locmem):
+            self.assertEqual([warning.id for warning in checks.check_rate_limit_cache(None)], ["accounts.W001"])
+        with self.settings(CACHES=locmem, RATE_LIMIT_ENABLED=False):
+            self.assertEqual(checks.check_rate_limit_cache(None), [])
+
+
+@override_settings(SMS_BACKEND="accounts.sms.LocMemBackend", SMS_ASYNC=False, RATE_LIMIT_ENABLED=False)
+class OTPStoreTests(TestCase):
+    phone_number = "+919876543210"
+
+    def setUp(self):
+        sms.reset_dispatcher()
+        cache.clear()
+        self.client = APIClient()
+
+    def tearDown(self):
+        sms.reset_dispatcher()
+
+    def test_cache_store_issues_without_touching_the_database(self):
+        store = otp_store.CacheOTPStore()
+
+        with self.assertNumQueries(0):
+            code = store.issue(self.phone_number)
+
+        self.assertEqual(len(code), 6)
+        self.assertFalse(OTPVerification.objects.exists())
+
+    def test_cache_store_verifies_once(self):
+        store = otp_store.CacheOTPStore()
+        code = store.issue(self.phone_number)
+
+        self.assertEqual(store.verify(self.phone_number, code), otp_store.VERIFIED)
+        self.assertEqual(store.verify(self.phone_number, code), otp_store.INVALID)
+
+    def test_cache_store_counts_failed_attempts(self):
+        store = otp_store.CacheOTPStore()
+        code = store.issue(self.phone_number)
+        wrong = "000000" if code != "000000" else "111111"
+
+        for _ in range(3):
+            self.assertEqual(store.verify(self.phone_number, wrong), otp_store.INVALID)
+        self.assertEqual(store.verify(self.phone_number, code), otp_store.TOO_MANY_ATTEMPTS)
+
+    def test_cache_store_resend_resets_attempts_and_reports_expiry(self):
+        store = otp_store.CacheOTPStore()
+        code = store.issue(self.phone_number)
+        wrong = "000000" if code != "000000" else "111111"
+        for _ in range(4):
+            store.verify(self.phone_number, wrong)
+        self.assertEqual(store.verify(self.phone_number, code), otp_store.TOO_MANY_ATTEMPTS)
+
+        code = store.issue(self.phone_number)
+        self.assertEqual(store.verify(self.phone_number, code), otp_store.VERIFIED)
+
+        cache.clear()
+        code = store.issue(self.phone_number)
+        # Past its expiry, still inside the grace period
+        cache.set(store._code_key(self.phone_number), (code, time.time() - 1))
+        self.assertEqual(store.verify(self.phone_number, code), otp_store.EXPIRED)
+
+    def test_cache_store_needs_a_shared_cache(self):
+        locmem = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+        with override_settings(OTP_STORE="accounts.otp_store.CacheOTPStore", CACHES=locmem):
+            self.assertEqual([error.id for error in checks.check_otp_store(None)], ["accounts.E001"])
+        with override_settings(OTP_STORE="accounts.otp_store.DatabaseOTPStore"):
+            self.assertEqual(checks.check_otp_store(None), [])
+
+    @override_settings(OTP_AUDIT_DB=True)
+    def test_cache_store_audit_sink(self):
+        store = otp_store.CacheOTPStore()
+        code = store.issue(self.phone_number)
+        store.verify(self.phone_number, code)
+
+        audit = OTPVerification.objects.get()
+        self.assertEqual(audit.otp_code, code)
+        self.assertTrue(audit.is_verified)
+
+    @override_settings(OTP_STORE="accounts.otp_store.DatabaseOTPStore")
+    def test_database_store(self):
+        store = otp_store.get_otp_store()
+        code = store.issue(self.phone_number)
+
+        self.assertEqual(OTPVerification.objects.get().otp_code, code)
+        self.assertEqual(store.verify(self.phone_number, code), otp_store.VERIFIED)
+        self.assertEqual(store.verify(self.phone_number, code), otp_store.INVALID)
+
+    def test_login_flow(self):
+        User.objects.create(phone_number=self.phone_number, user_type="driver")
+        code = otp_store.get_otp_store().issue(self.phone_number)
+
+        response = self.client.post(
+            "/api/auth/verify-otp/", {"phone_number": self.phone_number, "otp_code": code}, format="json"
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("token", response.data)
+
+
+class OTPPurgeTests(TestCase):
+    def make_otp(self, age, is_verified=False):
+        otp = OTPVerification.objects.create(phone_number="+919876543210", is_verified=is_verified)
+        OTPVerification.objects.filter(pk=otp.pk).update(created_at=timezone.now() - age)
+        return otp
+
+    @override_settings(OTP_RETENTION_HOURS=24)
+    def test_purge_stale_deletes_old_rows_in_batches(self):
+        old = [self.make_otp(timezone.timedelta(days=3)) for _ in range(5)]
+        old_verified = self.make_otp(timezone.timedelta(hours=25), is_verified=True)
+        recent = self.make_otp(timezone.timedelta(minutes=1))
+
+        deleted = OTPVerification.purge_stale(batch_size=2)
+
+        self.assertEqual(deleted, len(old) + 1)
+        self.assertFalse(OTPVerification.objects.filter(pk=old_verified.pk).exists())
+        self.assertEqual(list(OTPVerification.objects.values_list("pk", flat=True)), [recent.pk])
+
+    def test_purge_command(self):
+        self.make_otp(timezone.timedelta(days=3))
+        out = StringIO()
+
+        call_command("purge_otps", "--retention-hours=1", stdout=out)
+
+        self.assertIn("Deleted 1 stale OTP rows", out.getvalue())
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(phone_number="+919876543210", user_type="parent", first_name="Priya")
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+    def test_token_lookup_is_cached(self):
+        self.assertEqual(self.client.get("/api/auth/profile/").status_code, 200)
+
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/auth/profile/")
+
+        self.assertEqual(response.data["first_name"], "Priya")
+
+    def test_user_update_invalidates_cache(self):
+        self.client.get("/api/auth/profile/")
+        self.client.put("/api/auth/update-profile/", {"first_name": "Anita"}, format="json")
+
+        response = self.client.get("/api/auth/profile/")
+
+        self.assertEqual(response.data["first_name"], "Anita")
+
+    def test_logout_invalidates_cache(self):
+        self.client.get("/api/auth/profile/")
+        self.assertEqual(self.client.post("/api/auth/logout/").status_code, 200)
+
+        self.assertEqual(self.client.get("/api/auth/profile/").status_code, 401)
+
+
+@override_settings(SMS_BACKEND="accounts.sms.LocMemBackend", SMS_ASYNC=False, RATE_LIMIT_ENABLED=False)
+class CheckUserCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(phone_number="+919876543210", user_type="parent", first_name="Priya")
+        self.client = APIClient()
+
+    def check_user(self, phone_number):
+        return self.client.post("/api/auth/check-user/", {"phone_number": phone_number}, format="json").data
+
+    def test_profile_is_served_from_the_authenticated_user(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=self.user).key}")
+        client.get("/api/auth/profile/")
+
+        with self.assertNumQueries(0):
+            response = client.get("/api/auth/profile/")
+        self.assertEqual(response.data["first_name"], "Priya")
+
+        self.user.first_name = "Anita"
+        self.user.save()
+        self.assertEqual(client.get("/api/auth/profile/").data["first_name"], "Anita")
+
+    def test_saves_do_not_read_the_user_back(self):
+        user = User.objects.get(pk=self.user.pk)
+
+        with self.assertNumQueries(1):
+            user.save(update_fields=["last_login"])
+        with self.assertNumQueries(1):
+            user.save()
+
+    def test_known_number_is_cached(self):
+        self.assertTrue(self.check_user("+919876543210")["exists"])
+
+        with self.assertNumQueries(0):
+            data = self.check_user("+91 98765 43210")
+
+        self.assertEqual(data["first_name"], "Priya")
+
+    def test_unknown_number_is_cached_until_registered(self):
+        self.assertFalse(self.check_user("+919876543211")["exists"])
+        with self.assertNumQueries(0):
+            self.assertFalse(self.check_user("+919876543211")["exists"])
+
+        self.client.post("/api/auth/send-otp/", {"phone_number": "+919876543211"}, format="json")
+
+        self.assertTrue(self.check_user("+919876543211")["exists"])
+
+    def test_saving_the_user_updates_check_user(self):
+        self.check_user("+919876543210")
+
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertFalse(self.check_user("+919876543210")["is_active"])
+
+    def test_changing_the_number_drops_the_old_numbers_entry(self):
+        self.assertTrue(self.check_user("+919876543210")["exists"])
+
+        self.user.phone_number = "+919876543212"
+        self.user.save()
+
+        self.assertFalse(self.check_user("+919876543210")["exists"])
+        self.assertTrue(self.check_user("+919876543212")["exists"])
@@ -6,43 +6,17 @@ from rest_framework.authtoken.models import Token
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from django.conf import settings
-from .models import OTPVerification
+from . import otp_store
+from .otp_store import get_otp_store
+from .profiles import lookup_phone, serialize_profile
+from .ratelimit import rate_limit
+from .sms import queue_otp_sms
 import logging
-import os
 
 logger = logging.getLogger(__name__)
 
 User = get_user_model()
 
-def send_sms_otp(phone_number, otp_code):
-    """Send OTP via SMS using Twilio"""
-    try:
-        from twilio.rest import Client
-        
-        # Twilio configuration
-        account_sid = os.getenv('TWILIO_ACCOUNT_SID')
-        auth_token = os.getenv('TWILIO_AUTH_TOKEN')
-        from_number = os.getenv('TWILIO_PHONE_NUMBER')
-        
-        if not all([account_sid, auth_token, from_number]):
-            logger.warning("Twilio credentials not configured, skipping SMS")
-            return False
-            
-        client = Client(account_sid, auth_token)
-        print(f"Sending SMS to {phone_number} with OTP {otp_code}")
-        message = client.messages.create(
-            body=f"Your Kumfort OTP is: {otp_code}. Valid for 10 minutes.",
-            from_=from_number,
-            to=str(phone_number)
-        )
-        print(f"SMS sent successfully to {phone_number}, SID: {message.sid}")
-        logger.info(f"SMS sent successfully to {phone_number}, SID: {message.sid}")
-        return True
-        
-    except Exception as e:
-        logger.error(f"Failed to send SMS to {phone_number}: {str(e)}")
-        return False
-
 @api_view(["GET"])
 @permission_classes([AllowAny])
 def test_connection(request):
@@ -54,6 +28,7 @@ def test_connection(request):
 
 @api_view(["POST"])
 @permission_classes([AllowAny])
+@rate_limit("send_otp")
 def send_otp(request):
     logger.info(f"🚀 Send OTP request received from {request.META.get('REMOTE_ADDR', 'unknown')}")
     logger.info(f"📱 Request data: {request.data}")
@@ -93,44 +68,34 @@ def send_otp(request):
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    # Check for recent OTP requests (rate limiting)
-    recent_otp = OTPVerification.objects.filter(
-        phone_number=phone_number,
-        created_at__gte=timezone.now() - timezone.timedelta(minutes=1)
-    ).first()
-    
-    if recent_otp:
-        return Response(
-            {"error": "Please wait before requesting another OTP"}, 
-            status=status.HTTP_429_TOO_MANY_REQUESTS
-        )
-    
     # Create or get user
     user, created = User.objects.get_or_create(
         phone_number=phone_number,
         defaults={"user_type": user_type}
     )
     
-    # Create OTP verification
-    otp_verification = OTPVerification.objects.create(phone_number=phone_number)
+    # Store the OTP (cache with TTL by default, see OTP_STORE)
+    otp_code = get_otp_store().issue(phone_number)
     
-    # Send SMS
-    sms_sent = send_sms_otp(phone_number, otp_verification.otp_code)
+    # Hand the SMS to the background dispatcher so the response isn't
+    # held up by the provider
+    sms_sent = queue_otp_sms(phone_number, otp_code)
     
     response_data = {
         "message": "OTP sent successfully",
-        "expires_in": 600,
+        "expires_in": settings.OTP_EXPIRY_MINUTES * 60,
         "sms_sent": sms_sent
     }
     
     # In development, include OTP in response
     if settings.DEBUG:
-        response_data["otp_code"] = otp_verification.otp_code
+        response_data["otp_code"] = otp_code
     
     return Response(response_data, status=status.HTTP_200_OK)
 
 @api_view(["POST"])
 @permission_classes([AllowAny])
+@rate_limit("check_user_exists")
 def check_user_exists(request):
     """Check if a user exists with the given phone number"""
     logger.info(f"🔍 Check user exists request from {request.META.get('REMOTE_ADDR', 'unknown')}")
@@ -145,21 +110,16 @@ def check_user_exists(request):
         )
     
     try:
-        user = User.objects.get(phone_number=phone_number)
-        logger.info(f"User found: {user.get_full_name()} ({user.user_type})")
-        return Response({
-            "exists": True,
-            "user_type": user.user_type,
-            "first_name": user.first_name,
-            "last_name": user.last_name,
-            "is_active": user.is_active
-        })
-    except User.DoesNotExist:
-        logger.info(f"User not found for phone: {phone_number}")
-        return Response({
-            "exists": False,
-            "message": "User not registered"
-        })
+        # Cached, including unknown numbers, see accounts.profiles
+        summary = lookup_phone(phone_number)
+        if summary is None:
+            logger.info(f"User not found for phone: {phone_number}")
+            return Response({
+                "exists": False,
+                "message": "User not registered"
+            })
+        logger.info(f"User found: {summary['first_name']} {summary['last_name']} ({summary['user_type']})")
+        return Response({"exists": True, **summary})
     except Exception as e:
         logger.error(f"Error checking user existence: {str(e)}")
         return Response(
@@ -169,6 +129,7 @@ def check_user_exists(request):
 
 @api_view(["POST"])
 @permission_classes([AllowAny])
+@rate_limit("verify_otp")
 def verify_otp(request):
     logger.info(f"🔍 Verify OTP request received from {request.META.get('REMOTE_ADDR', 'unknown')}")
     logger.info(f"📱 Request data: {request.data}")
@@ -187,47 +148,25 @@ def verify_otp(request):
         )
     
     try:
-        logger.info(f"🔍 Looking for OTP verification for phone: {phone_number}")
-        otp_verifications = OTPVerification.objects.filter(
-            phone_number=phone_number,
-            otp_code=otp_code,
-            is_verified=False
-        )
-        logger.info(f"📊 Found {otp_verifications.count()} OTP verifications")
+        otp_status = get_otp_store().verify(phone_number, otp_code)
+        logger.info(f"🔑 OTP verification result for {phone_number}: {otp_status}")
         
-        if not otp_verifications.exists():
-            logger.warning(f"❌ No OTP verification found for phone: {phone_number}")
+        if otp_status == otp_store.EXPIRED:
+            return Response(
+                {"error": "OTP has expired"}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        elif otp_status == otp_store.TOO_MANY_ATTEMPTS:
+            return Response(
+                {"error": "Too many failed attempts"}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        elif otp_status != otp_store.VERIFIED:
             return Response(
                 {"error": "Invalid OTP or phone number"}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        otp_verification = otp_verifications.latest("created_at")
-        logger.info(f"✅ Found OTP verification: {otp_verification}")
-        
-        if not otp_verification.is_valid():
-            otp_verification.attempts += 1
-            otp_verification.save()
-            
-            if otp_verification.is_expired():
-                return Response(
-                    {"error": "OTP has expired"}, 
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            elif otp_verification.attempts >= 3:
-                return Response(
-                    {"error": "Too many failed attempts"}, 
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            else:
-                return Response(
-                    {"error": "Invalid OTP"}, 
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-        
-        otp_verification.is_verified = True
-        otp_verification.save()
-        
         try:
             logger.info(f"🔍 Looking for user with phone: {phone_number}")
             user = User.objects.get(phone_number=phone_number)
@@ -257,12 +196,6 @@ def verify_otp(request):
             }
         }, status=status.HTTP_200_OK)
         
-    except OTPVerification.DoesNotExist:
-        logger.warning(f"❌ OTPVerification.DoesNotExist for phone: {phone_number}")
-        return Response(
-            {"error": "Invalid OTP or phone number"}, 
-            status=status.HTTP_400_BAD_REQUEST
-        )
     except User.DoesNotExist:
         logger.warning(f"❌ User.DoesNotExist for phone: {phone_number}")
         return Response(
@@ -287,18 +220,7 @@ def logout(request):
 @api_view(["GET"])
 def user_profile(request):
     """Get current user profile"""
-    user = request.user
-    return Response({
-        "id": user.id,
-        "phone_number": str(user.phone_number),
-        "user_type": user.user_type,
-        "first_name": user.first_name,
-        "last_name": user.last_name,
-        "address": user.address,
-        "emergency_contact": str(user.emergency_contact) if user.emergency_contact else None,
-        "created_at": user.created_at,
-        "is_active": user.is_active
-    }, status=status.HTTP_200_OK)
+    return Response(serialize_profile(request.user), status=status.HTTP_200_OK)
 
 @api_view(["PUT"])
 def update_profile(request):
@@ -332,6 +254,7 @@ def update_profile(request):
 
 @api_view(["POST"])
 @permission_classes([AllowAny])
+@rate_limit("resend_otp")
 def resend_otp(request):
     """Resend OTP for the same phone number"""
     phone_number = request.data.get("phone_number")
@@ -342,70 +265,21 @@ def resend_otp(request):
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    # Check for recent OTP requests (rate limiting)
-    recent_otp = OTPVerification.objects.filter(
-        phone_number=phone_number,
-        created_at__gte=timezone.now() - timezone.timedelta(minutes=1)
-    ).first()
-    
-    if recent_otp:
-        return Response(
-            {"error": "Please wait before requesting another OTP"}, 
-            status=status.HTTP_429_TOO_MANY_REQUESTS
-        )
-    
-    # Create new OTP verification
-    otp_verification = OTPVerification.objects.create(phone_number=phone_number)
+    # Store the OTP (cache with TTL by default, see OTP_STORE)
+    otp_code = get_otp_store().issue(phone_number)
     
-    # Send SMS
-    sms_sent = send_sms_otp(phone_number, otp_verification.otp_code)
+    # Hand the SMS to the background dispatcher so the response isn't
+    # held up by the provider
+    sms_sent = queue_otp_sms(phone_number, otp_code)
     
     response_data = {
         "message": "OTP resent successfully",
-        "expires_in": 600,
+        "expires_in": settings.OTP_EXPIRY_MINUTES * 60,
         "sms_sent": sms_sent
     }
     
     # In development, include OTP in response
     if settings.DEBUG:
-        response_data["otp_code"] = otp_verification.otp_code
+        response_data["otp_code"] = otp_code
     
     return Response(response_data, status=status.HTTP_200_OK)
-
-@api_view(["POST"])
-@permission_classes([AllowAny])
-def check_user_exists(request):
-    """Check if a user exists with the given phone number"""
-    logger.info(f"🔍 Check user exists request from {request.META.get('REMOTE_ADDR', 'unknown')}")
-    logger.info(f"📱 Request data: {request.data}")
-    
-    phone_number = request.data.get("phone_number")
-    
-    if not phone_number:
-        return Response(
-            {"error": "Phone number is required"}, 
-            status=status.HTTP_400_BAD_REQUEST
-        )
-    
-    try:
-        user = User.objects.get(phone_number=phone_number)
-        logger.info(f"User found: {user.get_full_name()} ({user.user_type})")
-        return Response({
-            "exists": True,
-            "user_type": user.user_type,
-            "first_name": user.first_name,
-            "last_name": user.last_name,
-            "is_active": user.is_active
-        })
-    except User.DoesNotExist:
-        logger.info(f"User not found for phone: {phone_number}")
-        return Response({
-            "exists": False,
-            "message": "User not registered"
-        })
-    except Exception as e:
-        logger.error(f"Error checking user existence: {str(e)}")
-        return Response(
-            {"error": "An error occurred while checking user existence"}, 
-            status=status.HTTP_500_INTERNAL_SERVER_ERROR
-        )
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Benchmark rendering and compressing the van-location/ and location-history/
+payloads: DRF's JSONRenderer vs FastJSONRenderer, response sizes with gzip
+and brotli (when installed), and location-history/ in the compact points
+format (locations.wire).
+
+The payloads are built with the real serializers from unsaved model
+instances, so no database is needed.
+
+    python benchmark_api_responses.py --vans 2 --children 3 --history 50
+"""
+import argparse
+import datetime
+import json
+import os
+import time
+from decimal import Decimal
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "school_van_tracker.settings")
+
+import django
+
+django.setup()
+
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from accounts.models import User
+from locations.models import ChildVanAssignment, Location, VanAssignment
+from locations.serializers import ChildVanAssignmentSerializer, LocationSerializer, VanAssignmentSerializer
+from locations.wire import PointsRenderer, decode_points
+from school_van_tracker import compression
+from school_van_tracker.renderers import FastJSONRenderer, orjson
+
+
+def make_location(driver, i, now):
+    return Location(
+        pk=1000 + i, driver=driver, latitude=Decimal("28.612345") + Decimal(i) / 10000,
+        longitude=Decimal("77.209876"), accuracy=8.5, speed=31.2, heading=182.0, altitude=216.4,
+        timestamp=now - datetime.timedelta(seconds=5 * i), received_at=now, is_active=i == 0,
+        route_progress=42.1, distance_along_route=5123.4, route_offset=3.2
+    )
+
+
+def van_location_payload(vans, children):
+    """Same shape as locations.views.get_van_location"""
+    now = timezone.now()
+    van_data = []
+    for index in range(vans):
+        driver = User(pk=index + 1, phone_number=f"+91987654330{index}", first_name="Ravi", last_name="Kumar")
+        van = VanAssignment(
+            pk=index + 1, driver=driver, van_number=f"DPS-00{index}", van_model="Maruti Eeco", capacity=12,
+            route_name="Sector 21 - DPS", is_active=True, created_at=now, updated_at=now
+        )
+        kids = [
+            ChildVanAssignment(
+                pk=index * 10 + i, van_assignment=van, child_name=f"Child {i}", child_grade="5",
+                school_name="Delhi Public School", admission_number=f"DPS{i:05d}",
+                pickup_time=datetime.time(7, 15), dropoff_time=datetime.time(14, 30),
+                stop_latitude=Decimal("28.6001"), stop_longitude=Decimal("77.2001"), is_active=True,
+                created_at=now, updated_at=now
+            )
+            for i in range(children)
+        ]
+        van_data.append({
+            "van_assignment": VanAssignmentSerializer(van).data,
+            "location": LocationSerializer(make_location(driver, 0, now)).data,
+            "children": ChildVanAssignmentSerializer(kids, many=True).data,
+        })
+    return {
+        "vans": van_data,
+        "van_assignment": van_data[0]["van_assignment"],
+        "location": van_data[0]["location"],
+        "children": [child for van in van_data for child in van["children"]],
+    }
+
+
+def location_history_payload(history):
+    """Same shape as locations.views.get_location_history"""
+    now = timezone.now()
+    driver = User(pk=1, phone_number="+919876543300", first_name="Ravi", last_name="Kumar")
+    return {"locations": LocationSerializer([make_location(driver, i, now) for i in range(history)], many=True).data}
+
+
+def per_call(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def report(name, payload, repeat):
+    stock, fast = JSONRenderer(), FastJSONRenderer()
+    body = stock.render(payload)
+    print(f"\n📦 {name}")
+    print(f"  JSONRenderer     {per_call(lambda: stock.render(payload), repeat):8.1f} µs")
+    label = "FastJSONRenderer" if orjson else "FastJSONRenderer (no orjson, stdlib fallback)"
+    print(f"  {label} {per_call(lambda: fast.render(payload), repeat):8.1f} µs")
+
+    print(f"  {'identity':<16} {len(body):8d} bytes")
+    codings = ["gzip"] + (["br"] if compression.brotli else [])
+    for coding in codings:
+        compressed = compression.compress(body, coding)
+        elapsed = per_call(lambda: compression.compress(body, coding), repeat)
+        saved = 100 * (1 - len(compressed) / len(body))
+        print(f"  {coding:<16} {len(compressed):8d} bytes  ({saved:4.1f}% saved, {elapsed:.1f} µs to compress)")
+    if not compression.brotli:
+        print("  br               (install the brotli package to measure)")
+
+    if "locations" in payload:
+        # The same points in the compact format (Accept: application/vnd.kumfort.points)
+        renderer = PointsRenderer()
+        points = renderer.render(payload)
+        print(f"  {'points':<16} {len(points):8d} bytes  ({100 * (1 - len(points) / len(body)):4.1f}% saved, "
+              f"{per_call(lambda: renderer.render(payload), repeat):.1f} µs to render)")
+        gzipped = compression.compress(points, "gzip")
+        print(f"  {'points + gzip':<16} {len(gzipped):8d} bytes")
+        decoded = per_call(lambda: decode_points(points), repeat)
+        parsed = per_call(lambda: json.loads(body), repeat)
+        print(f"  parse            {parsed:8.1f} µs JSON  {decoded:8.1f} µs points")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vans", type=int, default=2, help="vans carrying the parent's children")
+    parser.add_argument("--children", type=int, default=3, help="children per van")
+    parser.add_argument("--history", type=int, default=50, help="points in location-history/")
+    parser.add_argument("--repeat", type=int, default=2000, help="renders per measurement")
+    args = parser.parse_args()
+
+    report("van-location/", van_location_payload(args.vans, args.children), args.repeat)
+    report("location-history/", location_history_payload(args.history), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Benchmark the check-user/ lookup with and without the cache in
+accounts.profiles: a database read per call (the old behaviour) against a
+cache hit, for a known user and an unknown number.
+
+Runs against a throwaway test database, like ``manage.py test``. The cache
+is whatever CACHES configures (LocMem, or Redis with REDIS_URL set).
+
+    python benchmark_check_user_cache.py --users 1000 --repeat 2000
+"""
+import argparse
+import os
+import random
+import time
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "school_van_tracker.settings")
+
+import django
+
+django.setup()
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import setup_test_environment
+
+from accounts.models import User
+from accounts.profiles import lookup_phone
+
+
+def per_call(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def phone_from_db(phone_number):
+    user = User.objects.filter(phone_number=phone_number).first()
+    return user and (user.user_type, user.first_name, user.last_name, user.is_active)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000, help="users in the table")
+    parser.add_argument("--repeat", type=int, default=2000, help="lookups per measurement")
+    args = parser.parse_args()
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        User.objects.bulk_create(
+            User(phone_number=f"+9198765{index:05d}", user_type="parent", first_name=f"Parent {index}")
+            for index in range(args.users)
+        )
+        cache.clear()
+        users = list(User.objects.all()[:50])
+        user = random.choice(users)
+        known = str(user.phone_number)
+        unknown = "+919999999999"
+
+        print(f"\n📱 check-user/ ({args.users} users)")
+        print(f"  database, known  {per_call(lambda: phone_from_db(known), args.repeat):8.1f} µs")
+        print(f"  database, unkn.  {per_call(lambda: phone_from_db(unknown), args.repeat):8.1f} µs")
+        lookup_phone(known)
+        lookup_phone(unknown)
+        print(f"  cached, known    {per_call(lambda: lookup_phone(known), args.repeat):8.1f} µs")
+        print(f"  cached, unkn.    {per_call(lambda: lookup_phone(unknown), args.repeat):8.1f} µs")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark concurrent location writes on SQLite, default settings vs the
+pragmas from school_van_tracker/database.py.
+
+Each worker process plays one van posting locations: deactivate the previous
+point and insert a new one in its own transaction, like update_location.
+
+    python benchmark_db_writes.py --vans 40 --posts 100
+"""
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+
+from school_van_tracker.database import SQLITE_PRAGMAS
+
+SCHEMA = """
+CREATE TABLE locations_location (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    driver_id INTEGER NOT NULL,
+    latitude DECIMAL NOT NULL,
+    longitude DECIMAL NOT NULL,
+    speed REAL,
+    timestamp TEXT NOT NULL,
+    is_active BOOL NOT NULL
+);
+CREATE INDEX loc_driver_ts ON locations_location (driver_id, timestamp DESC);
+CREATE INDEX loc_active_driver ON locations_location (is_active, driver_id);
+"""
+
+
+def connect(path, tuned):
+    if tuned:
+        conn = sqlite3.connect(path, isolation_level=None)
+        for pragma, value in SQLITE_PRAGMAS.items():
+            conn.execute(f"PRAGMA {pragma} = {value}")
+    else:
+        # Django's defaults: rollback journal, synchronous=FULL, 5 s timeout
+        conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+    return conn
+
+
+def van(args):
+    path, tuned, driver_id, posts = args
+    conn = connect(path, tuned)
+    errors = 0
+    for i in range(posts):
+        try:
+            conn.execute("BEGIN IMMEDIATE" if tuned else "BEGIN")
+            conn.execute(
+                "UPDATE locations_location SET is_active = 0 WHERE driver_id = ? AND is_active = 1",
+                (driver_id,),
+            )
+            conn.execute(
+                "INSERT INTO locations_location (driver_id, latitude, longitude, speed, timestamp, is_active) "
+                "VALUES (?, ?, ?, ?, datetime('now'), 1)",
+                (driver_id, 28.6 + i / 1e4, 77.2 + i / 1e4, 30.0),
+            )
+            conn.execute("COMMIT")
+        except sqlite3.OperationalError:
+            errors += 1
+            try:
+                conn.execute("ROLLBACK")
+            except sqlite3.OperationalError:
+                pass
+    conn.close()
+    return errors
+
+
+def run(tuned, vans, posts):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.sqlite3")
+        conn = connect(path, tuned)
+        conn.executescript(SCHEMA)
+        conn.close()
+
+        start = time.perf_counter()
+        with multiprocessing.Pool(vans) as pool:
+            errors = sum(pool.map(van, [(path, tuned, driver_id, posts) for driver_id in range(vans)]))
+        elapsed = time.perf_counter() - start
+
+    written = vans * posts - errors
+    return written / elapsed, errors, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vans", type=int, default=40, help="concurrent writer processes")
+    parser.add_argument("--posts", type=int, default=100, help="location posts per van")
+    args = parser.parse_args()
+
+    print(f"🚐 {args.vans} vans x {args.posts} posts")
+    for label, tuned in (("default", False), ("tuned", True)):
+        rate, errors, elapsed = run(tuned, args.vans, args.posts)
+        print(f"{label:>8}: {rate:8.0f} writes/s  {errors:5d} lock errors  {elapsed:6.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,26 @@
 from django.contrib import admin
-from .models import Location, VanAssignment, ChildVanAssignment
+from school_van_tracker.admin_utils import LargeTableAdminMixin
+from .models import (
+    Location, VanAssignment, ChildVanAssignment, DriverTrackingState, Route, RouteStop, DailyDriverStats
+)
 
 
 @admin.register(Location)
-class LocationAdmin(admin.ModelAdmin):
+class LocationAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ['driver', 'latitude', 'longitude', 'timestamp', 'is_active']
-    list_filter = ['is_active', 'timestamp', 'driver']
-    search_fields = ['driver__first_name', 'driver__last_name', 'driver__phone_number']
-    readonly_fields = ['timestamp']
+    list_filter = ['is_active']
+    list_select_related = ['driver']
+    date_hierarchy = 'timestamp'
+    prefix_search_fields = ['driver__phone_number']
+    autocomplete_fields = ['driver']
+    readonly_fields = ['received_at']
     ordering = ['-timestamp']
 
 
 @admin.register(VanAssignment)
 class VanAssignmentAdmin(admin.ModelAdmin):
     list_display = ['van_number', 'driver', 'van_model', 'capacity', 'is_active']
-    list_filter = ['is_active', 'created_at']
+    list_filter = ['is_active', 'school', 'created_at']
     search_fields = ['van_number', 'driver__first_name', 'driver__last_name']
     ordering = ['van_number']
 
@@ -22,6 +28,44 @@ class VanAssignmentAdmin(admin.ModelAdmin):
 @admin.register(ChildVanAssignment)
 class ChildVanAssignmentAdmin(admin.ModelAdmin):
     list_display = ['child_name', 'parent', 'van_assignment', 'school_name', 'is_active']
-    list_filter = ['is_active', 'created_at', 'school_name']
+    list_filter = ['is_active', 'school', 'created_at']
     search_fields = ['child_name', 'parent__first_name', 'parent__last_name', 'school_name']
     ordering = ['child_name']
+
+
+@admin.register(DriverTrackingState)
+class DriverTrackingStateAdmin(admin.ModelAdmin):
+    list_display = ['driver', 'is_enabled', 'updated_at']
+    list_filter = ['is_enabled']
+    raw_id_fields = ['driver']
+
+
+class RouteStopInline(admin.TabularInline):
+    model = RouteStop
+    fields = ['sequence', 'name', 'latitude', 'longitude', 'child_assignment', 'distance_along_meters']
+    readonly_fields = ['distance_along_meters']
+    raw_id_fields = ['child_assignment']
+    extra = 0
+
+
+@admin.register(Route)
+class RouteAdmin(admin.ModelAdmin):
+    list_display = ['name', 'length_meters', 'is_active', 'updated_at']
+    list_filter = ['is_active']
+    search_fields = ['name']
+    readonly_fields = ['length_meters']
+    exclude = ['segment_index']
+    inlines = [RouteStopInline]
+
+
+@admin.register(DailyDriverStats)
+class DailyDriverStatsAdmin(admin.ModelAdmin):
+    list_display = [
+        'date', 'driver', 'van_assignment', 'distance_meters', 'moving_seconds',
+        'idle_seconds', 'max_speed_kmh', 'point_count'
+    ]
+    list_select_related = ['driver', 'van_assignment']
+    date_hierarchy = 'date'
+    raw_id_fields = ['driver', 'van_assignment']
+    readonly_fields = ['updated_at']
+    ordering = ['-date', 'driver']
@@ -0,0 +1,170 @@
+"""
+"Van is nearly here" alerts for parents.
+
+Each driver's active children's stops are bucketed into a square grid (cached,
+rebuilt when assignments change). On every location update only the grid
+cells around the van are looked at, so the cost depends on the number of
+nearby stops rather than on the size of the roster.
+
+A stop is in range when the van is within ``radius_meters`` of it or, when
+the van's speed is known, expected there within ``eta_minutes``. Each parent
+gets one alert per stop per trip: the dedupe marker is claimed with an atomic
+``cache.add`` so concurrent updates can't alert twice.
+
+Alerts are sent as the ``proximity_alert`` signal; delivery is up to the
+receivers.
+"""
+import math
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .geo import haversine_m
+from .map_matching import Projection
+from .models import ChildVanAssignment
+from .tracking import get_schedule, is_on_shift
+
+# Sent with ``alert`` (a ProximityAlert) once per parent, stop and trip
+proximity_alert = Signal()
+
+ProximityAlert = namedtuple(
+    "ProximityAlert",
+    [
+        "parent_id", "child_assignment_ids", "child_names", "driver_id", "van_assignment_id",
+        "van_number", "stop_latitude", "stop_longitude", "distance_meters", "eta_minutes", "trip",
+    ],
+)
+
+
+def _index_cache_key(driver_id):
+    return f"alerts:stops:{driver_id}"
+
+
+def invalidate_stop_index(driver_id):
+    cache.delete(_index_cache_key(driver_id))
+
+
+def _cell(x, y, cell_size):
+    return f"{math.floor(x / cell_size)}:{math.floor(y / cell_size)}"
+
+
+def build_stop_index(driver_id):
+    """Grid of the stops of the children on the driver's active vans"""
+    rows = ChildVanAssignment.objects.filter(
+        van_assignment__driver_id=driver_id,
+        van_assignment__is_active=True,
+        is_active=True,
+        stop_latitude__isnull=False,
+        stop_longitude__isnull=False
+    ).values_list(
+        'pk', 'parent_id', 'child_name', 'stop_latitude', 'stop_longitude',
+        'van_assignment_id', 'van_assignment__van_number'
+    ).order_by('pk')
+
+    # Siblings on the same van share one entry per parent and stop
+    stops = {}
+    for pk, parent_id, child_name, latitude, longitude, van_id, van_number in rows:
+        key = (parent_id, van_id, float(latitude), float(longitude))
+        stop = stops.setdefault(key, [parent_id, [], [], float(latitude), float(longitude), van_id, van_number])
+        stop[1].append(pk)
+        stop[2].append(child_name)
+
+    if not stops:
+        return {"origin": None, "cell_size": None, "cells": {}}
+
+    cell_size = settings.PROXIMITY_ALERTS["max_radius_meters"]
+    first = next(iter(stops.values()))
+    projection = Projection(first[3], first[4])
+    cells = {}
+    for stop in stops.values():
+        cells.setdefault(_cell(*projection.to_xy(stop[3], stop[4]), cell_size), []).append(stop)
+    return {"origin": [first[3], first[4]], "cell_size": cell_size, "cells": cells}
+
+
+def get_stop_index(driver_id):
+    return cache.get_or_set(
+        _index_cache_key(driver_id),
+        lambda: build_stop_index(driver_id),
+        settings.TRACKING_SCHEDULE_CACHE_SECONDS
+    )
+
+
+def nearby_stops(index, latitude, longitude, radius):
+    """Stops in the grid cells within ``radius`` meters of the point"""
+    if index["origin"] is None:
+        return []
+    projection = Projection(*index["origin"])
+    x, y = projection.to_xy(latitude, longitude)
+    cell_size = index["cell_size"]
+    span = max(1, math.ceil(radius / cell_size))
+    cx, cy = math.floor(x / cell_size), math.floor(y / cell_size)
+
+    found = []
+    for dx in range(-span, span + 1):
+        for dy in range(-span, span + 1):
+            found.extend(index["cells"].get(f"{cx + dx}:{cy + dy}", ()))
+    return found
+
+
+def current_trip(now):
+    """Morning pickup and afternoon drop-off are separate trips"""
+    return f"{now.date().isoformat()}:{'pickup' if now.hour < 12 else 'dropoff'}"
+
+
+def check_proximity(driver_id, latitude, longitude, speed=None, now=None):
+    """
+    Emit alerts for stops the van has just come within range of. Returns the
+    alerts sent by this call.
+    """
+    options = settings.PROXIMITY_ALERTS
+    if not options["enabled"] or latitude is None or longitude is None:
+        return []
+
+    now = timezone.localtime(now or timezone.now())
+    if not is_on_shift(get_schedule(driver_id), now):
+        return []
+
+    latitude, longitude = float(latitude), float(longitude)
+    speed_mps = float(speed) / 3.6 if speed else 0.0
+    if not math.isfinite(speed_mps) or speed_mps < 0:
+        # iOS reports -1 when it has no speed fix
+        speed_mps = 0.0
+    radius = min(
+        options["max_radius_meters"],
+        max(options["radius_meters"], speed_mps * options["eta_minutes"] * 60)
+    )
+
+    trip = current_trip(now)
+    alerts = []
+    for parent_id, child_ids, child_names, stop_lat, stop_lon, van_id, van_number in nearby_stops(
+        get_stop_index(driver_id), latitude, longitude, radius
+    ):
+        distance = haversine_m(latitude, longitude, stop_lat, stop_lon)
+        eta = distance / speed_mps / 60 if speed_mps else None
+        in_range = distance <= options["radius_meters"] or (eta is not None and eta <= options["eta_minutes"])
+        if not in_range:
+            continue
+
+        dedupe_key = f"alerts:sent:{trip}:{parent_id}:{stop_lat},{stop_lon}"
+        if not cache.add(dedupe_key, 1, options["dedupe_seconds"]):
+            continue
+
+        alert = ProximityAlert(
+            parent_id=parent_id,
+            child_assignment_ids=child_ids,
+            child_names=child_names,
+            driver_id=driver_id,
+            van_assignment_id=van_id,
+            van_number=van_number,
+            stop_latitude=stop_lat,
+            stop_longitude=stop_lon,
+            distance_meters=round(distance),
+            eta_minutes=round(eta, 1) if eta is not None else None,
+            trip=trip,
+        )
+        proximity_alert.send(sender=ProximityAlert, alert=alert)
+        alerts.append(alert)
+    return alerts
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class LocationsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'locations'
+
+    def ready(self):
+        from school_van_tracker import checks  # noqa: F401
+
+        from . import signals  # noqa: F401
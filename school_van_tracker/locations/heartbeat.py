@@ -0,0 +1,175 @@
+"""
+Stale-van detection from upload heartbeats.
+
+Every upload (``update_location`` and the batch upload) stores the time the
+server received it, plus the upload interval the app was told to keep, under
+``heartbeat:{driver_id}`` in the cache. That is one cache write per request,
+with no extra queries.
+
+``HeartbeatMonitor`` runs in one process (``manage.py monitor_heartbeats
+--loop``). It keeps a min-heap of (deadline, driver) for the drivers of
+active vans. A driver's deadline is its last heartbeat plus
+``HEARTBEAT["missed_intervals"]`` upload intervals, and never less than
+``stale_after_seconds``. Each tick pops only the deadlines that have passed
+and reads those drivers' heartbeats with one ``get_many``:
+
+- a newer heartbeat moves the deadline on;
+- no heartbeat in time, inside one of the van's scheduled pickup/drop-off
+  windows, raises ``van_stale`` once;
+- a van that reports again after going stale raises ``van_recovered``.
+
+Heartbeats cross processes through the cache, so the monitor refuses to
+run on a per-process cache (LocMem), where it would see none.
+
+Outside its windows a silent van is not reported, since the app uploads
+rarely off shift and a van with no schedule is not expected to move.
+Each tick costs O(due vans × log active vans). The Location table is never
+read.
+
+Delivery of the events is up to the receivers, as with proximity alerts.
+"""
+import datetime
+import heapq
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import VanAssignment
+from .tracking import get_schedule, is_on_shift, is_tracking_enabled
+
+# Sent with ``event`` (a StaleVan) when a van goes silent in a scheduled window
+van_stale = Signal()
+# Sent with ``event`` (a StaleVan) when a stale van reports again
+van_recovered = Signal()
+
+StaleVan = namedtuple(
+    "StaleVan",
+    ["driver_id", "van_assignment_id", "van_number", "last_seen", "silent_seconds", "tracking_enabled"],
+)
+
+Heartbeat = namedtuple("Heartbeat", ["seen_at", "interval_seconds"])
+
+
+def heartbeat_cache_key(driver_id):
+    return f"heartbeat:{driver_id}"
+
+
+def record_heartbeat(driver_id, interval_seconds, now=None):
+    """Note that ``driver_id`` uploaded just now and will upload again within ``interval_seconds``"""
+    cache.set(
+        heartbeat_cache_key(driver_id),
+        tuple(Heartbeat(now or time.time(), interval_seconds)),
+        settings.HEARTBEAT["cache_seconds"],
+    )
+
+
+def get_heartbeats(driver_ids):
+    """{driver_id: Heartbeat} for the drivers with one cached"""
+    keys = {heartbeat_cache_key(driver_id): driver_id for driver_id in driver_ids}
+    return {keys[key]: Heartbeat(*value) for key, value in cache.get_many(keys).items()}
+
+
+def _datetime(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp, tz=datetime.timezone.utc)
+
+
+def deadline(heartbeat):
+    options = settings.HEARTBEAT
+    allowance = max(options["stale_after_seconds"], heartbeat.interval_seconds * options["missed_intervals"])
+    return heartbeat.seen_at + allowance
+
+
+class HeartbeatMonitor:
+    def __init__(self, now=None):
+        self.started_at = now or time.time()
+        self.heap = []
+        # driver_id -> (van_assignment_id, van_number)
+        self.vans = {}
+        # driver_id -> the deadline of its live heap entry; older entries are skipped
+        self.deadlines = {}
+        # driver_id -> StaleVan raised and not yet recovered
+        self.stale = {}
+        self.refreshed_at = None
+
+    def schedule(self, driver_id, at):
+        self.deadlines[driver_id] = at
+        heapq.heappush(self.heap, (at, driver_id))
+
+    def refresh(self, now):
+        """Reload the active vans. Vans that are new get checked on the next tick."""
+        # Ordered oldest first so a driver's newest van wins
+        active = {
+            driver_id: (pk, van_number)
+            for driver_id, pk, van_number in VanAssignment.objects.filter(is_active=True)
+            .order_by('created_at')
+            .values_list('driver_id', 'pk', 'van_number')
+        }
+        for driver_id in active.keys() - self.vans.keys():
+            self.schedule(driver_id, now)
+        for driver_id in self.vans.keys() - active.keys():
+            self.deadlines.pop(driver_id, None)
+            self.stale.pop(driver_id, None)
+        self.vans = active
+        self.refreshed_at = now
+
+    def due(self, now):
+        """Pop the drivers whose deadline has passed"""
+        drivers = []
+        while self.heap and self.heap[0][0] <= now:
+            at, driver_id = heapq.heappop(self.heap)
+            if self.deadlines.get(driver_id) == at:
+                del self.deadlines[driver_id]
+                drivers.append(driver_id)
+        return drivers
+
+    def in_window(self, driver_id, now):
+        schedule = get_schedule(driver_id)
+        has_schedule = schedule["pickup_times"] or schedule["dropoff_times"]
+        return bool(has_schedule) and is_on_shift(schedule, timezone.localtime(_datetime(now)))
+
+    def check(self, now=None):
+        """Process the passed deadlines. Returns the events sent, as (signal, StaleVan) pairs."""
+        options = settings.HEARTBEAT
+        now = now or time.time()
+        if self.refreshed_at is None or now - self.refreshed_at >= options["refresh_seconds"]:
+            self.refresh(now)
+
+        drivers = self.due(now)
+        heartbeats = get_heartbeats(drivers)
+        events = []
+        for driver_id in drivers:
+            heartbeat = heartbeats.get(driver_id)
+            due_at = deadline(heartbeat) if heartbeat else self.started_at + options["stale_after_seconds"]
+            if due_at > now:
+                if driver_id in self.stale:
+                    events.append((van_recovered, self.event(driver_id, heartbeat, now)))
+                    del self.stale[driver_id]
+                self.schedule(driver_id, due_at)
+                continue
+
+            if driver_id not in self.stale and self.in_window(driver_id, now):
+                event = self.event(driver_id, heartbeat, now)
+                self.stale[driver_id] = event
+                events.append((van_stale, event))
+            # Look again soon, to notice when it reports again
+            self.schedule(driver_id, now + options["recheck_seconds"])
+
+        for signal, event in events:
+            signal.send(sender=HeartbeatMonitor, event=event)
+        return events
+
+    def event(self, driver_id, heartbeat, now):
+        van_assignment_id, van_number = self.vans[driver_id]
+        last_seen = heartbeat.seen_at if heartbeat else None
+        return StaleVan(
+            driver_id=driver_id,
+            van_assignment_id=van_assignment_id,
+            van_number=van_number,
+            last_seen=_datetime(last_seen) if last_seen else None,
+            silent_seconds=round(now - last_seen) if last_seen else None,
+            tracking_enabled=is_tracking_enabled(driver_id),
+        )
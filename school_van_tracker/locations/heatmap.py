@@ -0,0 +1,201 @@
+"""
+Grid aggregation of location history for heatmaps.
+
+Points in a time window are binned into square cells of roughly
+``cell_size`` meters. Rows are ``cell_size / 111 km`` degrees of latitude
+tall, and each row's cells are as many degrees of longitude wide as
+``cell_size`` meters at that row's latitude. The grid is fixed worldwide, so
+the same cell always gets the same id whatever window or area is asked for.
+
+Binning and the per-cell statistics (count, mean and percentile speed, share
+of idle points) are vectorised with NumPy. Windows are aligned to
+``window_align_minutes`` so repeated requests hit the cache. Windows that
+have fully ended are cached for ``cache_seconds``, the live one for
+``live_cache_seconds``.
+
+Without a school the grid covers every school, read from each tenant
+database in turn.
+"""
+import datetime
+import hashlib
+from itertools import chain
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from accounts.models import User
+from school_van_tracker.tenancy import school_cache_key, tenant_querysets
+
+from .models import Location
+
+METERS_PER_DEGREE = 111195.0
+
+
+def align_window(start, end):
+    """Widen [start, end) outwards to whole ``window_align_minutes`` buckets"""
+    step = settings.HEATMAP["window_align_minutes"] * 60
+    start_ts = int(start.timestamp()) // step * step
+    end_ts = -(-int(end.timestamp()) // step) * step
+    return (
+        datetime.datetime.fromtimestamp(start_ts, tz=datetime.timezone.utc),
+        datetime.datetime.fromtimestamp(end_ts, tz=datetime.timezone.utc),
+    )
+
+
+def cell_indices(latitudes, longitudes, cell_size):
+    """Row and column of the grid cell containing each point"""
+    lat_step = cell_size / METERS_PER_DEGREE
+    rows = np.floor(latitudes / lat_step).astype(np.int64)
+    row_latitudes = np.radians((rows + 0.5) * lat_step)
+    lon_steps = lat_step / np.maximum(np.cos(row_latitudes), 1e-6)
+    columns = np.floor(longitudes / lon_steps).astype(np.int64)
+    return rows, columns
+
+
+def cell_centers(rows, columns, cell_size):
+    lat_step = cell_size / METERS_PER_DEGREE
+    latitudes = (rows + 0.5) * lat_step
+    lon_steps = lat_step / np.maximum(np.cos(np.radians(latitudes)), 1e-6)
+    return latitudes, (columns + 0.5) * lon_steps
+
+
+def _group_percentiles(groups, values, group_count, percentiles):
+    """
+    Linear-interpolated percentiles of ``values`` per group (``groups`` holds
+    each value's group index). Groups without values get NaN.
+    """
+    order = np.lexsort((values, groups))
+    groups, values = groups[order], values[order]
+    sizes = np.bincount(groups, minlength=group_count)
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    has_values = sizes > 0
+
+    result = {}
+    for percentile in percentiles:
+        position = starts + (np.maximum(sizes, 1) - 1) * percentile / 100
+        lower = np.floor(position).astype(np.int64)
+        upper = np.minimum(lower + 1, starts + np.maximum(sizes, 1) - 1)
+        fraction = position - lower
+        column = np.full(group_count, np.nan)
+        if len(values):
+            lower_values = values[np.minimum(lower, len(values) - 1)]
+            upper_values = values[np.minimum(upper, len(values) - 1)]
+            column[has_values] = (lower_values + (upper_values - lower_values) * fraction)[has_values]
+        result[percentile] = column
+    return result
+
+
+def aggregate(latitudes, longitudes, speeds, cell_size, min_points=1):
+    """
+    Per-cell statistics for arrays of points (speeds in km/h, NaN if
+    unknown). Returns a list of dicts ordered by cell.
+    """
+    options = settings.HEATMAP
+    if not len(latitudes):
+        return []
+
+    rows, columns = cell_indices(latitudes, longitudes, cell_size)
+    # One int64 key per cell sorts far faster than unique rows of a 2-D array
+    keys, inverse = np.unique((rows << 32) + (columns + (1 << 31)), return_inverse=True)
+    cell_rows = keys >> 32
+    cell_columns = (keys & 0xFFFFFFFF) - (1 << 31)
+    cell_count = len(keys)
+
+    counts = np.bincount(inverse, minlength=cell_count)
+    known = ~np.isnan(speeds)
+    speed_counts = np.bincount(inverse[known], minlength=cell_count)
+    speed_sums = np.bincount(inverse[known], weights=speeds[known], minlength=cell_count)
+    idle_counts = np.bincount(
+        inverse[known & (speeds < settings.LOCATION_ROLLUPS["idle_speed_kmh"])], minlength=cell_count
+    )
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_speeds = speed_sums / speed_counts
+        idle_shares = idle_counts / speed_counts
+    percentiles = _group_percentiles(inverse[known], speeds[known], cell_count, options["percentiles"])
+    center_lats, center_lons = cell_centers(cell_rows, cell_columns, cell_size)
+
+    def number(value, digits):
+        return None if np.isnan(value) else round(float(value), digits)
+
+    result = []
+    for i in np.flatnonzero(counts >= min_points):
+        cell = {
+            "cell": f"{cell_rows[i]}:{cell_columns[i]}",
+            "latitude": round(float(center_lats[i]), 6),
+            "longitude": round(float(center_lons[i]), 6),
+            "count": int(counts[i]),
+            "mean_speed_kmh": number(mean_speeds[i], 1),
+            "idle_share": number(idle_shares[i], 3),
+        }
+        for percentile in options["percentiles"]:
+            cell[f"p{percentile}_speed_kmh"] = number(percentiles[percentile][i], 1)
+        result.append(cell)
+    return result
+
+
+def load_points(start, end, bbox=None, driver_id=None, school_id=None):
+    """Latitude, longitude and speed arrays for the points recorded in [start, end)"""
+    points = Location.objects.filter(timestamp__gte=start, timestamp__lt=end)
+    if driver_id:
+        points = points.filter(driver_id=driver_id)
+    if school_id:
+        # Users live on default, so no join from a tenant database
+        drivers = User.objects.filter(school_id=school_id).values_list('pk', flat=True)
+        points = points.filter(driver_id__in=list(drivers))
+    if bbox:
+        south, west, north, east = bbox
+        points = points.filter(
+            latitude__gte=south, latitude__lte=north, longitude__gte=west, longitude__lte=east
+        )
+    # Casting in the query skips building a Decimal per coordinate
+    points = points.order_by().annotate(
+        lat=Cast('latitude', FloatField()),
+        lon=Cast('longitude', FloatField())
+    ).values_list('lat', 'lon', 'speed')
+    rows = chain.from_iterable(
+        queryset.iterator(chunk_size=settings.HEATMAP["chunk_size"])
+        for queryset in tenant_querysets(points, school_id)
+    )
+
+    chunks = []
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= settings.HEATMAP["chunk_size"]:
+            chunks.append(np.array(chunk, dtype=float))
+            chunk = []
+    if chunk:
+        chunks.append(np.array(chunk, dtype=float))
+    if not chunks:
+        empty = np.empty(0)
+        return empty, empty, empty
+
+    # None speeds become NaN in the float array
+    points = np.concatenate(chunks)
+    return points[:, 0], points[:, 1], points[:, 2]
+
+
+def get_heatmap(start, end, cell_size, bbox=None, driver_id=None, min_points=1, school_id=None):
+    """Cached grid for an aligned window; see the module docstring"""
+    options = settings.HEATMAP
+    start, end = align_window(start, end)
+    raw_key = f"{start.isoformat()}|{end.isoformat()}|{cell_size}|{bbox}|{driver_id}|{min_points}"
+    cache_key = school_cache_key(school_id, f"heatmap:{hashlib.sha256(raw_key.encode()).hexdigest()}")
+
+    heatmap = cache.get(cache_key)
+    if heatmap is None:
+        latitudes, longitudes, speeds = load_points(start, end, bbox, driver_id, school_id)
+        heatmap = {
+            "from": start,
+            "to": end,
+            "cell_size_meters": cell_size,
+            "point_count": len(latitudes),
+            "cells": aggregate(latitudes, longitudes, speeds, cell_size, min_points),
+        }
+        is_closed = end <= timezone.now()
+        cache.set(cache_key, heatmap, options["cache_seconds"] if is_closed else options["live_cache_seconds"])
+    return heatmap
@@ -0,0 +1,173 @@
+"""
+Idempotent, order-independent storage of driver GPS points.
+
+The app buffers points while offline and uploads them later, possibly more
+than once. Every point carries the time it was recorded (``recorded_at``)
+and a client-generated ``idempotency_key``:
+
+- Points are inserted with ``INSERT ... ON CONFLICT DO NOTHING`` against the
+  unique (driver, idempotency_key) index, so a retried upload is dropped by
+  the database without reading first. One read afterwards tells which
+  points were new.
+- The newest new point becomes the current position only if no newer point
+  is already current, and only older points are demoted. A late point is
+  stored as history without moving the van backwards on the parents' map.
+- Route matching and proximity alerts run for the current position only.
+
+Points are written to the database of the driver's school (see
+``school_van_tracker.tenancy``).
+"""
+import datetime
+import uuid
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import IntegrityError, router, transaction
+from django.db.models import Exists, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from school_van_tracker.tenancy import use_school
+
+from .alerts import check_proximity
+from .map_matching import match_driver_location
+from .models import Location
+
+IngestResult = namedtuple("IngestResult", ["locations", "created", "current", "alerts"])
+
+OPTIONAL_FIELDS = ('accuracy', 'speed', 'heading', 'altitude')
+
+
+def parse_recorded_at(value, now):
+    """ISO 8601 string or Unix time (seconds or milliseconds); None means now"""
+    if value in (None, ''):
+        return now
+    if isinstance(value, (int, float)) or str(value).replace('.', '', 1).isdigit():
+        seconds = float(value)
+        if seconds > 1e11:
+            seconds /= 1000
+        try:
+            recorded_at = datetime.datetime.fromtimestamp(seconds, tz=datetime.timezone.utc)
+        except (OverflowError, OSError, ValueError):
+            raise ValueError(f"Invalid recorded_at: {value}")
+    else:
+        recorded_at = parse_datetime(str(value))
+        if recorded_at is None:
+            raise ValueError(f"Invalid recorded_at: {value}")
+        if timezone.is_naive(recorded_at):
+            recorded_at = timezone.make_aware(recorded_at)
+
+    # A device clock running ahead must not pin a point as "newest" forever
+    skew = timezone.timedelta(seconds=settings.LOCATION_MAX_CLOCK_SKEW_SECONDS)
+    return min(recorded_at, now + skew)
+
+
+def build_location(driver_id, data, now, school_id=None):
+    """Validate one uploaded point into an unsaved, inactive Location"""
+    try:
+        latitude = Decimal(str(data.get('latitude')))
+        longitude = Decimal(str(data.get('longitude')))
+        in_range = -90 <= latitude <= 90 and -180 <= longitude <= 180
+    except InvalidOperation:
+        raise ValueError("Latitude and longitude must be numbers")
+    if not in_range:
+        raise ValueError("Latitude and longitude are out of range")
+
+    optional = {}
+    for field in OPTIONAL_FIELDS:
+        value = data.get(field)
+        if value in (None, ''):
+            continue
+        try:
+            optional[field] = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{field} must be a number")
+
+    key = data.get('idempotency_key')
+    return Location(
+        driver_id=driver_id,
+        school_id=school_id,
+        latitude=round(latitude, 6),
+        longitude=round(longitude, 6),
+        timestamp=parse_recorded_at(data.get('recorded_at'), now),
+        received_at=now,
+        # Without a client key the point can't be deduplicated, but still
+        # needs one to be found again after the insert
+        idempotency_key=str(key)[:64] if key else uuid.uuid4().hex,
+        is_active=False,
+        **optional
+    )
+
+
+def _promote(location):
+    """Make ``location`` current unless a newer point already is. Returns True if it was."""
+    same_driver = Location.objects.filter(driver_id=location.driver_id, is_active=True)
+    newer = same_driver.filter(
+        Q(timestamp__gt=location.timestamp) | Q(timestamp=location.timestamp, pk__gt=location.pk)
+    )
+    promoted = Location.objects.filter(pk=location.pk).filter(~Exists(newer)).update(is_active=True)
+    if promoted:
+        same_driver.filter(
+            Q(timestamp__lt=location.timestamp) | Q(timestamp=location.timestamp, pk__lt=location.pk)
+        ).update(is_active=False)
+    return bool(promoted)
+
+
+def ingest_points(driver_id, points, school_id=None):
+    """
+    Store uploaded points for a driver. Returns an IngestResult with the
+    stored Location for every input point (the earlier copy for duplicates),
+    the pks created by this call, the current Location if one of the new
+    points became current, and the proximity alerts sent.
+    """
+    now = timezone.now()
+    candidates = [build_location(driver_id, point, now, school_id) for point in points]
+
+    with use_school(school_id):
+        return _store(driver_id, candidates, now)
+
+
+def _store(driver_id, candidates, now):
+    with transaction.atomic(using=router.db_for_write(Location)):
+        Location.objects.bulk_create(candidates, ignore_conflicts=True)
+        stored = {
+            location.idempotency_key: location
+            for location in Location.objects.filter(
+                driver_id=driver_id,
+                idempotency_key__in={c.idempotency_key for c in candidates}
+            )
+        }
+        missing = [c.idempotency_key for c in candidates if c.idempotency_key not in stored]
+        if missing:
+            # ignore_conflicts drops any failed row, not only duplicates
+            raise IntegrityError(f"Points {', '.join(missing[:5])} were not stored")
+        locations = [stored[c.idempotency_key] for c in candidates]
+        # A row this call inserted is the candidate it was given; an earlier
+        # copy was received at another time
+        created = {
+            location.pk for location, candidate in zip(locations, candidates)
+            if (location.received_at, location.timestamp) == (candidate.received_at, candidate.timestamp)
+        }
+
+        current = None
+        if created:
+            newest = max(
+                (location for location in locations if location.pk in created),
+                key=lambda location: (location.timestamp, location.pk)
+            )
+            if _promote(newest):
+                current = newest
+                current.is_active = True
+
+    alerts = []
+    if current is not None:
+        match = match_driver_location(driver_id, current.latitude, current.longitude)
+        if match:
+            current.route_progress = match.progress_pct
+            current.distance_along_route = match.distance_along_m
+            current.route_offset = match.offset_m
+            current.save(update_fields=['route_progress', 'distance_along_route', 'route_offset'])
+        alerts = check_proximity(driver_id, current.latitude, current.longitude, speed=current.speed)
+
+    return IngestResult(locations=locations, created=created, current=current, alerts=alerts)
@@ -0,0 +1,81 @@
+import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+
+from accounts.models import User
+from locations.rollups import _active_vans, backfill_driver, rollup_watermark, save_day
+from school_van_tracker.tenancy import school_database
+
+
+def _backfill(job):
+    driver_id, start_date, end_date, max_location_id, using = job
+    try:
+        return backfill_driver(driver_id, start_date, end_date, max_location_id, using)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute daily driver rollups from raw Location rows, one driver per worker process. "
+        "Stop rollup_locations while this runs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--since", type=datetime.date.fromisoformat, help="First day (YYYY-MM-DD)")
+        parser.add_argument(
+            "--until",
+            type=datetime.date.fromisoformat,
+            help="Last day (YYYY-MM-DD, default: today)",
+        )
+        parser.add_argument("--driver", type=int, action="append", help="Only this driver id (repeatable)")
+        parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per CPU)")
+
+    def handle(self, *args, **options):
+        until = options["until"] or timezone.localdate()
+        since = options["since"] or datetime.date(2000, 1, 1)
+        if since > until:
+            raise CommandError("--since must not be after --until")
+
+        drivers = User.objects.filter(user_type="driver").order_by("pk")
+        if options["driver"]:
+            drivers = drivers.filter(pk__in=options["driver"])
+        schools = dict(drivers.values_list("pk", "school_id"))
+        driver_ids = list(schools)
+        databases = {driver_id: school_database(school_id) for driver_id, school_id in schools.items()}
+
+        # Days are rebuilt from the rows the catch-up job on each database has already counted
+        watermarks = {alias: rollup_watermark(alias) for alias in set(databases.values())}
+        jobs = [
+            (driver_id, since, until, watermarks[databases[driver_id]], databases[driver_id])
+            for driver_id in driver_ids
+        ]
+
+        if options["workers"] == 1 or len(jobs) <= 1:
+            # In this process, whose connections stay open
+            results = (backfill_driver(*job) for job in jobs)
+            executor = None
+        else:
+            # Forked workers must not share the parent's database connections
+            connections.close_all()
+            executor = ProcessPoolExecutor(max_workers=options["workers"], initializer=django.setup)
+            results = executor.map(_backfill, jobs)
+
+        vans = _active_vans(driver_ids)
+        days = 0
+        try:
+            for driver_days in results:
+                for driver_id, date, values in driver_days:
+                    save_day(
+                        driver_id, date, values, vans.get(driver_id), schools[driver_id], databases[driver_id]
+                    )
+                    days += 1
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {days} driver-days for {len(driver_ids)} drivers"))
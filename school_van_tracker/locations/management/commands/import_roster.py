@@ -0,0 +1,56 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import School
+from locations.roster import RosterError, import_roster, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Import drivers, vans, parents and children from a CSV or XLSX roster with one row per child. "
+        "Re-importing a sheet updates the existing rows."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("file", help="Path to a .csv or .xlsx file")
+        parser.add_argument("--school", help="School id or slug the drivers, vans and children belong to")
+        parser.add_argument("--dry-run", action="store_true", help="Validate and report without saving")
+        parser.add_argument("--chunk-size", type=int, default=None, help="Rows written per transaction")
+        parser.add_argument("--errors", help="Write the rejected rows to this CSV file")
+
+    def handle(self, *args, **options):
+        school = None
+        if options["school"]:
+            lookup = {"pk": options["school"]} if options["school"].isdigit() else {"slug": options["school"]}
+            school = School.objects.filter(**lookup).first()
+            if school is None:
+                raise CommandError(f"No school {options['school']}")
+
+        try:
+            with open(options["file"], "rb") as file:
+                report = import_roster(
+                    read_rows(file, options["file"]),
+                    school=school,
+                    dry_run=options["dry_run"],
+                    chunk_size=options["chunk_size"],
+                )
+        except (OSError, RosterError) as e:
+            raise CommandError(str(e))
+
+        summary = report.as_dict()
+        for row, message in report.errors:
+            self.stderr.write(f"Row {row}: {message}")
+        if options["errors"]:
+            with open(options["errors"], "w", newline="") as file:
+                writer = csv.writer(file)
+                writer.writerow(["row", "error"])
+                writer.writerows(report.errors)
+
+        counts = ", ".join(
+            f"{kind}: {summary['created'][kind]} new, {summary['updated'][kind]} updated" for kind in summary["created"]
+        )
+        prefix = "Dry run: " if options["dry_run"] else ""
+        self.stdout.write(
+            self.style.SUCCESS(f"{prefix}{summary['imported']} of {summary['rows']} rows imported ({counts})")
+        )
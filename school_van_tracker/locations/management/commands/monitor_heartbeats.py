@@ -0,0 +1,48 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from locations.heartbeat import HeartbeatMonitor, van_stale
+from school_van_tracker.cache_utils import is_process_local_cache
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Raise van_stale/van_recovered events for active vans that stop uploading during their "
+        "pickup/drop-off windows. Run one instance."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--loop", action="store_true", help="Keep running, checking every --tick seconds")
+        parser.add_argument(
+            "--tick",
+            type=float,
+            default=settings.HEARTBEAT["tick_seconds"],
+            help="Seconds between checks, with --loop",
+        )
+
+    def handle(self, *args, **options):
+        # Heartbeats are written by the web workers; a per-process cache
+        # would leave this process seeing none and every van go stale
+        if is_process_local_cache():
+            raise CommandError("monitor_heartbeats needs a cache shared with the web workers (set REDIS_URL)")
+        monitor = HeartbeatMonitor()
+        while True:
+            for signal, event in monitor.check():
+                if signal is van_stale:
+                    silent = f"silent for {event.silent_seconds}s" if event.last_seen else "not reporting"
+                    disabled = " (tracking turned off)" if not event.tracking_enabled else ""
+                    logger.warning(f"⚠️ Van {event.van_number} {silent}{disabled}")
+                else:
+                    logger.info(f"✅ Van {event.van_number} reporting again")
+            if not options["loop"]:
+                break
+            time.sleep(options["tick"])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Watching {len(monitor.vans)} active vans, {len(monitor.stale)} stale"
+        ))
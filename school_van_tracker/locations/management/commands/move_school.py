@@ -0,0 +1,138 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from accounts.models import School, User
+from locations.models import DailyDriverStats, Location
+from school_van_tracker.tenancy import invalidate_school_databases, school_database, tenant_databases
+
+COPIED_FIELDS = [
+    field.attname for field in Location._meta.concrete_fields if not field.primary_key and field.attname != "school_id"
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Move a school's location history to another tenant database. Points are copied while the school "
+        "keeps writing to its old database, then the school is switched over and the points that arrived "
+        "in the meantime are copied too. Daily rollups are rebuilt on the new database by rollup_locations."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("school", help="School id or slug")
+        parser.add_argument("database", help="Target database alias (default or one of TENANT_DATABASES)")
+        parser.add_argument("--chunk-size", type=int, default=5000, help="Rows copied per transaction")
+        parser.add_argument(
+            "--wait",
+            type=float,
+            default=settings.TENANT_MAP_SECONDS,
+            help="Seconds to wait after switching for every process to write to the new database",
+        )
+        parser.add_argument(
+            "--delete-source",
+            action="store_true",
+            help="Delete the school's points and rollups from the old database afterwards",
+        )
+
+    def handle(self, *args, **options):
+        lookup = {"pk": options["school"]} if options["school"].isdigit() else {"slug": options["school"]}
+        school = School.objects.filter(**lookup).first()
+        if school is None:
+            raise CommandError(f"No school {options['school']}")
+        target = options["database"]
+        if target not in tenant_databases():
+            raise CommandError(f"{target} is not a tenant database: {', '.join(tenant_databases())}")
+        invalidate_school_databases()
+        source = school_database(school.pk)
+        if source == target:
+            raise CommandError(f"{school} is already on {target}")
+
+        driver_ids = list(User.objects.filter(school=school).values_list("pk", flat=True))
+        chunk_size = options["chunk_size"]
+
+        # Bulk of the history while the school keeps writing to the source
+        copied, last_pk = self.copy(school, driver_ids, source, target, 0, chunk_size)
+        self.stdout.write(f"Copied {copied} points from {source} to {target}")
+
+        school.database = target
+        school.save(update_fields=["database", "updated_at"])
+        invalidate_school_databases()
+        self.stdout.write(f"Switched {school} to {target}, waiting {options['wait']:.0f}s for other processes")
+        time.sleep(options["wait"])
+
+        # Points written to the source before every process switched
+        delta, _ = self.copy(school, driver_ids, source, target, last_pk, chunk_size)
+        self.fix_current(driver_ids, target)
+        self.stdout.write(f"Copied {delta} points that arrived during the switch")
+
+        if options["delete_source"]:
+            deleted = self.delete(driver_ids, source, chunk_size)
+            DailyDriverStats.objects.using(source).filter(driver_id__in=driver_ids).delete()
+            self.stdout.write(f"Deleted {deleted} points from {source}")
+
+        self.stdout.write(self.style.SUCCESS(f"Moved {school} to {target}"))
+
+    def copy(self, school, driver_ids, source, target, after_pk, chunk_size):
+        """
+        Copy the drivers' points above ``after_pk`` in pk order. The copies
+        get new ids on the target. Points already there with the same
+        (driver, timestamp) are skipped, so a re-run after a partial failure
+        doesn't duplicate them; most points have no idempotency_key to
+        dedupe on. Returns (rows copied, last source pk).
+        """
+        copied = 0
+        while True:
+            rows = list(
+                Location.objects.using(source)
+                .filter(driver_id__in=driver_ids, pk__gt=after_pk)
+                .order_by("pk")
+                .values("pk", *COPIED_FIELDS)[:chunk_size]
+            )
+            if not rows:
+                return copied, after_pk
+            after_pk = rows[-1]["pk"]
+            # Rows are in pk (so roughly time) order, keeping this range narrow
+            existing = set(
+                Location.objects.using(target)
+                .filter(
+                    driver_id__in={row["driver_id"] for row in rows},
+                    timestamp__gte=min(row["timestamp"] for row in rows),
+                    timestamp__lte=max(row["timestamp"] for row in rows),
+                )
+                .values_list("driver_id", "timestamp")
+            )
+            locations = [
+                Location(school_id=school.pk, **{field: row[field] for field in COPIED_FIELDS})
+                for row in rows
+                if (row["driver_id"], row["timestamp"]) not in existing
+            ]
+            with transaction.atomic(using=target):
+                Location.objects.using(target).bulk_create(locations, ignore_conflicts=True)
+            copied += len(locations)
+
+    def fix_current(self, driver_ids, target):
+        """Keep one current point per driver when both databases had one during the switch"""
+        for driver_id in driver_ids:
+            current = (
+                Location.objects.using(target)
+                .filter(driver_id=driver_id, is_active=True)
+                .order_by("-timestamp", "-pk")
+                .values_list("pk", flat=True)
+            )
+            newest = current.first()
+            if newest is not None:
+                current.exclude(pk=newest).update(is_active=False)
+
+    def delete(self, driver_ids, source, chunk_size):
+        deleted = 0
+        while True:
+            pks = list(
+                Location.objects.using(source).filter(driver_id__in=driver_ids).values_list("pk", flat=True)[
+                    :chunk_size
+                ]
+            )
+            if not pks:
+                return deleted
+            deleted += Location.objects.using(source).filter(pk__in=pks).delete()[0]
@@ -0,0 +1,65 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+
+from locations.models import VanAssignment
+from locations.route_optimizer import apply_stop_order, load_van_stops, optimize_stops
+
+
+def _optimize(job):
+    van_id, stops, capacity, end, time_limit = job
+    return van_id, optimize_stops(stops, capacity=capacity, end=end, time_limit=time_limit)
+
+
+class Command(BaseCommand):
+    help = "Compute the pickup order for each active van, optionally saving it as the van's route stops"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--van", type=int, action="append", help="Only this van assignment id (repeatable)")
+        parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per CPU)")
+        parser.add_argument("--time-limit", type=float, default=None, help="Search seconds per van")
+        parser.add_argument("--end-lat", type=float, help="Latitude every route finishes at (e.g. the school)")
+        parser.add_argument("--end-lon", type=float, help="Longitude every route finishes at")
+        parser.add_argument("--apply", action="store_true", help="Save the order as RouteStop rows")
+
+    def handle(self, *args, **options):
+        if (options["end_lat"] is None) != (options["end_lon"] is None):
+            raise CommandError("--end-lat and --end-lon must be given together")
+        end = (options["end_lat"], options["end_lon"]) if options["end_lat"] is not None else None
+
+        vans = VanAssignment.objects.filter(is_active=True).select_related("route").order_by("pk")
+        if options["van"]:
+            vans = vans.filter(pk__in=options["van"])
+        vans = {van.pk: van for van in vans}
+
+        # Stops are read here; workers only get plain data to search over
+        jobs = []
+        for van in vans.values():
+            stops = load_van_stops(van)
+            if stops:
+                jobs.append((van.pk, stops, van.capacity, end, options["time_limit"]))
+        if not jobs:
+            self.stdout.write("No vans with child stops to optimise")
+            return
+
+        if options["workers"] == 1 or len(jobs) == 1:
+            results = list(map(_optimize, jobs))
+        else:
+            with ProcessPoolExecutor(max_workers=options["workers"], initializer=django.setup) as executor:
+                results = list(executor.map(_optimize, jobs))
+
+        for van_id, result in results:
+            van = vans[van_id]
+            line = (
+                f"Van {van.van_number}: {len(result.stops)} stops, "
+                f"{result.distance_m / 1000:.2f} km, {result.late_minutes} min late"
+            )
+            if result.over_capacity:
+                line += f", {result.over_capacity} over capacity"
+            self.stdout.write(line)
+            if options["apply"]:
+                apply_stop_order(van, result)
+
+        if options["apply"]:
+            self.stdout.write(self.style.SUCCESS(f"Saved stop order for {len(jobs)} vans"))
@@ -0,0 +1,42 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from locations.rollups import catch_up
+from school_van_tracker.tenancy import tenant_databases
+
+
+class Command(BaseCommand):
+    help = (
+        "Fold new Location rows into the daily driver rollups, starting from the stored watermark "
+        "of every tenant database"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.LOCATION_ROLLUPS["batch_size"],
+            help="Location rows read per transaction",
+        )
+        parser.add_argument("--loop", action="store_true", help="Keep running, polling for new rows")
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=30,
+            help="Seconds to wait between polls once caught up, with --loop",
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            processed = sum(catch_up(batch_size=options["batch_size"], using=alias) for alias in tenant_databases())
+            total += processed
+            if processed:
+                continue
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
+
+        self.stdout.write(self.style.SUCCESS(f"Rolled up {total} location points"))
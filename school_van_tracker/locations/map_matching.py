@@ -0,0 +1,220 @@
+"""
+Snap GPS points onto a route polyline and measure progress along it.
+
+``build_segment_index`` runs once when a route is saved. It projects the
+polyline onto a local flat plane (meters), stores the cumulative distance at
+every vertex and buckets segments into a square grid. Matching a point then
+only looks at the segments in the point's grid cell and its neighbours.
+
+A route that passes the same street twice is disambiguated with the van's
+previous progress: among equally close segments the one just ahead wins.
+"""
+import math
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .geo import EARTH_RADIUS_M
+from .models import Route, VanAssignment
+
+DEFAULT_CELL_SIZE_M = 200.0
+# Candidate segments this much further away than the closest are still
+# considered when picking the one that continues from the last position
+AMBIGUITY_TOLERANCE_M = 25.0
+
+MatchResult = namedtuple(
+    "MatchResult",
+    ["distance_along_m", "progress_pct", "offset_m", "segment", "latitude", "longitude"],
+)
+
+
+class Projection:
+    """Equirectangular projection around an origin, accurate at city scale"""
+
+    def __init__(self, origin_lat, origin_lon):
+        self.origin_lat = origin_lat
+        self.origin_lon = origin_lon
+        self.meters_per_deg_lat = math.radians(1) * EARTH_RADIUS_M
+        self.meters_per_deg_lon = self.meters_per_deg_lat * math.cos(math.radians(origin_lat))
+
+    def to_xy(self, lat, lon):
+        return (
+            (float(lon) - self.origin_lon) * self.meters_per_deg_lon,
+            (float(lat) - self.origin_lat) * self.meters_per_deg_lat,
+        )
+
+    def to_latlon(self, x, y):
+        return (
+            self.origin_lat + y / self.meters_per_deg_lat,
+            self.origin_lon + x / self.meters_per_deg_lon,
+        )
+
+
+def _cell(x, y, cell_size):
+    return int(math.floor(x / cell_size)), int(math.floor(y / cell_size))
+
+
+def build_segment_index(polyline, cell_size=DEFAULT_CELL_SIZE_M):
+    """
+    Precompute what matching needs from ``polyline`` ([[lat, lon], ...]).
+    The result is JSON-serialisable so it can be stored on the Route row.
+    """
+    if len(polyline) < 2:
+        return {
+            "origin": list(polyline[0]) if polyline else None,
+            "cell_size": cell_size,
+            "cumulative": [0.0] * len(polyline),
+            "cells": {},
+            "length": 0.0,
+        }
+
+    projection = Projection(*polyline[0])
+    points = [projection.to_xy(lat, lon) for lat, lon in polyline]
+
+    cumulative = [0.0]
+    cells = {}
+    for i in range(len(points) - 1):
+        (x1, y1), (x2, y2) = points[i], points[i + 1]
+        cumulative.append(cumulative[-1] + math.hypot(x2 - x1, y2 - y1))
+
+        # Every cell touched by the segment's bounding box
+        cx1, cy1 = _cell(min(x1, x2), min(y1, y2), cell_size)
+        cx2, cy2 = _cell(max(x1, x2), max(y1, y2), cell_size)
+        for cx in range(cx1, cx2 + 1):
+            for cy in range(cy1, cy2 + 1):
+                cells.setdefault(f"{cx}:{cy}", []).append(i)
+
+    return {
+        "origin": list(polyline[0]),
+        "cell_size": cell_size,
+        "cumulative": cumulative,
+        "cells": cells,
+        "length": cumulative[-1],
+    }
+
+
+class RouteMatcher:
+    def __init__(self, polyline, index):
+        self.index = index
+        self.length = index["length"]
+        self.cell_size = index["cell_size"]
+        self.cumulative = index["cumulative"]
+        self.cells = index["cells"]
+        self.projection = Projection(*index["origin"]) if index["origin"] else None
+        self.points = [self.projection.to_xy(lat, lon) for lat, lon in polyline] if self.projection else []
+
+    def _candidates(self, x, y):
+        cx, cy = _cell(x, y, self.cell_size)
+        segments = set()
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                segments.update(self.cells.get(f"{cx + dx}:{cy + dy}", ()))
+        # Far off the route: fall back to every segment
+        return segments or range(len(self.points) - 1)
+
+    def _project(self, segment, x, y):
+        (x1, y1), (x2, y2) = self.points[segment], self.points[segment + 1]
+        dx, dy = x2 - x1, y2 - y1
+        length_sq = dx * dx + dy * dy
+        t = 0.0 if length_sq == 0 else max(0.0, min(1.0, ((x - x1) * dx + (y - y1) * dy) / length_sq))
+        px, py = x1 + t * dx, y1 + t * dy
+        along = self.cumulative[segment] + t * math.sqrt(length_sq)
+        return math.hypot(x - px, y - py), along, px, py
+
+    def match(self, latitude, longitude, previous_distance_m=None):
+        """Match a point to the route. Returns a MatchResult or None for an empty route."""
+        if len(self.points) < 2:
+            return None
+
+        x, y = self.projection.to_xy(latitude, longitude)
+        projections = [(segment, *self._project(segment, x, y)) for segment in self._candidates(x, y)]
+        best_offset = min(p[1] for p in projections)
+        close = [p for p in projections if p[1] <= best_offset + AMBIGUITY_TOLERANCE_M]
+
+        if previous_distance_m is not None and len(close) > 1:
+            # Prefer the nearest continuation of the previous position
+            def continuation(p):
+                is_behind = p[2] < previous_distance_m - AMBIGUITY_TOLERANCE_M
+                return (is_behind, abs(p[2] - previous_distance_m))
+            segment, offset, along, px, py = min(close, key=continuation)
+        else:
+            segment, offset, along, px, py = min(close, key=lambda p: p[1])
+
+        snapped_lat, snapped_lon = self.projection.to_latlon(px, py)
+        progress = 100.0 * along / self.length if self.length else 0.0
+        return MatchResult(
+            distance_along_m=round(along, 1),
+            progress_pct=round(progress, 2),
+            offset_m=round(offset, 1),
+            segment=segment,
+            latitude=round(snapped_lat, 6),
+            longitude=round(snapped_lon, 6),
+        )
+
+
+# Matchers are rebuilt only when a route changes
+_matchers = OrderedDict()
+_MAX_MATCHERS = 256
+
+
+def get_matcher(route):
+    key = (route.pk, route.updated_at)
+    matcher = _matchers.get(key)
+    if matcher is None:
+        matcher = RouteMatcher(route.polyline, route.segment_index or build_segment_index(route.polyline))
+        _matchers[key] = matcher
+        if len(_matchers) > _MAX_MATCHERS:
+            _matchers.popitem(last=False)
+    else:
+        _matchers.move_to_end(key)
+    return matcher
+
+
+def _driver_route_key(driver_id):
+    return f"route:driver:{driver_id}"
+
+
+def _progress_key(driver_id):
+    return f"route:progress:{driver_id}"
+
+
+def invalidate_driver_route(driver_id):
+    cache.delete(_driver_route_key(driver_id))
+
+
+def get_driver_matcher(driver_id):
+    """Matcher for the route of the driver's active van, or None"""
+    def load():
+        route = VanAssignment.objects.filter(
+            driver_id=driver_id,
+            is_active=True,
+            route__is_active=True
+        ).values_list('route_id', 'route__updated_at').first()
+        return route or (None, None)
+
+    route_id, updated_at = cache.get_or_set(
+        _driver_route_key(driver_id), load, settings.TRACKING_SCHEDULE_CACHE_SECONDS
+    )
+    if route_id is None:
+        return None
+    matcher = _matchers.get((route_id, updated_at))
+    if matcher is None:
+        route = Route.objects.filter(pk=route_id).first()
+        if route is None:
+            # Deleted since it was cached
+            invalidate_driver_route(driver_id)
+            return None
+        matcher = get_matcher(route)
+    return matcher
+
+
+def match_driver_location(driver_id, latitude, longitude):
+    """Match a driver's new point to their route, continuing from their last progress"""
+    matcher = get_driver_matcher(driver_id)
+    if matcher is None:
+        return None
+    result = matcher.match(latitude, longitude, previous_distance_m=cache.get(_progress_key(driver_id)))
+    if result is not None:
+        cache.set(_progress_key(driver_id), result.distance_along_m, settings.TRACKING_SCHEDULE_CACHE_SECONDS)
+    return result
@@ -0,0 +1,126 @@
+# Generated by Django 5.1.1 on 2026-10-19 00:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("locations", "0002_driver_tracking_state"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Route",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100)),
+                (
+                    "polyline",
+                    models.JSONField(
+                        default=list,
+                        help_text="Route path as [[latitude, longitude], ...] in driving order",
+                    ),
+                ),
+                ("length_meters", models.FloatField(default=0, editable=False)),
+                ("segment_index", models.JSONField(default=dict, editable=False)),
+                ("is_active", models.BooleanField(default=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "ordering": ["name"],
+            },
+        ),
+        migrations.AddField(
+            model_name="location",
+            name="distance_along_route",
+            field=models.FloatField(
+                blank=True,
+                help_text="Distance from the route start in meters",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="location",
+            name="route_offset",
+            field=models.FloatField(
+                blank=True,
+                help_text="Distance from the route line in meters",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="location",
+            name="route_progress",
+            field=models.FloatField(
+                blank=True,
+                help_text="Progress along the van's route in percent",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="vanassignment",
+            name="route",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="van_assignments",
+                to="locations.route",
+            ),
+        ),
+        migrations.CreateModel(
+            name="RouteStop",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("sequence", models.PositiveIntegerField()),
+                ("name", models.CharField(blank=True, max_length=100)),
+                ("latitude", models.DecimalField(decimal_places=6, max_digits=9)),
+                ("longitude", models.DecimalField(decimal_places=6, max_digits=9)),
+                (
+                    "distance_along_meters",
+                    models.FloatField(blank=True, editable=False, null=True),
+                ),
+                (
+                    "child_assignment",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="route_stops",
+                        to="locations.childvanassignment",
+                    ),
+                ),
+                (
+                    "route",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stops",
+                        to="locations.route",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["route", "sequence"],
+                "unique_together": {("route", "sequence")},
+            },
+        ),
+    ]
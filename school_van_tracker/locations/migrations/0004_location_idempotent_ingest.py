@@ -0,0 +1,56 @@
+# Generated by Django 5.1.1 on 2026-10-19 01:04
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def copy_timestamps(apps, schema_editor):
+    # Existing rows were stamped on arrival
+    Location = apps.get_model("locations", "Location")
+    Location.objects.update(received_at=models.F("timestamp"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("locations", "0003_routes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="location",
+            name="idempotency_key",
+            field=models.CharField(
+                blank=True,
+                help_text="Client-generated id of the point; a retried upload with the same key is ignored",
+                max_length=64,
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="location",
+            name="received_at",
+            field=models.DateTimeField(
+                default=django.utils.timezone.now,
+                help_text="When the server stored the point",
+            ),
+        ),
+        migrations.RunPython(copy_timestamps, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="location",
+            name="timestamp",
+            field=models.DateTimeField(
+                default=django.utils.timezone.now,
+                help_text="When the point was recorded on the device",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="location",
+            constraint=models.UniqueConstraint(
+                fields=("driver", "idempotency_key"),
+                name="unique_location_idempotency_key",
+            ),
+        ),
+    ]
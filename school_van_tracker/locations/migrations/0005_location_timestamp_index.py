@@ -0,0 +1,19 @@
+# Generated by Django 5.1.1 on 2026-10-19 01:07
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("locations", "0004_location_idempotent_ingest"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="location",
+            index=models.Index(fields=["-timestamp"], name="locations_timestamp_idx"),
+        ),
+    ]
@@ -0,0 +1,92 @@
+# Generated by Django 5.1.1 on 2026-10-19 01:09
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("locations", "0005_location_timestamp_index"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RollupWatermark",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=50, unique=True)),
+                ("last_location_id", models.BigIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="DailyDriverStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("distance_meters", models.FloatField(default=0)),
+                (
+                    "moving_seconds",
+                    models.FloatField(default=0, help_text="Time spent driving"),
+                ),
+                (
+                    "idle_seconds",
+                    models.FloatField(
+                        default=0, help_text="Time spent stopped while tracking"
+                    ),
+                ),
+                ("max_speed_kmh", models.FloatField(default=0)),
+                ("point_count", models.PositiveIntegerField(default=0)),
+                ("first_seen", models.DateTimeField(blank=True, null=True)),
+                ("last_seen", models.DateTimeField(blank=True, null=True)),
+                ("last_latitude", models.FloatField(blank=True, null=True)),
+                ("last_longitude", models.FloatField(blank=True, null=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "driver",
+                    models.ForeignKey(
+                        limit_choices_to={"user_type": "driver"},
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_stats",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "van_assignment",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="daily_stats",
+                        to="locations.vanassignment",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-date", "driver"],
+                "indexes": [
+                    models.Index(fields=["date"], name="locations_d_date_41c094_idx")
+                ],
+                "unique_together": {("driver", "date")},
+            },
+        ),
+    ]
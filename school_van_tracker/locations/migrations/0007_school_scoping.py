@@ -0,0 +1,155 @@
+# Generated by Django 5.1.1 on 2026-10-19 01:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils.text import slugify
+
+
+def create_schools(apps, schema_editor):
+    """
+    Turn the free-text school names on child assignments into School rows
+    and link each van, and its driver, to the school most of its children
+    attend. Location and rollup rows keep school=NULL and stay where they
+    are; ``manage.py move_school`` assigns them when a school is moved.
+    """
+    School = apps.get_model("accounts", "School")
+    User = apps.get_model("accounts", "User")
+    ChildVanAssignment = apps.get_model("locations", "ChildVanAssignment")
+    VanAssignment = apps.get_model("locations", "VanAssignment")
+
+    schools = {}
+    names = ChildVanAssignment.objects.exclude(school_name="").values_list(
+        "school_name", flat=True
+    )
+    for name in sorted({name.strip() for name in names} - {""}):
+        key = name.casefold()
+        if key in schools:
+            continue
+        base = slugify(name)[:40] or "school"
+        slug, suffix = base, 1
+        while School.objects.filter(slug=slug).exists():
+            suffix += 1
+            slug = f"{base}-{suffix}"
+        schools[key] = School.objects.create(name=name, slug=slug)
+
+    votes = {}
+    for child in ChildVanAssignment.objects.exclude(school_name=""):
+        school = schools.get(child.school_name.strip().casefold())
+        if school is None:
+            continue
+        child.school = school
+        child.save(update_fields=["school"])
+        van_votes = votes.setdefault(child.van_assignment_id, {})
+        van_votes[school.pk] = van_votes.get(school.pk, 0) + 1
+
+    for van in VanAssignment.objects.filter(pk__in=votes):
+        van.school_id = max(votes[van.pk], key=votes[van.pk].get)
+        van.save(update_fields=["school"])
+        User.objects.filter(pk=van.driver_id, school__isnull=True).update(
+            school_id=van.school_id
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0005_school"),
+        ("locations", "0006_daily_driver_stats"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="childvanassignment",
+            name="school",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="child_assignments",
+                to="accounts.school",
+            ),
+        ),
+        migrations.AddField(
+            model_name="dailydriverstats",
+            name="school",
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                null=True,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="+",
+                to="accounts.school",
+            ),
+        ),
+        migrations.AddField(
+            model_name="location",
+            name="school",
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                null=True,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="+",
+                to="accounts.school",
+            ),
+        ),
+        migrations.AddField(
+            model_name="route",
+            name="school",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="routes",
+                to="accounts.school",
+            ),
+        ),
+        migrations.AddField(
+            model_name="vanassignment",
+            name="school",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="van_assignments",
+                to="accounts.school",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="dailydriverstats",
+            name="driver",
+            field=models.ForeignKey(
+                db_constraint=False,
+                limit_choices_to={"user_type": "driver"},
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="daily_stats",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="dailydriverstats",
+            name="van_assignment",
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="daily_stats",
+                to="locations.vanassignment",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="location",
+            name="driver",
+            field=models.ForeignKey(
+                db_constraint=False,
+                limit_choices_to={"user_type": "driver"},
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="locations",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.RunPython(create_schools, migrations.RunPython.noop),
+    ]
@@ -2,16 +2,32 @@ from django.db import models
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 
+from accounts.models import School
+
 User = get_user_model()
 
 
 class Location(models.Model):
-    """Model to store driver GPS coordinates and location data"""
+    """
+    Model to store driver GPS coordinates and location data.
+    
+    Stored on the school's database (see school_van_tracker.tenancy), so its
+    foreign keys have no database constraint.
+    """
     driver = models.ForeignKey(
         User, 
         on_delete=models.CASCADE, 
         related_name='locations',
-        limit_choices_to={'user_type': 'driver'}
+        limit_choices_to={'user_type': 'driver'},
+        db_constraint=False
+    )
+    school = models.ForeignKey(
+        School,
+        on_delete=models.DO_NOTHING,
+        related_name='+',
+        null=True,
+        blank=True,
+        db_constraint=False
     )
     latitude = models.DecimalField(max_digits=9, decimal_places=6)
     longitude = models.DecimalField(max_digits=9, decimal_places=6)
@@ -19,14 +35,36 @@ class Location(models.Model):
     speed = models.FloatField(help_text="Speed in km/h", null=True, blank=True)
     heading = models.FloatField(help_text="Direction in degrees", null=True, blank=True)
     altitude = models.FloatField(help_text="Altitude in meters", null=True, blank=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now, help_text="When the point was recorded on the device")
+    received_at = models.DateTimeField(default=timezone.now, help_text="When the server stored the point")
+    idempotency_key = models.CharField(
+        max_length=64, null=True, blank=True,
+        help_text="Client-generated id of the point; a retried upload with the same key is ignored"
+    )
     is_active = models.BooleanField(default=True, help_text="Whether this is the current location")
+    route_progress = models.FloatField(
+        null=True, blank=True, help_text="Progress along the van's route in percent"
+    )
+    distance_along_route = models.FloatField(
+        null=True, blank=True, help_text="Distance from the route start in meters"
+    )
+    route_offset = models.FloatField(
+        null=True, blank=True, help_text="Distance from the route line in meters"
+    )
     
     class Meta:
         ordering = ['-timestamp']
         indexes = [
             models.Index(fields=['driver', '-timestamp']),
             models.Index(fields=['is_active', 'driver']),
+            # Admin date drill-down and newest-first paging across drivers
+            models.Index(fields=['-timestamp'], name='locations_timestamp_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['driver', 'idempotency_key'],
+                name='unique_location_idempotency_key'
+            ),
         ]
     
     def __str__(self):
@@ -38,6 +76,64 @@ class Location(models.Model):
         return (float(self.latitude), float(self.longitude))
 
 
+class Route(models.Model):
+    """A van route: the path the van drives and its ordered stops"""
+    name = models.CharField(max_length=100)
+    school = models.ForeignKey(
+        School, on_delete=models.SET_NULL, related_name='routes', null=True, blank=True
+    )
+    polyline = models.JSONField(
+        default=list, help_text="Route path as [[latitude, longitude], ...] in driving order"
+    )
+    length_meters = models.FloatField(default=0, editable=False)
+    segment_index = models.JSONField(default=dict, editable=False)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['name']
+    
+    def __str__(self):
+        return self.name
+    
+    def save(self, *args, **kwargs):
+        from .map_matching import build_segment_index
+        self.segment_index = build_segment_index(self.polyline)
+        self.length_meters = self.segment_index["length"]
+        super().save(*args, **kwargs)
+
+
+class RouteStop(models.Model):
+    """An ordered stop on a route, usually a child's pickup point"""
+    route = models.ForeignKey(Route, on_delete=models.CASCADE, related_name='stops')
+    sequence = models.PositiveIntegerField()
+    name = models.CharField(max_length=100, blank=True)
+    latitude = models.DecimalField(max_digits=9, decimal_places=6)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6)
+    child_assignment = models.ForeignKey(
+        'ChildVanAssignment', 
+        on_delete=models.SET_NULL, 
+        related_name='route_stops',
+        null=True, 
+        blank=True
+    )
+    distance_along_meters = models.FloatField(null=True, blank=True, editable=False)
+    
+    class Meta:
+        ordering = ['route', 'sequence']
+        unique_together = ['route', 'sequence']
+    
+    def __str__(self):
+        return f"{self.route.name} #{self.sequence} {self.name}".strip()
+    
+    def save(self, *args, **kwargs):
+        from .map_matching import get_matcher
+        match = get_matcher(self.route).match(self.latitude, self.longitude)
+        self.distance_along_meters = match.distance_along_m if match else None
+        super().save(*args, **kwargs)
+
+
 class VanAssignment(models.Model):
     """Model to link drivers with vans and parents with their children's van assignments"""
     driver = models.ForeignKey(
@@ -46,10 +142,20 @@ class VanAssignment(models.Model):
         related_name='van_assignments',
         limit_choices_to={'user_type': 'driver'}
     )
+    school = models.ForeignKey(
+        School, on_delete=models.SET_NULL, related_name='van_assignments', null=True, blank=True
+    )
     van_number = models.CharField(max_length=20, unique=True)
     van_model = models.CharField(max_length=100, blank=True)
     capacity = models.PositiveIntegerField(default=20)
     route_name = models.CharField(max_length=100, blank=True)
+    route = models.ForeignKey(
+        Route, 
+        on_delete=models.SET_NULL, 
+        related_name='van_assignments',
+        null=True, 
+        blank=True
+    )
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -71,6 +177,10 @@ class ChildVanAssignment(models.Model):
     )
     child_name = models.CharField(max_length=100)
     child_grade = models.CharField(max_length=20, blank=True)
+    school = models.ForeignKey(
+        School, on_delete=models.SET_NULL, related_name='child_assignments', null=True, blank=True
+    )
+    # Free text from before schools were records, still shown to older clients
     school_name = models.CharField(max_length=200, blank=True)
     admission_number = models.CharField(max_length=50, blank=True)
     van_assignment = models.ForeignKey(
@@ -80,6 +190,11 @@ class ChildVanAssignment(models.Model):
     )
     pickup_time = models.TimeField(null=True, blank=True)
     dropoff_time = models.TimeField(null=True, blank=True)
+    stop_latitude = models.DecimalField(
+        max_digits=9, decimal_places=6, null=True, blank=True,
+        help_text="Where the child is picked up and dropped off"
+    )
+    stop_longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -90,3 +205,88 @@ class ChildVanAssignment(models.Model):
     
     def __str__(self):
         return f"{self.child_name} - Van {self.van_assignment.van_number}"
+
+
+class DriverTrackingState(models.Model):
+    """Whether a driver currently has GPS tracking switched on"""
+    driver = models.OneToOneField(
+        User, 
+        on_delete=models.CASCADE, 
+        related_name='tracking_state',
+        limit_choices_to={'user_type': 'driver'}
+    )
+    is_enabled = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.driver.get_full_name()} - tracking {'on' if self.is_enabled else 'off'}"
+
+
+class DailyDriverStats(models.Model):
+    """
+    Per driver and (local) day totals kept up to date by
+    ``manage.py rollup_locations``, so reports never scan Location rows.
+    Stored next to the school's Location rows, without foreign key constraints.
+    """
+    driver = models.ForeignKey(
+        User, 
+        on_delete=models.CASCADE, 
+        related_name='daily_stats',
+        limit_choices_to={'user_type': 'driver'},
+        db_constraint=False
+    )
+    school = models.ForeignKey(
+        School,
+        on_delete=models.DO_NOTHING,
+        related_name='+',
+        null=True,
+        blank=True,
+        db_constraint=False
+    )
+    date = models.DateField()
+    van_assignment = models.ForeignKey(
+        VanAssignment,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='daily_stats',
+        db_constraint=False
+    )
+    distance_meters = models.FloatField(default=0)
+    moving_seconds = models.FloatField(default=0, help_text="Time spent driving")
+    idle_seconds = models.FloatField(default=0, help_text="Time spent stopped while tracking")
+    max_speed_kmh = models.FloatField(default=0)
+    point_count = models.PositiveIntegerField(default=0)
+    first_seen = models.DateTimeField(null=True, blank=True)
+    last_seen = models.DateTimeField(null=True, blank=True)
+    # Last point folded in, so the next batch continues the track from it
+    last_latitude = models.FloatField(null=True, blank=True)
+    last_longitude = models.FloatField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-date', 'driver']
+        unique_together = ['driver', 'date']
+        indexes = [
+            models.Index(fields=['date']),
+        ]
+    
+    def __str__(self):
+        return f"{self.driver.get_full_name()} - {self.date}: {self.distance_meters / 1000:.1f} km"
+    
+    @property
+    def average_speed_kmh(self):
+        """Average speed while moving"""
+        if not self.moving_seconds:
+            return 0.0
+        return self.distance_meters / self.moving_seconds * 3.6
+
+
+class RollupWatermark(models.Model):
+    """Highest Location id a rollup job has processed"""
+    name = models.CharField(max_length=50, unique=True)
+    last_location_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.name} @ {self.last_location_id}"
@@ -0,0 +1,162 @@
+"""
+Downsampled trip paths for replaying a driver's movements.
+
+A day of uploads is thousands of points, far more than a map needs to draw.
+``trip_path`` reads the points in time order with a server-side iterator
+and keeps at most ``max_points`` of them in one pass:
+
+1. Runs of points that stay within ``stop_radius_meters`` for at least
+   ``stop_min_seconds`` are collapsed into one stop point carrying the dwell
+   time. GPS jitter while parked would otherwise look like detail worth
+   keeping.
+2. The remaining points go through Largest-Triangle-Three-Buckets: they are
+   split into ``max_points - 2`` buckets, and from each bucket the point
+   forming the largest triangle with the previously kept point and the next
+   bucket's average is kept. Areas are measured on the ground (meters), so
+   turns win over straight stretches. A bucket holding a stop always keeps
+   the stop.
+
+Only the current and next bucket are held in memory. Bucket sizes have to
+come from the number of points left after collapsing stops, so a track with
+more than ``max_points`` rows is read twice: once to count what survives
+``collapse_stops`` and once to downsample it.
+"""
+from collections import namedtuple
+
+from django.conf import settings
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+
+from .geo import haversine_m
+from .map_matching import Projection
+from .models import Location
+
+PathPoint = namedtuple("PathPoint", ["timestamp", "latitude", "longitude", "speed", "dwell_seconds", "x", "y"])
+Stop = namedtuple("Stop", ["arrived_at", "departed_at", "latitude", "longitude", "duration_seconds"])
+
+
+def collapse_stops(points, stops, radius_meters, min_seconds):
+    """
+    Yield ``points`` (PathPoints in time order) with every stationary run
+    replaced by its first point, and append a Stop for each run to ``stops``.
+    """
+    run = []
+    for point in points:
+        if run and haversine_m(run[0].latitude, run[0].longitude, point.latitude, point.longitude) <= radius_meters:
+            # Only the run's first and latest points matter once it's long enough to be a stop
+            if len(run) > 1 and (run[-1].timestamp - run[0].timestamp).total_seconds() >= min_seconds:
+                run[-1] = point
+            else:
+                run.append(point)
+            continue
+        yield from _close_run(run, stops, min_seconds)
+        run = [point]
+    yield from _close_run(run, stops, min_seconds)
+
+
+def _close_run(run, stops, min_seconds):
+    if not run:
+        return
+    first, last = run[0], run[-1]
+    duration = (last.timestamp - first.timestamp).total_seconds()
+    if duration < min_seconds:
+        yield from run
+        return
+    stops.append(Stop(first.timestamp, last.timestamp, first.latitude, first.longitude, duration))
+    yield first._replace(speed=0.0, dwell_seconds=duration)
+
+
+def _triangle_area(a, b, c):
+    return abs((a.x - c.x) * (b.y - a.y) - (a.x - b.x) * (c.y - a.y)) / 2
+
+
+def _pick(bucket, previous, next_x, next_y):
+    """The point of ``bucket`` to keep after ``previous``, given the next bucket's centre"""
+    stops = [point for point in bucket if point.dwell_seconds]
+    if stops:
+        return max(stops, key=lambda point: point.dwell_seconds)
+    centre = PathPoint(None, None, None, None, 0, next_x, next_y)
+    return max(bucket, key=lambda point: _triangle_area(previous, point, centre))
+
+
+def _centre(bucket):
+    return sum(point.x for point in bucket) / len(bucket), sum(point.y for point in bucket) / len(bucket)
+
+
+def lttb(points, total, threshold):
+    """
+    Largest-Triangle-Three-Buckets over an iterator of PathPoints. ``total``
+    is the number of points expected (an upper bound is fine).
+    """
+    points = iter(points)
+    if threshold >= total or threshold < 3:
+        yield from points
+        return
+
+    first = next(points, None)
+    if first is None:
+        return
+    yield first
+
+    every = (total - 2) / (threshold - 2)
+    previous = first
+    current, upcoming = [], []
+    current_index = 0
+    pending = None  # held back until we know whether it is the last point
+    for index, point in enumerate(points):
+        if pending is not None:
+            bucket = min(int((index - 1) // every), threshold - 3)
+            while bucket > current_index + 1:
+                if current:
+                    previous = _pick(current, previous, *_centre(upcoming or [pending]))
+                    yield previous
+                current, upcoming = upcoming, []
+                current_index += 1
+            (current if bucket == current_index else upcoming).append(pending)
+        pending = point
+
+    if pending is None:
+        return
+    # The last point is always kept and closes the final buckets
+    for bucket, following in ((current, upcoming or [pending]), (upcoming, [pending])):
+        if bucket:
+            previous = _pick(bucket, previous, *_centre(following))
+            yield previous
+    yield pending
+
+
+def _path_points(rows):
+    projection = None
+    for timestamp, latitude, longitude, speed in rows:
+        if projection is None:
+            projection = Projection(latitude, longitude)
+        x, y = projection.to_xy(latitude, longitude)
+        yield PathPoint(timestamp, latitude, longitude, speed, 0, x, y)
+
+
+def trip_path(driver_id, start, end, max_points):
+    """
+    The driver's path between ``start`` and ``end``, downsampled to at most
+    ``max_points``. Returns (raw point count, [PathPoint, ...], [Stop, ...]).
+    """
+    options = settings.PLAYBACK
+    locations = Location.objects.filter(driver_id=driver_id, timestamp__gte=start, timestamp__lt=end)
+    total = locations.count()
+    if not total:
+        return 0, [], []
+
+    rows = locations.order_by('timestamp', 'pk').annotate(
+        lat=Cast('latitude', FloatField()),
+        lon=Cast('longitude', FloatField())
+    ).values_list('timestamp', 'lat', 'lon', 'speed')
+
+    def collapsed(stops):
+        points = _path_points(rows.iterator(chunk_size=options["chunk_size"]))
+        return collapse_stops(points, stops, options["stop_radius_meters"], options["stop_min_seconds"])
+
+    # A parked van can collapse hundreds of rows into one point, so the
+    # buckets are sized from what is left (lttb passes short tracks through)
+    kept = total if total <= max_points else sum(1 for _ in collapsed([]))
+    stops = []
+    path = list(lttb(collapsed(stops), kept, max_points))
+    return total, path, stops
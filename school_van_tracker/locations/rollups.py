@@ -0,0 +1,249 @@
+"""
+Daily per-driver totals (distance, moving and idle time, speeds) in
+``DailyDriverStats``.
+
+``catch_up`` is run repeatedly by ``manage.py rollup_locations``. It reads
+Location rows above a watermark in id order and folds each driver's new
+points onto the end of that day's track, continuing from the last point
+already counted. If a batch holds a point recorded before that last point
+(a late upload), the whole day is recomputed instead. Rows are only read
+once they are ``settle_seconds`` old, so a slow transaction can't commit an
+id below the watermark.
+
+``backfill_driver`` recomputes whole days from scratch. ``manage.py
+backfill_rollups`` runs it for many drivers in a process pool.
+
+Each tenant database (see ``school_van_tracker.tenancy``) keeps its own
+watermark and rollups for the points stored on it, so every function here
+takes the alias to work on.
+
+Track maths is vectorised with NumPy over each day's points. A segment
+between two points counts only if:
+
+- the gap is at most ``max_gap_seconds``; longer gaps mean tracking was off;
+- the implied speed is plausible; faster than ``max_speed_kmh`` is a GPS jump.
+
+A counted segment is moving above ``idle_speed_kmh`` and idle otherwise.
+Distance is only summed while moving, so GPS jitter at a standstill isn't
+counted.
+"""
+import datetime
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from accounts.models import User
+
+from .geo import EARTH_RADIUS_M
+from .models import DailyDriverStats, Location, RollupWatermark, VanAssignment
+
+WATERMARK = "daily_driver_stats"
+
+def haversine_array(lat1, lon1, lat2, lon2):
+    """Element-wise great-circle distances in meters between arrays of points in degrees"""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+def track_stats(seconds, latitudes, longitudes, speeds):
+    """
+    Totals for one time-ordered track. ``seconds`` are Unix times and
+    ``speeds`` reported km/h with NaN where unknown (all NumPy arrays).
+    """
+    options = settings.LOCATION_ROLLUPS
+    stats = {"distance_meters": 0.0, "moving_seconds": 0.0, "idle_seconds": 0.0, "max_speed_kmh": 0.0}
+    if len(seconds) < 2:
+        return stats
+
+    distance = haversine_array(latitudes[:-1], longitudes[:-1], latitudes[1:], longitudes[1:])
+    gap = np.diff(seconds)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        implied_speed = np.where(gap > 0, distance / gap * 3.6, np.inf)
+
+    counted = (gap > 0) & (gap <= options["max_gap_seconds"]) & (implied_speed <= options["max_speed_kmh"])
+    # Prefer the speed the device reported at the end of the segment
+    speed = np.where(np.isnan(speeds[1:]), implied_speed, speeds[1:])
+    moving = counted & (speed >= options["idle_speed_kmh"])
+    idle = counted & ~moving
+
+    stats["distance_meters"] = float(distance[moving].sum())
+    stats["moving_seconds"] = float(gap[moving].sum())
+    stats["idle_seconds"] = float(gap[idle].sum())
+    if moving.any():
+        stats["max_speed_kmh"] = float(min(speed[moving].max(), options["max_speed_kmh"]))
+    return stats
+
+
+def _arrays(points):
+    """(timestamp, latitude, longitude, speed) tuples to NumPy arrays"""
+    seconds = np.fromiter((p[0].timestamp() for p in points), dtype=float, count=len(points))
+    latitudes = np.fromiter((p[1] for p in points), dtype=float, count=len(points))
+    longitudes = np.fromiter((p[2] for p in points), dtype=float, count=len(points))
+    speeds = np.fromiter((np.nan if p[3] is None else p[3] for p in points), dtype=float, count=len(points))
+    return seconds, latitudes, longitudes, speeds
+
+
+def day_bounds(date):
+    """Start and end of ``date`` in the project time zone"""
+    start = timezone.make_aware(datetime.datetime.combine(date, datetime.time.min))
+    end = timezone.make_aware(datetime.datetime.combine(date + datetime.timedelta(days=1), datetime.time.min))
+    return start, end
+
+
+def compute_day(driver_id, date, max_location_id, using=DEFAULT_DB_ALIAS):
+    """Stats for a whole driver-day from the points up to ``max_location_id``, or None if there are none"""
+    start, end = day_bounds(date)
+    points = list(Location.objects.using(using).filter(
+        driver_id=driver_id,
+        timestamp__gte=start,
+        timestamp__lt=end,
+        pk__lte=max_location_id
+    ).order_by('timestamp', 'pk').values_list('timestamp', 'latitude', 'longitude', 'speed'))
+    if not points:
+        return None
+
+    values = track_stats(*_arrays(points))
+    values.update(
+        point_count=len(points),
+        first_seen=points[0][0],
+        last_seen=points[-1][0],
+        last_latitude=float(points[-1][1]),
+        last_longitude=float(points[-1][2]),
+    )
+    return values
+
+
+def fold_points(stats, points):
+    """Extend ``stats`` with time-ordered points recorded after ``stats.last_seen``"""
+    if stats.last_seen is not None:
+        points = [(stats.last_seen, stats.last_latitude, stats.last_longitude, None)] + points
+        new_points = len(points) - 1
+    else:
+        new_points = len(points)
+
+    values = track_stats(*_arrays(points))
+    stats.distance_meters += values["distance_meters"]
+    stats.moving_seconds += values["moving_seconds"]
+    stats.idle_seconds += values["idle_seconds"]
+    stats.max_speed_kmh = max(stats.max_speed_kmh, values["max_speed_kmh"])
+    stats.point_count += new_points
+    stats.first_seen = stats.first_seen or points[0][0]
+    stats.last_seen = points[-1][0]
+    stats.last_latitude = float(points[-1][1])
+    stats.last_longitude = float(points[-1][2])
+
+
+def _active_vans(driver_ids):
+    # Ordered oldest first so a driver's newest van wins in the dict
+    return dict(
+        VanAssignment.objects.filter(driver_id__in=driver_ids, is_active=True)
+        .order_by('created_at')
+        .values_list('driver_id', 'pk')
+    )
+
+
+def _driver_schools(driver_ids):
+    return dict(User.objects.filter(pk__in=driver_ids).values_list('pk', 'school_id'))
+
+
+def catch_up(batch_size=None, using=DEFAULT_DB_ALIAS):
+    """Fold one batch of new Location rows on ``using`` into its rollups. Returns the number of rows read."""
+    options = settings.LOCATION_ROLLUPS
+    settled = timezone.now() - datetime.timedelta(seconds=options["settle_seconds"])
+
+    with transaction.atomic(using=using):
+        watermark, _ = RollupWatermark.objects.using(using).select_for_update().get_or_create(name=WATERMARK)
+        rows = list(
+            Location.objects.using(using).filter(pk__gt=watermark.last_location_id, received_at__lt=settled)
+            .order_by('pk')
+            .values_list('pk', 'driver_id', 'timestamp', 'latitude', 'longitude', 'speed')
+            [:batch_size or options["batch_size"]]
+        )
+        if not rows:
+            return 0
+        max_location_id = rows[-1][0]
+
+        groups = defaultdict(list)
+        for pk, driver_id, recorded_at, latitude, longitude, speed in rows:
+            groups[(driver_id, timezone.localdate(recorded_at))].append((recorded_at, latitude, longitude, speed))
+
+        driver_ids = {driver_id for driver_id, _ in groups}
+        vans = _active_vans(driver_ids)
+        schools = _driver_schools(driver_ids)
+        existing = {
+            (stats.driver_id, stats.date): stats
+            for stats in DailyDriverStats.objects.using(using).select_for_update().filter(
+                driver_id__in=driver_ids,
+                date__in={date for _, date in groups}
+            )
+        }
+
+        for (driver_id, date), points in groups.items():
+            points.sort(key=lambda point: point[0])
+            stats = existing.get((driver_id, date)) or DailyDriverStats(driver_id=driver_id, date=date)
+            if stats.last_seen is not None and points[0][0] < stats.last_seen:
+                # A late point lands inside the counted track: redo the day
+                for field, value in compute_day(driver_id, date, max_location_id, using).items():
+                    setattr(stats, field, value)
+            else:
+                fold_points(stats, points)
+            stats.van_assignment_id = vans.get(driver_id, stats.van_assignment_id)
+            stats.school_id = schools.get(driver_id, stats.school_id)
+            stats.save(using=using)
+
+        watermark.last_location_id = max_location_id
+        watermark.save(using=using, update_fields=['last_location_id', 'updated_at'])
+    return len(rows)
+
+
+def rollup_watermark(using=DEFAULT_DB_ALIAS):
+    """
+    Location id that backfilled days should stop at. When the rollups have
+    never run, this starts the watermark at the newest row so catch-up
+    continues from there.
+    """
+    with transaction.atomic(using=using):
+        watermark, _ = RollupWatermark.objects.using(using).select_for_update().get_or_create(name=WATERMARK)
+        if not watermark.last_location_id:
+            watermark.last_location_id = Location.objects.using(using).aggregate(last=Max('pk'))['last'] or 0
+            watermark.save(using=using, update_fields=['last_location_id', 'updated_at'])
+    return watermark.last_location_id
+
+
+def backfill_driver(driver_id, start_date, end_date, max_location_id, using=DEFAULT_DB_ALIAS):
+    """
+    Recompute every day between the dates (inclusive) on which the driver has
+    points. Returns [(driver_id, date, values), ...] without saving, so it can
+    run in a worker process.
+    """
+    start, _ = day_bounds(start_date)
+    _, end = day_bounds(end_date)
+    days = Location.objects.using(using).filter(
+        driver_id=driver_id,
+        timestamp__gte=start,
+        timestamp__lt=end,
+        pk__lte=max_location_id
+    ).datetimes('timestamp', 'day')
+
+    results = []
+    for day in days:
+        values = compute_day(driver_id, day.date(), max_location_id, using)
+        if values:
+            results.append((driver_id, day.date(), values))
+    return results
+
+
+def save_day(driver_id, date, values, van_assignment_id=None, school_id=None, using=DEFAULT_DB_ALIAS):
+    defaults = dict(values)
+    if van_assignment_id:
+        defaults['van_assignment_id'] = van_assignment_id
+    if school_id:
+        defaults['school_id'] = school_id
+    return DailyDriverStats.objects.using(using).update_or_create(
+        driver_id=driver_id, date=date, defaults=defaults
+    )[0]
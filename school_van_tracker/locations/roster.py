@@ -0,0 +1,465 @@
+"""
+Bulk roster import: drivers, vans, parents and children from a CSV or XLSX
+sheet with one row per child.
+
+Rows are read as a stream and handled ``ROSTER_IMPORT["chunk_size"]`` at a
+time, each chunk in its own transaction:
+
+1. every row is validated and its phone numbers normalised to E.164 with no
+   database access;
+2. the chunk's drivers and parents are matched to existing users with one
+   query, its vans with one and its children with one;
+3. new rows are written with ``bulk_create`` and changed ones with
+   ``bulk_update``.
+
+A chunk of 500 rows takes about ten queries, however many rows it has.
+Rows that fail validation, or conflict with existing data (a parent's phone
+number belonging to a driver, a van listed with two drivers), are left out
+and reported with their row number. The rest of the chunk is imported. A
+CSV that stops being valid UTF-8 part way is reported at the row where it
+broke; the rows read before it are imported.
+
+Re-importing a sheet updates the same rows instead of duplicating them. Users
+are matched by phone number, vans by ``van_number`` and children by
+(parent, ``child_name``).
+
+Bulk writes skip model signals, so the caches the signals would drop
+(authenticated users, check-user, schedules, stop indexes, matched routes) are dropped
+here for the affected users.
+"""
+import csv
+import datetime
+import io
+import math
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from phonenumber_field.phonenumber import to_python
+
+from accounts.authentication import invalidate_user
+from accounts.models import User
+from accounts.profiles import invalidate_phone
+
+from .alerts import invalidate_stop_index
+from .map_matching import invalidate_driver_route
+from .models import ChildVanAssignment, VanAssignment
+from .tracking import invalidate_schedule
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+REQUIRED_COLUMNS = ["van_number", "driver_phone", "parent_phone", "child_name"]
+OPTIONAL_COLUMNS = [
+    "van_model", "capacity", "route_name", "driver_first_name", "driver_last_name",
+    "parent_first_name", "parent_last_name", "child_grade", "admission_number",
+    "pickup_time", "dropoff_time", "stop_latitude", "stop_longitude",
+]
+
+RosterRow = namedtuple("RosterRow", ["number", *REQUIRED_COLUMNS, *OPTIONAL_COLUMNS])
+
+
+class RosterError(ValueError):
+    """The file can't be imported at all (unreadable, or missing columns)"""
+
+    def __init__(self, message, row=None):
+        super().__init__(message)
+        # Set when the file turned unreadable part way, at this row
+        self.row = row
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.created = {"drivers": 0, "parents": 0, "vans": 0, "children": 0}
+        self.updated = {"drivers": 0, "parents": 0, "vans": 0, "children": 0}
+        # [(row number, message), ...]
+        self.errors = []
+        # Rows reported without having been read
+        self.unread = set()
+
+    def error(self, row, message):
+        self.errors.append((row, message))
+
+    def stopped(self, row, message):
+        """Reading stopped before ``row``"""
+        self.unread.add(row)
+        self.error(row, message)
+
+    def as_dict(self):
+        return {
+            "rows": self.rows,
+            "imported": self.rows - len({row for row, _ in self.errors} - self.unread),
+            "created": self.created,
+            "updated": self.updated,
+            "errors": [{"row": row, "error": message} for row, message in self.errors],
+        }
+
+
+def _column(name):
+    return str(name or "").strip().lower().replace(" ", "_")
+
+
+def _records(columns, rows):
+    """(row number, {column: value}) for each non-blank row, the header being row 1"""
+    number = 1
+    rows = iter(rows)
+    while True:
+        number += 1
+        try:
+            values = next(rows, None)
+        except UnicodeDecodeError:
+            raise RosterError(f"The file is not valid UTF-8 from around row {number}", row=number)
+        if values is None:
+            return
+        record = {column: value for column, value in zip(columns, values) if column}
+        if any(value not in (None, "") for value in record.values()):
+            yield number, record
+
+
+def read_rows(file, filename):
+    """Stream (row number, {column: value}) from an uploaded CSV or XLSX file"""
+    if filename.lower().endswith(".xlsx"):
+        if openpyxl is None:
+            raise RosterError("Install openpyxl to import .xlsx files")
+        try:
+            sheet = openpyxl.load_workbook(file, read_only=True, data_only=True).active
+        except Exception as e:
+            raise RosterError(f"Unreadable .xlsx file: {e}")
+        rows = sheet.iter_rows(values_only=True)
+    else:
+        rows = csv.reader(io.TextIOWrapper(file, encoding="utf-8-sig", newline=""))
+    try:
+        header = next(rows, None)
+    except UnicodeDecodeError:
+        raise RosterError("The file is not valid UTF-8 (save the sheet as CSV UTF-8)")
+    if header is None:
+        raise RosterError("The file is empty")
+    columns = [_column(name) for name in header]
+    missing = [name for name in REQUIRED_COLUMNS if name not in columns]
+    if missing:
+        raise RosterError(f"Missing columns: {', '.join(missing)}")
+    return _records(columns, rows)
+
+
+def _text(value, max_length):
+    text = "" if value is None else str(value).strip()
+    if len(text) > max_length:
+        raise ValueError(f"{text[:20]}... is longer than {max_length} characters")
+    return text
+
+
+def _phone(value, column):
+    number = to_python(_text(value, 32))
+    if not number or not number.is_valid():
+        raise ValueError(f"{column} {value!r} is not a valid phone number")
+    return number.as_e164
+
+
+def _time(value, column):
+    if value in (None, ""):
+        return None
+    if isinstance(value, datetime.time):
+        return value
+    if isinstance(value, datetime.datetime):
+        return value.time()
+    try:
+        return datetime.time.fromisoformat(str(value).strip())
+    except ValueError:
+        raise ValueError(f"{column} {value!r} is not a time (HH:MM)")
+
+
+def _coordinate(value, column, limit):
+    if value in (None, ""):
+        return None
+    try:
+        number = Decimal(str(value).strip())
+        if not number.is_finite():
+            raise InvalidOperation
+        number = round(number, 6)
+    except ArithmeticError:
+        raise ValueError(f"{column} {value!r} is not a number")
+    if not -limit <= number <= limit:
+        raise ValueError(f"{column} {value!r} is out of range")
+    return number
+
+
+def _capacity(value):
+    if value in (None, ""):
+        return None
+    try:
+        capacity = float(str(value).strip())
+        if not math.isfinite(capacity):
+            raise ValueError
+        capacity = int(capacity)
+    except (ValueError, ArithmeticError):
+        raise ValueError(f"capacity {value!r} is not a number")
+    if capacity <= 0:
+        raise ValueError("capacity must be positive")
+    return capacity
+
+
+def parse_row(number, record):
+    """A validated RosterRow; raises ValueError with a message for the report"""
+    for column in REQUIRED_COLUMNS:
+        if record.get(column) in (None, ""):
+            raise ValueError(f"{column} is required")
+    return RosterRow(
+        number=number,
+        van_number=_text(record["van_number"], 20),
+        driver_phone=_phone(record["driver_phone"], "driver_phone"),
+        parent_phone=_phone(record["parent_phone"], "parent_phone"),
+        child_name=_text(record["child_name"], 100),
+        van_model=_text(record.get("van_model"), 100),
+        capacity=_capacity(record.get("capacity")),
+        route_name=_text(record.get("route_name"), 100),
+        driver_first_name=_text(record.get("driver_first_name"), 30),
+        driver_last_name=_text(record.get("driver_last_name"), 30),
+        parent_first_name=_text(record.get("parent_first_name"), 30),
+        parent_last_name=_text(record.get("parent_last_name"), 30),
+        child_grade=_text(record.get("child_grade"), 20),
+        admission_number=_text(record.get("admission_number"), 50),
+        pickup_time=_time(record.get("pickup_time"), "pickup_time"),
+        dropoff_time=_time(record.get("dropoff_time"), "dropoff_time"),
+        stop_latitude=_coordinate(record.get("stop_latitude"), "stop_latitude", 90),
+        stop_longitude=_coordinate(record.get("stop_longitude"), "stop_longitude", 180),
+    )
+
+
+def _set(obj, values):
+    """Apply the non-empty ``values`` to ``obj``. Returns the names of the fields that changed."""
+    changed = []
+    for field, value in values.items():
+        if value not in (None, "") and getattr(obj, field) != value:
+            setattr(obj, field, value)
+            changed.append(field)
+    return changed
+
+
+def _bulk_update(model, objects, fields):
+    # bulk_update() leaves auto_now fields alone
+    now = timezone.now()
+    for obj in objects:
+        obj.updated_at = now
+    model.objects.bulk_update(objects, ["updated_at", *fields])
+
+
+class _Chunk:
+    """Writes one chunk of validated rows"""
+
+    def __init__(self, rows, school, report):
+        self.rows = rows
+        self.school = school
+        self.report = report
+
+    def drop(self, row, message):
+        self.report.error(row.number, message)
+        self.rows.remove(row)
+
+    def users(self):
+        phones = {row.driver_phone for row in self.rows} | {row.parent_phone for row in self.rows}
+        users = {str(user.phone_number): user for user in User.objects.filter(phone_number__in=phones)}
+        wanted = {}
+        for row in list(self.rows):
+            roles = [
+                (row.driver_phone, "driver", row.driver_first_name, row.driver_last_name),
+                (row.parent_phone, "parent", row.parent_first_name, row.parent_last_name),
+            ]
+            conflict = next((
+                f"{phone} is already registered as a {users[phone].user_type}"
+                for phone, user_type, _, _ in roles
+                if phone in users and users[phone].user_type != user_type
+            ), None)
+            conflict = conflict or next((
+                f"{phone} is listed as both a driver and a parent"
+                for phone, user_type, _, _ in roles
+                if wanted.get(phone, (user_type,))[0] != user_type
+            ), None)
+            if conflict:
+                self.drop(row, conflict)
+                continue
+            for phone, user_type, first_name, last_name in roles:
+                wanted.setdefault(phone, (user_type, first_name, last_name))
+
+        created, updated = [], []
+        fields = set()
+        for phone, (user_type, first_name, last_name) in wanted.items():
+            values = {"first_name": first_name, "last_name": last_name}
+            if user_type == "driver" and self.school:
+                values["school"] = self.school
+            user = users.get(phone)
+            if user is None:
+                user = User(phone_number=phone, user_type=user_type)
+                _set(user, values)
+                user.set_unusable_password()
+                created.append(user)
+                users[phone] = user
+            else:
+                if user_type == "driver" and user.school_id:
+                    values.pop("school", None)
+                changed = _set(user, values)
+                if changed:
+                    fields.update(changed)
+                    updated.append(user)
+
+        User.objects.bulk_create(created)
+        if updated:
+            _bulk_update(User, updated, fields)
+        for user in created:
+            self.report.created[f"{user.user_type}s"] += 1
+        for user in updated:
+            self.report.updated[f"{user.user_type}s"] += 1
+        self.changed_users = created + updated
+        return users
+
+    def vans(self, users):
+        numbers = {row.van_number for row in self.rows}
+        vans = {van.van_number: van for van in VanAssignment.objects.filter(van_number__in=numbers)}
+        drivers = {}
+        for row in list(self.rows):
+            driver = users[row.driver_phone]
+            if drivers.setdefault(row.van_number, driver.pk) != driver.pk:
+                self.drop(row, f"Van {row.van_number} is listed with more than one driver")
+
+        created, updated = {}, {}
+        fields = set()
+        self.affected_drivers = set()
+        for row in self.rows:
+            driver = users[row.driver_phone]
+            values = {
+                "driver_id": driver.pk,
+                "van_model": row.van_model,
+                "capacity": row.capacity,
+                "route_name": row.route_name,
+                "school": self.school,
+            }
+            self.affected_drivers.add(driver.pk)
+            van = vans.get(row.van_number)
+            if van is None:
+                van = VanAssignment(van_number=row.van_number)
+                _set(van, values)
+                created[row.van_number] = vans[row.van_number] = van
+            elif row.van_number not in created:
+                # The van's previous driver loses its children
+                self.affected_drivers.add(van.driver_id)
+                changed = _set(van, values)
+                if changed:
+                    fields.update(changed)
+                    updated[row.van_number] = van
+
+        VanAssignment.objects.bulk_create(created.values())
+        if updated:
+            _bulk_update(VanAssignment, list(updated.values()), fields)
+        self.report.created["vans"] += len(created)
+        self.report.updated["vans"] += len(updated)
+        return vans
+
+    def children(self, users, vans):
+        parent_ids = {users[row.parent_phone].pk for row in self.rows}
+        children = {
+            (child.parent_id, child.child_name): child
+            for child in ChildVanAssignment.objects.filter(parent_id__in=parent_ids).select_related('van_assignment')
+        }
+        created, updated = {}, {}
+        fields = set()
+        for row in self.rows:
+            parent = users[row.parent_phone]
+            values = {
+                "van_assignment_id": vans[row.van_number].pk,
+                "child_grade": row.child_grade,
+                "admission_number": row.admission_number,
+                "pickup_time": row.pickup_time,
+                "dropoff_time": row.dropoff_time,
+                "stop_latitude": row.stop_latitude,
+                "stop_longitude": row.stop_longitude,
+                "school": self.school,
+                "school_name": self.school.name if self.school else "",
+            }
+            key = (parent.pk, row.child_name)
+            child = children.get(key)
+            if key in created or key in updated:
+                self.report.error(row.number, f"{row.child_name} is listed twice for {row.parent_phone}")
+            elif child is None:
+                child = ChildVanAssignment(parent_id=parent.pk, child_name=row.child_name)
+                _set(child, values)
+                created[key] = child
+            else:
+                # A child moving vans leaves the old van's driver
+                self.affected_drivers.add(child.van_assignment.driver_id)
+                changed = _set(child, values)
+                if changed:
+                    fields.update(changed)
+                    updated[key] = child
+
+        ChildVanAssignment.objects.bulk_create(created.values())
+        if updated:
+            _bulk_update(ChildVanAssignment, list(updated.values()), fields)
+        self.report.created["children"] += len(created)
+        self.report.updated["children"] += len(updated)
+
+    def write(self):
+        users = self.users()
+        vans = self.vans(users)
+        self.children(users, vans)
+
+
+def invalidate_caches(users, driver_ids):
+    for user in users:
+        invalidate_user(user.pk)
+        invalidate_phone(user.phone_number)
+    for driver_id in driver_ids:
+        invalidate_schedule(driver_id)
+        invalidate_stop_index(driver_id)
+        invalidate_driver_route(driver_id)
+
+
+def import_roster(records, school=None, dry_run=False, chunk_size=None):
+    """
+    Import (row number, {column: value}) records, as from ``read_rows``.
+    With ``dry_run`` every chunk is rolled back. Returns an ImportReport.
+    """
+    chunk_size = chunk_size or settings.ROSTER_IMPORT["chunk_size"]
+    max_rows = settings.ROSTER_IMPORT["max_rows"]
+    report = ImportReport()
+    records = iter(records)
+    unreadable = None
+    while not unreadable:
+        batch = []
+        try:
+            for record in islice(records, min(chunk_size, max_rows - report.rows)):
+                batch.append(record)
+        except RosterError as e:
+            # Import what was read, then stop and report where the file broke
+            unreadable = e
+            report.stopped(e.row, str(e))
+        if not batch and not unreadable:
+            extra = next(records, None)
+            if extra is not None:
+                report.stopped(extra[0], f"Only {max_rows} rows are imported at a time; the rest were skipped")
+            report.errors.sort()
+            return report
+        report.rows += len(batch)
+
+        rows = []
+        for number, record in batch:
+            try:
+                rows.append(parse_row(number, record))
+            except ValueError as e:
+                report.error(number, str(e))
+        if not rows:
+            continue
+
+        chunk = _Chunk(rows, school, report)
+        with transaction.atomic():
+            chunk.write()
+            if dry_run:
+                transaction.set_rollback(True)
+        if not dry_run:
+            invalidate_caches(chunk.changed_users, chunk.affected_drivers)
+    report.errors.sort()
+    return report
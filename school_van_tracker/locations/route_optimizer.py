@@ -0,0 +1,249 @@
+"""
+Pickup-order optimisation for a van.
+
+Children sharing a stop are grouped, a distance matrix is computed once, and
+the stop sequence is built with nearest-neighbour then improved with 2-opt
+(reverse a stretch) and Or-opt (move a chain of 1-3 stops) until no move
+helps or the time limit is hit. Cost is driving distance plus a penalty for
+arriving after a child's pickup window closes.
+
+The search itself (``optimize_stops``) is plain Python over plain data so it
+can run in worker processes; loading stops from and saving the order to the
+database happen around it.
+"""
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import transaction
+
+from .geo import haversine_m
+from .models import ChildVanAssignment, Route, RouteStop
+
+Stop = namedtuple("Stop", ["key", "name", "latitude", "longitude", "pickup_minutes", "load", "child_ids"])
+
+OptimizedRoute = namedtuple(
+    "OptimizedRoute",
+    ["stops", "distance_m", "late_minutes", "over_capacity", "iterations", "elapsed_seconds"],
+)
+
+
+def distance_matrix(points):
+    """Symmetric matrix of great-circle distances (meters) between (lat, lon) points"""
+    n = len(points)
+    matrix = [[0.0] * n for _ in range(n)]
+    for i in range(n):
+        for j in range(i + 1, n):
+            matrix[i][j] = matrix[j][i] = haversine_m(*points[i], *points[j])
+    return matrix
+
+
+class _Problem:
+    """Stops plus optional fixed start/end, indexed into one distance matrix"""
+
+    def __init__(self, stops, start=None, end=None, speed_kmh=None, dwell_seconds=None, late_tolerance=None):
+        options = settings.ROUTE_OPTIMIZER
+        self.stops = stops
+        self.n = len(stops)
+        points = [(s.latitude, s.longitude) for s in stops]
+        self.start = self.end = None
+        if start:
+            self.start = len(points)
+            points.append(start)
+        if end:
+            self.end = len(points)
+            points.append(end)
+        self.matrix = distance_matrix(points)
+        self.meters_per_minute = (speed_kmh or options["speed_kmh"]) * 1000 / 60
+        self.dwell_minutes = (dwell_seconds if dwell_seconds is not None else options["dwell_seconds"]) / 60
+        self.late_tolerance = late_tolerance if late_tolerance is not None else options["late_tolerance_minutes"]
+        self.late_penalty = options["late_penalty_meters_per_minute"]
+
+    def evaluate(self, order):
+        """Return (cost, distance_m, late_minutes) for visiting stops in ``order``"""
+        matrix = self.matrix
+        distance = 0.0
+        late = 0.0
+        clock = None
+        previous = self.start
+        for index in order:
+            if previous is not None:
+                leg = matrix[previous][index]
+                distance += leg
+                if clock is not None:
+                    clock += leg / self.meters_per_minute
+            window = self.stops[index].pickup_minutes
+            if window is not None:
+                if clock is None or clock < window:
+                    # Wait for the window to open (or start the clock there)
+                    clock = window
+                elif clock > window + self.late_tolerance:
+                    late += clock - window - self.late_tolerance
+            if clock is not None:
+                clock += self.dwell_minutes
+            previous = index
+        if self.end is not None and previous is not None:
+            distance += matrix[previous][self.end]
+        return distance + late * self.late_penalty, distance, late
+
+    def nearest_neighbour(self):
+        remaining = set(range(self.n))
+        if self.start is not None:
+            current = self.start
+        else:
+            # Without a depot, begin at the earliest pickup (or the first stop)
+            def earliest(i):
+                pickup = self.stops[i].pickup_minutes
+                return (pickup is None, pickup or 0, i)
+            current = min(remaining, key=earliest)
+            remaining.remove(current)
+        order = [] if self.start is not None else [current]
+        while remaining:
+            current = min(remaining, key=lambda i: self.matrix[current][i])
+            remaining.remove(current)
+            order.append(current)
+        return order
+
+
+def _two_opt_moves(n):
+    for i in range(n - 1):
+        for j in range(i + 1, n):
+            yield lambda order, i=i, j=j: order[:i] + order[i:j + 1][::-1] + order[j + 1:]
+
+
+def _or_opt_moves(n):
+    for length in (1, 2, 3):
+        for i in range(n - length + 1):
+            for j in range(n - length + 1):
+                if j == i:
+                    continue
+
+                def move(order, i=i, j=j, length=length):
+                    chain = order[i:i + length]
+                    rest = order[:i] + order[i + length:]
+                    return rest[:j] + chain + rest[j:]
+                yield move
+
+
+def optimize_stops(stops, capacity=None, start=None, end=None, time_limit=None, **options):
+    """
+    Order ``stops`` (a list of Stop) for one van. ``start``/``end`` are optional
+    fixed (lat, lon) points such as the van's depot and the school.
+    """
+    started = time.monotonic()
+    time_limit = time_limit if time_limit is not None else settings.ROUTE_OPTIMIZER["time_limit_seconds"]
+    load = sum(stop.load for stop in stops)
+    over_capacity = max(0, load - capacity) if capacity else 0
+
+    if not stops:
+        return OptimizedRoute([], 0.0, 0.0, over_capacity, 0, 0.0)
+
+    problem = _Problem(stops, start=start, end=end, **options)
+    order = problem.nearest_neighbour()
+    best_cost = problem.evaluate(order)[0]
+
+    def out_of_time():
+        return time.monotonic() - started >= time_limit
+
+    iterations = 0
+    improved = True
+    while improved and not out_of_time():
+        improved = False
+        for moves in (_two_opt_moves, _or_opt_moves):
+            for move in moves(problem.n):
+                candidate = move(order)
+                cost = problem.evaluate(candidate)[0]
+                iterations += 1
+                if cost < best_cost - 1e-6:
+                    order, best_cost = candidate, cost
+                    improved = True
+                if iterations % 500 == 0 and out_of_time():
+                    break
+            if out_of_time():
+                break
+
+    _, distance, late = problem.evaluate(order)
+    return OptimizedRoute(
+        stops=[stops[i] for i in order],
+        distance_m=round(distance, 1),
+        late_minutes=round(late, 1),
+        over_capacity=over_capacity,
+        iterations=iterations,
+        elapsed_seconds=round(time.monotonic() - started, 3),
+    )
+
+
+def load_van_stops(van_assignment):
+    """Active children on the van grouped into stops (siblings share a stop)"""
+    children = ChildVanAssignment.objects.filter(
+        van_assignment=van_assignment,
+        is_active=True,
+        stop_latitude__isnull=False,
+        stop_longitude__isnull=False
+    ).order_by('pk')
+
+    grouped = {}
+    for child in children:
+        key = (child.stop_latitude, child.stop_longitude)
+        grouped.setdefault(key, []).append(child)
+
+    stops = []
+    for (latitude, longitude), group in grouped.items():
+        pickup_times = [c.pickup_time for c in group if c.pickup_time]
+        pickup = min(pickup_times) if pickup_times else None
+        stops.append(Stop(
+            key=f"{latitude},{longitude}",
+            name=", ".join(c.child_name for c in group),
+            latitude=float(latitude),
+            longitude=float(longitude),
+            pickup_minutes=pickup.hour * 60 + pickup.minute if pickup else None,
+            load=len(group),
+            child_ids=[c.pk for c in group],
+        ))
+    return stops
+
+
+@transaction.atomic
+def apply_stop_order(van_assignment, result):
+    """Save the optimised order as the van's route stops"""
+    route = van_assignment.route
+    if route is None:
+        route = Route.objects.create(name=f"Van {van_assignment.van_number}")
+        van_assignment.route = route
+        van_assignment.save(update_fields=['route', 'updated_at'])
+    if len(route.polyline) < 2:
+        # No drawn path yet: connect the stops in order
+        route.polyline = [[stop.latitude, stop.longitude] for stop in result.stops]
+        route.save()
+
+    route.stops.all().delete()
+    for sequence, stop in enumerate(result.stops, start=1):
+        RouteStop.objects.create(
+            route=route,
+            sequence=sequence,
+            name=stop.name[:100],
+            latitude=round(stop.latitude, 6),
+            longitude=round(stop.longitude, 6),
+            child_assignment_id=stop.child_ids[0] if len(stop.child_ids) == 1 else None,
+        )
+    return route
+
+
+def serialize_result(result):
+    return {
+        "distance_meters": result.distance_m,
+        "late_minutes": result.late_minutes,
+        "over_capacity": result.over_capacity,
+        "iterations": result.iterations,
+        "elapsed_seconds": result.elapsed_seconds,
+        "stops": [
+            {
+                "sequence": sequence,
+                "name": stop.name,
+                "latitude": stop.latitude,
+                "longitude": stop.longitude,
+                "child_assignment_ids": stop.child_ids,
+            }
+            for sequence, stop in enumerate(result.stops, start=1)
+        ],
+    }
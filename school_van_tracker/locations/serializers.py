@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Location, VanAssignment, ChildVanAssignment
+from .models import Location, VanAssignment, ChildVanAssignment, DailyDriverStats
 
 
 class LocationSerializer(serializers.ModelSerializer):
@@ -10,10 +10,14 @@ class LocationSerializer(serializers.ModelSerializer):
         model = Location
         fields = [
             'id', 'latitude', 'longitude', 'accuracy', 'speed', 
-            'heading', 'altitude', 'timestamp', 'is_active',
+            'heading', 'altitude', 'timestamp', 'received_at', 'is_active',
+            'route_progress', 'distance_along_route', 'route_offset',
             'driver_name', 'driver_phone', 'coordinates'
         ]
-        read_only_fields = ['id', 'timestamp', 'coordinates']
+        read_only_fields = [
+            'id', 'timestamp', 'received_at', 'coordinates',
+            'route_progress', 'distance_along_route', 'route_offset'
+        ]
 
 
 class VanAssignmentSerializer(serializers.ModelSerializer):
@@ -24,7 +28,7 @@ class VanAssignmentSerializer(serializers.ModelSerializer):
         model = VanAssignment
         fields = [
             'id', 'van_number', 'van_model', 'capacity', 
-            'route_name', 'is_active', 'driver_name', 'driver_phone',
+            'route_name', 'school', 'is_active', 'driver_name', 'driver_phone',
             'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
@@ -38,9 +42,24 @@ class ChildVanAssignmentSerializer(serializers.ModelSerializer):
     class Meta:
         model = ChildVanAssignment
         fields = [
-            'id', 'child_name', 'child_grade', 'school_name', 
+            'id', 'child_name', 'child_grade', 'school', 'school_name', 
             'admission_number', 'pickup_time', 'dropoff_time',
-            'is_active', 'van_number', 'driver_name', 'driver_phone',
+            'stop_latitude', 'stop_longitude', 'is_active', 'van_number', 'driver_name', 'driver_phone',
             'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
+
+
+class DailyDriverStatsSerializer(serializers.ModelSerializer):
+    driver_name = serializers.CharField(source='driver.get_full_name', read_only=True)
+    van_number = serializers.CharField(source='van_assignment.van_number', read_only=True, default=None)
+    average_speed_kmh = serializers.FloatField(read_only=True)
+    
+    class Meta:
+        model = DailyDriverStats
+        fields = [
+            'date', 'driver', 'driver_name', 'van_assignment', 'van_number',
+            'distance_meters', 'moving_seconds', 'idle_seconds',
+            'average_speed_kmh', 'max_speed_kmh', 'point_count', 'first_seen', 'last_seen'
+        ]
+        read_only_fields = fields
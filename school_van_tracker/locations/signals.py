@@ -0,0 +1,41 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .alerts import invalidate_stop_index
+from .map_matching import invalidate_driver_route
+from .models import ChildVanAssignment, Route, VanAssignment
+from .tracking import invalidate_schedule
+
+
+@receiver(post_save, sender=ChildVanAssignment)
+@receiver(post_delete, sender=ChildVanAssignment)
+def child_assignment_changed(sender, instance, **kwargs):
+    invalidate_schedule(instance.van_assignment.driver_id)
+    invalidate_stop_index(instance.van_assignment.driver_id)
+
+
+@receiver(post_save, sender=VanAssignment)
+@receiver(post_delete, sender=VanAssignment)
+def van_assignment_changed(sender, instance, **kwargs):
+    invalidate_schedule(instance.driver_id)
+    invalidate_stop_index(instance.driver_id)
+    invalidate_driver_route(instance.driver_id)
+
+
+@receiver(post_save, sender=Route)
+def route_changed(sender, instance, **kwargs):
+    for driver_id in instance.van_assignments.values_list('driver_id', flat=True):
+        invalidate_driver_route(driver_id)
+
+
+@receiver(pre_delete, sender=Route)
+def remember_route_drivers(sender, instance, **kwargs):
+    # Deleting the route sets VanAssignment.route to NULL with a queryset
+    # update, which sends no signal, so its drivers are noted beforehand
+    instance._driver_ids = list(instance.van_assignments.values_list('driver_id', flat=True))
+
+
+@receiver(post_delete, sender=Route)
+def route_deleted(sender, instance, **kwargs):
+    for driver_id in getattr(instance, '_driver_ids', []):
+        invalidate_driver_route(driver_id)
@@ -0,0 +1,1230 @@
+import csv
+import datetime
+import io
+import json
+import random
+import tempfile
+from decimal import Decimal
+from io import StringIO
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from accounts.models import OTPVerification, School, User
+from accounts.profiles import lookup_phone
+from school_van_tracker import renderers
+from school_van_tracker.admin_utils import EstimatedCountPaginator
+from . import (
+    alerts, export, heartbeat, heatmap, map_matching, playback, rollups, roster, route_optimizer, tracking, wire
+)
+from .models import (
+    ChildVanAssignment, DailyDriverStats, DriverTrackingState, Location, RollupWatermark, Route, RouteStop, VanAssignment
+)
+
+
+class LocationTestMixin:
+    # Tenant models are read from every tenant database under settings_tenant
+    databases = {'default', *settings.TENANT_DATABASES}
+
+    @classmethod
+    def setUpClass(cls):
+        # Data written inside a TestCase isn't visible to a replica's own
+        # connection, so reads stay on the primary here; replica reads are
+        # covered by school_van_tracker.tests under settings_replica
+        cls.enterClassContext(override_settings(DATABASE_REPLICAS=[]))
+        super().setUpClass()
+
+    def make_driver(self, phone_number, **kwargs):
+        return User.objects.create(phone_number=phone_number, user_type='driver', **kwargs)
+
+    def make_van(self, driver, van_number, **kwargs):
+        return VanAssignment.objects.create(driver=driver, van_number=van_number, **kwargs)
+
+    def make_location(self, driver, latitude, longitude, **kwargs):
+        return Location.objects.create(
+            driver=driver, latitude=Decimal(str(latitude)), longitude=Decimal(str(longitude)), **kwargs
+        )
+
+    def authenticate(self, user):
+        cache.clear()
+        token = Token.objects.create(user=user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+        return client
+
+
+class VanLocationTests(LocationTestMixin, TestCase):
+    def setUp(self):
+        self.parent = User.objects.create(phone_number='+919876543211', user_type='parent')
+        self.client = self.authenticate(self.parent)
+
+    def add_van_with_children(self, index, children):
+        driver = self.make_driver(f'+91987654330{index}')
+        van = self.make_van(driver, f'DPS-00{index}')
+        self.make_location(driver, 28.6 + index / 100, 77.2, is_active=True)
+        for child_name in children:
+            ChildVanAssignment.objects.create(parent=self.parent, child_name=child_name, van_assignment=van)
+        return van
+
+    def test_returns_every_van_in_constant_queries(self):
+        self.add_van_with_children(1, ['Aarav'])
+        self.client.get('/api/locations/van-location/')  # warm the auth cache
+
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/locations/van-location/')
+        self.assertEqual(len(response.data['vans']), 1)
+
+        self.add_van_with_children(2, ['Diya', 'Kabir'])
+        self.add_van_with_children(3, ['Meera'])
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/locations/van-location/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            {van['van_assignment']['van_number']: len(van['children']) for van in response.data['vans']},
+            {'DPS-001': 1, 'DPS-002': 2, 'DPS-003': 1}
+        )
+        self.assertEqual(len(response.data['children']), 4)
+
+    def test_van_without_location_is_listed_without_position(self):
+        self.add_van_with_children(1, ['Aarav'])
+        driver = self.make_driver('+919876543309')
+        van = self.make_van(driver, 'DPS-009')
+        ChildVanAssignment.objects.create(parent=self.parent, child_name='Ishaan', van_assignment=van)
+
+        response = self.client.get('/api/locations/van-location/')
+
+        located = {van['van_assignment']['van_number']: van['location'] is not None for van in response.data['vans']}
+        self.assertEqual(located, {'DPS-001': True, 'DPS-009': False})
+        self.assertEqual(response.data['van_assignment']['van_number'], 'DPS-001')
+
+
+@override_settings(TIME_ZONE='UTC')
+class TrackingPolicyTests(LocationTestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.driver = self.make_driver('+919876543210')
+        self.van = self.make_van(self.driver, 'DPS-001')
+        parent = User.objects.create(phone_number='+919876543211', user_type='parent')
+        ChildVanAssignment.objects.create(
+            parent=parent, child_name='Aarav', van_assignment=self.van,
+            pickup_time=datetime.time(7, 30), dropoff_time=datetime.time(14, 30),
+            stop_latitude=Decimal('28.600000'), stop_longitude=Decimal('77.200000')
+        )
+        self.on_shift = timezone.make_aware(datetime.datetime(2026, 10, 19, 7, 15))
+
+    def policy(self, latitude=28.65, longitude=77.25, speed=30, now=None):
+        return tracking.get_tracking_policy(
+            self.driver.pk, latitude=latitude, longitude=longitude, speed=speed, now=now or self.on_shift
+        )
+
+    def test_modes(self):
+        self.assertEqual(self.policy()['mode'], tracking.MOVING)
+        self.assertEqual(self.policy(speed=0)['mode'], tracking.PARKED)
+        self.assertEqual(self.policy(latitude=28.601, longitude=77.2)['mode'], tracking.APPROACHING_STOP)
+        evening = timezone.make_aware(datetime.datetime(2026, 10, 19, 20, 0))
+        self.assertEqual(self.policy(now=evening)['mode'], tracking.OFF_SHIFT)
+
+    def test_resolution_rises_near_stops(self):
+        near = self.policy(latitude=28.601, longitude=77.2)
+        parked = self.policy(speed=0)
+
+        self.assertLess(near['interval_seconds'], parked['interval_seconds'])
+        self.assertLess(near['distance_filter_meters'], parked['distance_filter_meters'])
+
+    def test_faster_vans_upload_more_often(self):
+        self.assertLess(self.policy(speed=80)['interval_seconds'], self.policy(speed=20)['interval_seconds'])
+
+    def test_toggle_is_persisted(self):
+        client = self.authenticate(self.driver)
+
+        response = client.post('/api/locations/toggle-gps/', {'enabled': False}, format='json')
+
+        self.assertFalse(response.data['policy']['tracking_enabled'])
+        self.assertFalse(DriverTrackingState.objects.get(driver=self.driver).is_enabled)
+        cache.clear()
+        self.assertEqual(self.policy()['mode'], tracking.DISABLED)
+
+    def test_update_location_returns_policy(self):
+        client = self.authenticate(self.driver)
+
+        response = client.post(
+            '/api/locations/update-location/', {'latitude': '28.650000', 'longitude': '77.250000', 'speed': 0},
+            format='json'
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(response.data['policy']['mode'], {tracking.PARKED, tracking.OFF_SHIFT})
+        self.assertEqual(client.get('/api/locations/tracking-policy/').data['policy'], response.data['policy'])
+
+    def test_schedule_cache_invalidated_on_assignment_change(self):
+        self.assertEqual(len(tracking.get_schedule(self.driver.pk)['stops']), 1)
+
+        ChildVanAssignment.objects.update(stop_latitude=None)
+        ChildVanAssignment.objects.get().save()
+
+        self.assertEqual(tracking.get_schedule(self.driver.pk)['stops'], [])
+
+
+class MapMatchingTests(LocationTestMixin, TestCase):
+    # An L-shaped route: ~1.1 km north, then ~1 km east
+    polyline = [[28.60, 77.20], [28.61, 77.20], [28.61, 77.21]]
+
+    def test_progress_along_route(self):
+        route = Route.objects.create(name='Morning', polyline=self.polyline)
+        matcher = map_matching.get_matcher(route)
+
+        start = matcher.match(28.60, 77.20)
+        corner = matcher.match(28.61, 77.2001)
+        end = matcher.match(28.6102, 77.21)
+
+        self.assertEqual(start.progress_pct, 0)
+        self.assertAlmostEqual(corner.distance_along_m, 1112 + 10, delta=5)
+        self.assertEqual(end.progress_pct, 100)
+        self.assertAlmostEqual(end.offset_m, 22, delta=2)
+        self.assertAlmostEqual(route.length_meters, 1112 + 977, delta=10)
+
+    def test_loop_uses_previous_progress(self):
+        # Out and back along the same street
+        matcher = map_matching.RouteMatcher(
+            [[28.60, 77.20], [28.61, 77.20], [28.60, 77.20]],
+            map_matching.build_segment_index([[28.60, 77.20], [28.61, 77.20], [28.60, 77.20]])
+        )
+
+        outbound = matcher.match(28.605, 77.20, previous_distance_m=400)
+        inbound = matcher.match(28.605, 77.20, previous_distance_m=1500)
+
+        self.assertAlmostEqual(outbound.distance_along_m, 556, delta=5)
+        self.assertAlmostEqual(inbound.distance_along_m, 1668, delta=5)
+
+    def test_update_location_records_route_progress(self):
+        driver = self.make_driver('+919876543210')
+        route = Route.objects.create(name='Morning', polyline=self.polyline)
+        self.make_van(driver, 'DPS-001', route=route)
+        stop = RouteStop.objects.create(route=route, sequence=1, latitude=Decimal('28.61'), longitude=Decimal('77.205'))
+        client = self.authenticate(driver)
+
+        response = client.post(
+            '/api/locations/update-location/', {'latitude': '28.605000', 'longitude': '77.200000'}, format='json'
+        )
+
+        self.assertAlmostEqual(response.data['location']['distance_along_route'], 556, delta=5)
+        self.assertAlmostEqual(response.data['location']['route_progress'], 26.6, delta=0.5)
+        self.assertAlmostEqual(stop.distance_along_meters, 1112 + 488, delta=10)
+
+    def test_deleted_route_stops_matching(self):
+        driver = self.make_driver('+919876543210')
+        route = Route.objects.create(name='Morning', polyline=self.polyline)
+        self.make_van(driver, 'DPS-001', route=route)
+        client = self.authenticate(driver)
+        self.assertIsNotNone(map_matching.get_driver_matcher(driver.pk))
+
+        route.delete()
+
+        self.assertIsNone(cache.get(map_matching._driver_route_key(driver.pk)))
+        self.assertIsNone(map_matching.get_driver_matcher(driver.pk))
+        response = client.post(
+            '/api/locations/update-location/', {'latitude': '28.605000', 'longitude': '77.200000'}, format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertIsNone(response.data['location']['route_progress'])
+
+    def test_route_missing_from_a_stale_cache_entry_means_no_matcher(self):
+        driver = self.make_driver('+919876543210')
+        cache.set(map_matching._driver_route_key(driver.pk), (9999, timezone.now()))
+
+        self.assertIsNone(map_matching.get_driver_matcher(driver.pk))
+        self.assertIsNone(cache.get(map_matching._driver_route_key(driver.pk)))
+
+
+class RouteOptimizerTests(LocationTestMixin, TestCase):
+    def random_stops(self, count, seed=7):
+        rng = random.Random(seed)
+        return [
+            route_optimizer.Stop(str(i), f"Stop {i}", 28.55 + rng.random() * 0.1, 77.15 + rng.random() * 0.1, None, 1, [i])
+            for i in range(count)
+        ]
+
+    def test_improves_on_nearest_neighbour(self):
+        stops = self.random_stops(40)
+        problem = route_optimizer._Problem(stops, end=(28.6, 77.2))
+        greedy = problem.evaluate(problem.nearest_neighbour())[1]
+
+        result = route_optimizer.optimize_stops(stops, capacity=40, end=(28.6, 77.2), time_limit=5)
+
+        self.assertEqual(sorted(s.key for s in result.stops), sorted(s.key for s in stops))
+        self.assertLess(result.distance_m, greedy)
+        self.assertLess(result.elapsed_seconds, 5)
+
+    def test_pickup_windows_and_capacity(self):
+        # Visiting the far stop first is shorter but its child is picked up last
+        stops = [
+            route_optimizer.Stop("near", "Near", 28.60, 77.20, 7 * 60, 2, [1]),
+            route_optimizer.Stop("far", "Far", 28.65, 77.20, 7 * 60 + 30, 1, [2]),
+        ]
+
+        result = route_optimizer.optimize_stops(stops, capacity=2, start=(28.70, 77.20))
+
+        self.assertEqual([s.key for s in result.stops], ["near", "far"])
+        self.assertEqual(result.late_minutes, 0)
+        self.assertEqual(result.over_capacity, 1)
+
+    def add_children(self, van):
+        parent = User.objects.create(phone_number='+919876543211', user_type='parent')
+        for name, latitude in [('Aarav', '28.620000'), ('Diya', '28.600000'), ('Kabir', '28.610000')]:
+            ChildVanAssignment.objects.create(
+                parent=parent, child_name=name, van_assignment=van,
+                stop_latitude=Decimal(latitude), stop_longitude=Decimal('77.200000')
+            )
+
+    def test_staff_endpoint_applies_order(self):
+        van = self.make_van(self.make_driver('+919876543210'), 'DPS-001')
+        self.add_children(van)
+        staff = User.objects.create(phone_number='+919876543299', user_type='parent', is_staff=True)
+        client = self.authenticate(staff)
+
+        response = client.post(
+            '/api/locations/routes/optimize/', {'van_id': van.pk, 'apply': True, 'end': [28.63, 77.20]}, format='json'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['applied'])
+        van.refresh_from_db()
+        self.assertEqual(list(van.route.stops.values_list('name', flat=True)), ['Diya', 'Kabir', 'Aarav'])
+
+    def test_endpoint_is_staff_only(self):
+        driver = self.make_driver('+919876543210')
+        client = self.authenticate(driver)
+
+        response = client.post('/api/locations/routes/optimize/', {'van_id': 1}, format='json')
+
+        self.assertEqual(response.status_code, 403)
+
+    def test_command(self):
+        van = self.make_van(self.make_driver('+919876543210'), 'DPS-001')
+        self.add_children(van)
+        out = StringIO()
+
+        call_command('optimize_routes', '--workers=1', '--apply', stdout=out)
+
+        self.assertIn('Van DPS-001: 3 stops', out.getvalue())
+        self.assertEqual(RouteStop.objects.filter(route__van_assignments=van).count(), 3)
+
+
+class ProximityAlertTests(LocationTestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.driver = self.make_driver('+919876543210')
+        self.van = self.make_van(self.driver, 'DPS-001')
+        self.parent = User.objects.create(phone_number='+919876543211', user_type='parent')
+        for name in ['Aarav', 'Diya']:
+            ChildVanAssignment.objects.create(
+                parent=self.parent, child_name=name, van_assignment=self.van,
+                stop_latitude=Decimal('28.600000'), stop_longitude=Decimal('77.200000')
+            )
+        other_parent = User.objects.create(phone_number='+919876543212', user_type='parent')
+        ChildVanAssignment.objects.create(
+            parent=other_parent, child_name='Kabir', van_assignment=self.van,
+            stop_latitude=Decimal('28.700000'), stop_longitude=Decimal('77.200000')
+        )
+        self.morning = timezone.make_aware(datetime.datetime(2026, 10, 19, 7, 15))
+        self.received = []
+        alerts.proximity_alert.connect(self.receive)
+        self.addCleanup(alerts.proximity_alert.disconnect, self.receive)
+
+    def receive(self, sender, alert, **kwargs):
+        self.received.append(alert)
+
+    def test_alert_once_per_stop_per_trip(self):
+        # ~1.1 km out: not yet
+        self.assertEqual(alerts.check_proximity(self.driver.pk, 28.59, 77.2, now=self.morning), [])
+
+        sent = alerts.check_proximity(self.driver.pk, 28.597, 77.2, now=self.morning)
+        again = alerts.check_proximity(self.driver.pk, 28.599, 77.2, now=self.morning)
+        afternoon = alerts.check_proximity(
+            self.driver.pk, 28.599, 77.2, now=self.morning + datetime.timedelta(hours=7)
+        )
+
+        self.assertEqual(len(sent), 1)
+        self.assertEqual(sent[0].parent_id, self.parent.pk)
+        self.assertEqual(sorted(sent[0].child_names), ['Aarav', 'Diya'])
+        self.assertAlmostEqual(sent[0].distance_meters, 334, delta=5)
+        self.assertEqual(again, [])
+        self.assertEqual(len(afternoon), 1)
+        self.assertEqual(self.received, sent + afternoon)
+
+    def test_eta_threshold_for_moving_van(self):
+        # ~1.1 km away at 30 km/h is a little over 2 minutes out
+        sent = alerts.check_proximity(self.driver.pk, 28.59, 77.2, speed=30, now=self.morning)
+
+        self.assertEqual(len(sent), 1)
+        self.assertAlmostEqual(sent[0].eta_minutes, 2.2, delta=0.1)
+
+    def test_invalid_speed_is_treated_as_unknown(self):
+        # ~1.1 km out is outside the plain radius
+        for speed in (-1, float('nan'), float('inf')):
+            self.assertEqual(alerts.check_proximity(self.driver.pk, 28.59, 77.2, speed=speed, now=self.morning), [])
+
+    def test_index_is_cached_and_invalidated(self):
+        alerts.check_proximity(self.driver.pk, 28.0, 77.2, now=self.morning)
+
+        with self.assertNumQueries(0):
+            alerts.check_proximity(self.driver.pk, 28.0, 77.2, now=self.morning)
+
+        ChildVanAssignment.objects.filter(child_name='Kabir').update(stop_latitude=Decimal('28.010000'))
+        ChildVanAssignment.objects.get(child_name='Kabir').save()
+        self.assertEqual(len(alerts.check_proximity(self.driver.pk, 28.0, 77.2, now=self.morning)), 0)
+        self.assertEqual(len(alerts.check_proximity(self.driver.pk, 28.009, 77.2, now=self.morning)), 1)
+
+    def test_update_location_emits_alerts(self):
+        client = self.authenticate(self.driver)
+
+        client.post('/api/locations/update-location/', {'latitude': '28.601000', 'longitude': '77.200000'}, format='json')
+
+        self.assertEqual(len(self.received), 1)
+
+
+@override_settings(TIME_ZONE='UTC')
+class IngestTests(LocationTestMixin, TestCase):
+    def setUp(self):
+        self.driver = self.make_driver('+919876543210')
+        self.client = self.authenticate(self.driver)
+
+    def post(self, **point):
+        return self.client.post('/api/locations/update-location/', point, format='json')
+
+    def test_retried_point_is_stored_once(self):
+        point = {'latitude': '28.600000', 'longitude': '77.200000', 'idempotency_key': 'p-1'}
+
+        first = self.post(**point)
+        retry = self.post(**point)
+
+        self.assertEqual((first.status_code, retry.status_code), (201, 200))
+        self.assertTrue(retry.data['duplicate'])
+        self.assertEqual(retry.data['location']['id'], first.data['location']['id'])
+        self.assertEqual(Location.objects.count(), 1)
+
+    def test_late_point_does_not_replace_current_position(self):
+        self.post(latitude='28.610000', longitude='77.200000', recorded_at='2026-10-18T07:10:00Z', idempotency_key='b')
+
+        late = self.post(
+            latitude='28.600000', longitude='77.200000', recorded_at='2026-10-18T07:05:00Z', idempotency_key='a'
+        )
+
+        self.assertEqual(late.status_code, 201)
+        self.assertFalse(late.data['location']['is_active'])
+        current = Location.objects.get(is_active=True)
+        self.assertEqual(current.latitude, Decimal('28.610000'))
+        self.assertEqual(list(Location.objects.values_list('idempotency_key', flat=True)), ['b', 'a'])
+
+    def test_batch_upload_out_of_order(self):
+        points = [
+            {'latitude': 28.60 + i / 1000, 'longitude': 77.2, 'recorded_at': 1792306800000 + i * 5000, 'idempotency_key': f'k{i}'}
+            for i in (3, 1, 4, 0, 2)
+        ]
+
+        response = self.client.post('/api/locations/update-location/batch/', {'points': points}, format='json')
+        retry = self.client.post('/api/locations/update-location/batch/', {'points': points[:2]}, format='json')
+
+        self.assertEqual((response.data['created'], response.data['duplicates']), (5, 0))
+        self.assertEqual(response.data['location']['latitude'], '28.604000')
+        self.assertEqual((retry.status_code, retry.data['duplicates']), (200, 2))
+        self.assertEqual(Location.objects.filter(is_active=True).count(), 1)
+        self.assertEqual(
+            Location.objects.order_by('timestamp').first().timestamp,
+            datetime.datetime(2026, 10, 18, 7, 0, tzinfo=datetime.timezone.utc)
+        )
+
+    def test_future_timestamps_are_clamped(self):
+        self.post(latitude='28.600000', longitude='77.200000', recorded_at='2099-01-01T00:00:00Z')
+
+        self.assertLess(Location.objects.get().timestamp, timezone.now() + datetime.timedelta(minutes=5))
+
+    def test_invalid_points_are_rejected(self):
+        self.assertEqual(self.post(latitude='north', longitude='77.2').status_code, 400)
+        self.assertEqual(self.post(latitude='28.6', longitude='77.2', recorded_at='yesterday').status_code, 400)
+        response = self.client.post('/api/locations/update-location/batch/', {'points': []}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.post(latitude='28.6', longitude='77.2', recorded_at=10 ** 30).status_code, 400)
+        for url in ('/api/locations/update-location/', '/api/locations/update-location/batch/'):
+            self.assertEqual(self.client.post(url, [{'latitude': 28.6}], format='json').status_code, 400)
+        self.assertFalse(Location.objects.exists())
+
+
+class LocationAdminTests(LocationTestMixin, TestCase):
+    def setUp(self):
+        self.admin = User.objects.create(
+            phone_number='+919800000000', user_type='parent', is_staff=True, is_superuser=True
+        )
+        self.client.force_login(self.admin)
+        self.driver = self.make_driver('+919876543210')
+        other = self.make_driver('+918765432109')
+        for i in range(3):
+            self.make_location(self.driver, 28.6, 77.2)
+        self.make_location(other, 28.6, 77.2)
+
+    def test_opens_on_todays_page(self):
+        response = self.client.get('/admin/locations/location/')
+
+        self.assertRedirects(response, '/admin/locations/location/?' + '&'.join(
+            f'timestamp__{part}={getattr(timezone.localdate(), part)}' for part in ('year', 'month', 'day')
+        ), fetch_redirect_response=False)
+
+    def test_changelist_never_counts_the_whole_table(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/admin/locations/location/', {'q': '9198765'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cl'].result_count, 3)
+        counts = [q['sql'] for q in queries if 'COUNT(' in q['sql']]
+        self.assertTrue(counts)
+        self.assertTrue(all('LIMIT' in sql for sql in counts), counts)
+        self.assertFalse(any('LIKE' in sql and "'%" in sql for sql in (q['sql'] for q in queries)))
+
+    def test_estimated_count_for_unfiltered_list(self):
+        paginator = EstimatedCountPaginator(Location.objects.order_by('-timestamp'), 100)
+        paginator.exact_count_limit = 2
+
+        self.assertEqual(paginator.count, Location.objects.order_by('-pk').first().pk)
+        self.assertEqual(EstimatedCountPaginator(Location.objects.filter(driver=self.driver), 100).count, 3)
+
+    def test_otp_admin_prefix_search(self):
+        OTPVerification.objects.create(phone_number='+919876543210')
+        OTPVerification.objects.create(phone_number='+918765432109')
+
+        response = self.client.get('/admin/accounts/otpverification/', {'q': '+9198'})
+
+        self.assertEqual(response.context['cl'].result_count, 1)
+
+
+@override_settings(TIME_ZONE='UTC', LOCATION_ROLLUPS={
+    "batch_size": 5000, "settle_seconds": 0, "max_gap_seconds": 300, "idle_speed_kmh": 3, "max_speed_kmh": 150,
+})
+class RollupTests(LocationTestMixin, TestCase):
+    def setUp(self):
+        self.driver = self.make_driver('+919876543210')
+        self.van = self.make_van(self.driver, 'DPS-001')
+        self.start = datetime.datetime(2026, 10, 18, 7, 0, tzinfo=datetime.timezone.utc)
+
+    def drive(self, minutes, step_seconds=10, meters_per_step=100, offset=0):
+        """Points heading north at meters_per_step per step, starting ``offset`` seconds into the day"""
+        latitude = 28.6
+        for i in range(minutes * 60 // step_seconds):
+            self.make_location(
+                self.driver, round(latitude + i * meters_per_step / 111195, 6), 77.2,
+                timestamp=self.start + datetime.timedelta(seconds=offset + i * step_seconds)
+            )
+
+    def test_track_stats(self):
+        seconds = np.array([0, 10, 20, 30, 40, 1000, 1010], dtype=float)
+        # 100 m steps, then a stop, then a jump after a long gap, then a GPS spike
+        latitudes = 28.6 + np.array([0, 100, 200, 200, 200, 5000, 50000]) / 111195
+        longitudes = np.full(7, 77.2)
+        speeds = np.array([np.nan, 36, 36, 0, 0, np.nan, np.nan])
+
+        stats = rollups.track_stats(seconds, latitudes, longitudes, speeds)
+
+        self.assertAlmostEqual(stats['distance_meters'], 200, delta=1)
+        self.assertEqual(stats['moving_seconds'], 20)
+        self.assertEqual(stats['idle_seconds'], 20)
+        self.assertEqual(stats['max_speed_kmh'], 36)
+
+    def test_catch_up_matches_full_recompute(self):
+        self.drive(minutes=10)
+
+        while rollups.catch_up(batch_size=7):
+            pass
+
+        stats = DailyDriverStats.objects.get(driver=self.driver)
+        expected = rollups.compute_day(self.driver.pk, stats.date, Location.objects.order_by('-pk').first().pk)
+        self.assertEqual(stats.point_count, 60)
+        self.assertAlmostEqual(stats.distance_meters, expected['distance_meters'], places=3)
+        self.assertAlmostEqual(stats.distance_meters, 5900, delta=5)
+        self.assertAlmostEqual(stats.average_speed_kmh, 36, delta=0.5)
+        self.assertEqual(stats.van_assignment, self.van)
+        self.assertEqual(RollupWatermark.objects.get().last_location_id, Location.objects.order_by('-pk').first().pk)
+
+    def test_late_points_recompute_the_day(self):
+        self.drive(minutes=1, offset=600)
+        rollups.catch_up()
+
+        # Uploaded later but recorded earlier in the day
+        self.drive(minutes=1)
+        rollups.catch_up()
+
+        stats = DailyDriverStats.objects.get(driver=self.driver)
+        self.assertEqual(stats.point_count, 12)
+        self.assertEqual(stats.first_seen, self.start)
+
+    def test_backfill_command_and_report(self):
+        self.drive(minutes=2)
+        out = StringIO()
+
+        call_command('backfill_rollups', '--workers=1', '--since=2026-10-01', '--until=2026-10-31', stdout=out)
+
+        self.assertIn('Rebuilt 1 driver-days', out.getvalue())
+        # Already counted by the backfill: catch-up has nothing left to do
+        self.assertEqual(rollups.catch_up(), 0)
+
+        staff = User.objects.create(phone_number='+919876543299', user_type='parent', is_staff=True)
+        client = self.authenticate(staff)
+        response = client.get('/api/locations/reports/daily/', {'date': '2026-10-18'})
+        day = response.data['days'][0]
+        self.assertEqual((day['van_number'], day['point_count']), ('DPS-001', 12))
+        self.assertAlmostEqual(day['distance_meters'], 1100, delta=5)
+
+
+@override_settings(TIME_ZONE='UTC')
+class HeatmapTests(LocationTestMixin, TestCase):
+    def setUp(self):
+        self.driver = self.make_driver('+919876543210')
+        self.start = datetime.datetime(2026, 10, 18, 7, 0, tzinfo=datetime.timezone.utc)
+        self.staff = User.objects.create(phone_number='+919876543299', user_type='parent', is_staff=True)
+
+    def test_aggregate_bins_points_per_cell(self):
+        # Five points in one 250 m cell, two in a cell about 1 km north
+        latitudes = np.array([28.6001, 28.6002, 28.6003, 28.6004, 28.6005, 28.6101, 28.6102])
+        longitudes = np.full(7, 77.2001)
+        speeds = np.array([0, 10, 20, 30, np.nan, 40, 50], dtype=float)
+
+        cells = heatmap.aggregate(latitudes, longitudes, speeds, 250)
+
+        self.assertEqual([cell['count'] for cell in cells], [5, 2])
+        slow, fast = cells
+        self.assertEqual(slow['mean_speed_kmh'], 15)
+        self.assertEqual(slow['p50_speed_kmh'], 15)
+        self.assertEqual(slow['p90_speed_kmh'], 27)
+        self.assertEqual(slow['idle_share'], 0.25)
+        self.assertEqual(fast['p50_speed_kmh'], 45)
+        self.assertAlmostEqual(fast['latitude'], 28.61, delta=0.002)
+        self.assertEqual(heatmap.aggregate(latitudes, longitudes, speeds, 250, min_points=3), [slow])
+
+    def test_cells_are_roughly_square(self):
+        # 1000 points spread over 1 km east at 60 degrees north fall in about 4 cells
+        longitudes = 10 + np.linspace(0, 1000 / (111195 * 0.5), 1000)
+        rows, columns = heatmap.cell_indices(np.full(1000, 60.0001), longitudes, 250)
+        self.assertIn(len(set(columns)), (4, 5))
+        self.assertEqual(len(set(rows)), 1)
+
+    def test_endpoint_is_staff_only_and_cached(self):
+        for i in range(10):
+            self.make_location(
+                self.driver, 28.6001, 77.2001, speed=i, timestamp=self.start + datetime.timedelta(seconds=i * 10)
+            )
+        params = {'from': '2026-10-18T06:50:00Z', 'to': '2026-10-18T08:00:00Z', 'cell_size': 500}
+
+        parent = User.objects.create(phone_number='+919876543211', user_type='parent')
+        self.assertEqual(self.authenticate(parent).get('/api/locations/heatmap/', params).status_code, 403)
+
+        client = self.authenticate(self.staff)
+        response = client.get('/api/locations/heatmap/', params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['point_count'], 10)
+        self.assertEqual(response.data['cells'][0]['count'], 10)
+        self.assertEqual(response.data['cells'][0]['mean_speed_kmh'], 4.5)
+
+        # Same aligned window: served from the cache without touching Location
+        self.make_location(self.driver, 28.6001, 77.2001, timestamp=self.start)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get('/api/locations/heatmap/', {**params, 'from': '2026-10-18T06:55:00Z'})
+        self.assertEqual(response.data['point_count'], 10)
+        self.assertFalse(any('locations_location' in query['sql'] for query in queries.captured_queries))
+
+    def test_endpoint_rejects_bad_parameters(self):
+        client = self.authenticate(self.staff)
+        for params in ({'cell_size': 123}, {'bbox': '1,2,3'}, {'from': 'yesterday'},
+                       {'from': '2026-01-01T00:00:00Z', 'to': '2026-10-01T00:00:00Z'}):
+            self.assertEqual(client.get('/api/locations/heatmap/', params).status_code, 400)
+
+
+@override_settings(TIME_ZONE='UTC')
+class HeartbeatTests(LocationTestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.driver = self.make_driver('+919876543210')
+        self.van = self.make_van(self.driver, 'DPS-001')
+        parent = User.objects.create(phone_number='+919876543211', user_type='parent')
+        ChildVanAssignment.objects.create(
+            parent=parent, child_name='Aarav', van_assignment=self.van,
+            pickup_time=datetime.time(7, 30), dropoff_time=datetime.time(14, 30)
+        )
+        # 07:15 UTC, inside the pickup window
+        self.morning = datetime.datetime(2026, 10, 18, 7, 15, tzinfo=datetime.timezone.utc).timestamp()
+        self.events = []
+        for signal in (heartbeat.van_stale, heartbeat.van_recovered):
+            signal.connect(self.receive)
+            self.addCleanup(signal.disconnect, self.receive)
+
+    def receive(self, signal, event, **kwargs):
+        self.events.append((signal, event))
+
+    def test_uploads_record_a_heartbeat(self):
+        client = self.authenticate(self.driver)
+        client.post('/api/locations/update-location/', {'latitude': 28.6, 'longitude': 77.2}, format='json')
+
+        beat = heartbeat.get_heartbeats([self.driver.pk])[self.driver.pk]
+        self.assertAlmostEqual(beat.seen_at, timezone.now().timestamp(), delta=5)
+        self.assertGreater(beat.interval_seconds, 0)
+
+    def test_silent_van_is_reported_once_then_recovers(self):
+        heartbeat.record_heartbeat(self.driver.pk, 30, now=self.morning)
+        monitor = heartbeat.HeartbeatMonitor(now=self.morning)
+        monitor.check(now=self.morning)
+        self.assertEqual(self.events, [])
+
+        monitor.check(now=self.morning + 59)
+        self.assertEqual(self.events, [])
+        # Two missed 30 s uploads
+        monitor.check(now=self.morning + 61)
+        monitor.check(now=self.morning + 95)
+        monitor.check(now=self.morning + 200)
+        self.assertEqual(len(self.events), 1)
+        signal, event = self.events[0]
+        self.assertIs(signal, heartbeat.van_stale)
+        self.assertEqual((event.van_number, event.silent_seconds), ('DPS-001', 61))
+        self.assertTrue(event.tracking_enabled)
+
+        heartbeat.record_heartbeat(self.driver.pk, 30, now=self.morning + 210)
+        monitor.check(now=self.morning + 230)
+        self.assertIs(self.events[-1][0], heartbeat.van_recovered)
+
+    def test_deadline_follows_the_upload_interval(self):
+        # Parked vans upload every 120 s, so two missed uploads is four minutes
+        heartbeat.record_heartbeat(self.driver.pk, 120, now=self.morning)
+        monitor = heartbeat.HeartbeatMonitor(now=self.morning)
+
+        monitor.check(now=self.morning + 200)
+        self.assertEqual(self.events, [])
+        monitor.check(now=self.morning + 241)
+        self.assertEqual(len(self.events), 1)
+
+    def test_silence_outside_the_windows_is_not_reported(self):
+        evening = datetime.datetime(2026, 10, 18, 20, 0, tzinfo=datetime.timezone.utc).timestamp()
+        heartbeat.record_heartbeat(self.driver.pk, 300, now=evening)
+        monitor = heartbeat.HeartbeatMonitor(now=evening)
+
+        monitor.check(now=evening + 3600)
+
+        self.assertEqual(self.events, [])
+
+    def test_ticks_only_look_at_due_vans(self):
+        drivers = [self.make_driver(f'+91987654{i:04d}') for i in range(20)]
+        for driver in drivers:
+            self.make_van(driver, f'VAN-{driver.pk}')
+            heartbeat.record_heartbeat(driver.pk, 30, now=self.morning)
+        monitor = heartbeat.HeartbeatMonitor(now=self.morning)
+        monitor.check(now=self.morning)
+
+        with self.assertNumQueries(0):
+            monitor.check(now=self.morning + 10)
+        self.assertEqual(monitor.due(self.morning + 10), [])
+        self.assertEqual(len(monitor.heap), 21)
+
+
+    def test_fresh_monitor_reads_heartbeats_written_by_the_view(self):
+        client = self.authenticate(self.driver)
+        client.post('/api/locations/update-location/', {'latitude': 28.6, 'longitude': 77.2}, format='json')
+        beat = heartbeat.get_heartbeats([self.driver.pk])[self.driver.pk]
+
+        monitor = heartbeat.HeartbeatMonitor(now=beat.seen_at)
+        monitor.check(now=beat.seen_at + 1)
+
+        self.assertEqual(monitor.deadlines, {self.driver.pk: heartbeat.deadline(beat)})
+        self.assertEqual(self.events, [])
+
+    def test_command_needs_a_shared_cache(self):
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with self.settings(CACHES=locmem), self.assertRaisesMessage(CommandError, 'shared'):
+            call_command('monitor_heartbeats', stdout=StringIO())
+
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory}}
+        with self.settings(CACHES=shared):
+            client = self.authenticate(self.driver)
+            client.post('/api/locations/update-location/', {'latitude': 28.6, 'longitude': 77.2}, format='json')
+            out = StringIO()
+            call_command('monitor_heartbeats', stdout=out)
+        self.assertIn('Watching 1 active vans, 0 stale', out.getvalue())
+
+
+@override_settings(TIME_ZONE='UTC')
+class PlaybackTests(LocationTestMixin, TestCase):
+    def setUp(self):
+        self.driver = self.make_driver('+919876543210')
+        self.van = self.make_van(self.driver, 'DPS-001')
+        self.start = datetime.datetime(2026, 10, 18, 7, 0, tzinfo=datetime.timezone.utc)
+
+    def path_points(self, coordinates, step_seconds=5):
+        projection = map_matching.Projection(*coordinates[0])
+        return [
+            playback.PathPoint(
+                self.start + datetime.timedelta(seconds=i * step_seconds), latitude, longitude, 30.0, 0,
+                *projection.to_xy(latitude, longitude)
+            )
+            for i, (latitude, longitude) in enumerate(coordinates)
+        ]
+
+    def test_lttb_keeps_the_corner(self):
+        # 500 points north, then 500 points east
+        north = [(28.6 + i * 10 / 111195, 77.2) for i in range(500)]
+        east = [(north[-1][0], 77.2 + i * 10 / 97600) for i in range(1, 501)]
+        points = self.path_points(north + east)
+
+        path = list(playback.lttb(iter(points), len(points), 20))
+
+        self.assertLessEqual(len(path), 20)
+        self.assertEqual((path[0], path[-1]), (points[0], points[-1]))
+        self.assertIn(points[499], path)
+        self.assertEqual(path, sorted(path, key=lambda point: point.timestamp))
+
+    def test_lttb_returns_short_tracks_unchanged(self):
+        points = self.path_points([(28.6 + i / 1000, 77.2) for i in range(10)])
+        self.assertEqual(list(playback.lttb(iter(points), 10, 20)), points)
+
+    def test_collapse_stops(self):
+        moving = [(28.6 + i * 50 / 111195, 77.2) for i in range(10)]
+        # Three minutes of jitter within a few meters
+        parked = [(moving[-1][0] + (i % 3) / 111195, 77.2) for i in range(36)]
+        leaving = [(moving[-1][0] + i * 50 / 111195, 77.2) for i in range(1, 5)]
+        stops = []
+
+        path = list(playback.collapse_stops(self.path_points(moving + parked + leaving), stops, 30, 60))
+
+        self.assertEqual(len(path), 9 + 1 + 4)
+        self.assertEqual(len(stops), 1)
+        self.assertEqual(stops[0].duration_seconds, 180)
+        self.assertEqual(path[9].dwell_seconds, 180)
+
+    def test_buckets_are_sized_after_collapsing_stops(self):
+        # Moving for 50 points, parked for 900, moving again for 50
+        for i in range(1000):
+            latitude = 28.6 + min(max(i - 900, 50), i) * 50 / 111195
+            self.make_location(
+                self.driver, round(latitude, 6), 77.2, speed=30,
+                timestamp=self.start + datetime.timedelta(seconds=i * 5)
+            )
+
+        total, path, stops = playback.trip_path(
+            self.driver.pk, self.start, self.start + datetime.timedelta(hours=2), 20
+        )
+
+        self.assertEqual((total, len(stops)), (1000, 1))
+        self.assertEqual(len(path), 20)
+
+    def test_endpoint(self):
+        for i in range(600):
+            if 200 <= i < 260:
+                latitude = 28.6 + 200 * 10 / 111195  # parked for five minutes
+            else:
+                latitude = 28.6 + i * 10 / 111195
+            self.make_location(
+                self.driver, round(latitude, 6), 77.2, speed=30,
+                timestamp=self.start + datetime.timedelta(seconds=i * 5)
+            )
+        params = {'van_id': self.van.pk, 'from': '2026-10-18T06:00:00Z', 'to': '2026-10-18T09:00:00Z',
+                  'max_points': 50}
+
+        parent = User.objects.create(phone_number='+919876543211', user_type='parent')
+        self.assertEqual(self.authenticate(parent).get('/api/locations/playback/', params).status_code, 403)
+
+        staff = User.objects.create(phone_number='+919876543299', user_type='parent', is_staff=True)
+        client = self.authenticate(staff)
+        response = client.get('/api/locations/playback/', params)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['raw_point_count'], response.data['van_number']), (600, 'DPS-001'))
+        self.assertLessEqual(len(response.data['points']), 50)
+        self.assertEqual(len(response.data['stops']), 1)
+        stop = response.data['stops'][0]
+        self.assertAlmostEqual(stop['duration_seconds'], 300, delta=15)
+        self.assertIn(stop['duration_seconds'], [point['dwell_seconds'] for point in response.data['points']])
+
+        self.assertEqual(client.get('/api/locations/playback/', {'from': params['from']}).status_code, 400)
+        self.assertEqual(
+            client.get('/api/locations/playback/', {**params, 'to': '2026-10-20T09:00:00Z'}).status_code, 400
+        )
+
+
+@override_settings(TIME_ZONE='UTC')
+class WireFormatTests(LocationTestMixin, TestCase):
+    def setUp(self):
+        self.driver = self.make_driver('+919876543210')
+        self.client = self.authenticate(self.driver)
+        self.points = [
+            {
+                'latitude': 28.6 + i / 10000,
+                'longitude': 77.2 - i / 10000,
+                'timestamp': 1792306800 + i * 5,
+                'speed': None if i % 3 else 31.5,
+                'heading': 359.9 - i,
+                'idempotency_key': f'1792306800-{i:04d}',
+            }
+            for i in range(40)
+        ]
+
+    def test_round_trip(self):
+        encoded = wire.encode_points(self.points)
+        decoded = wire.decode_points(encoded)
+
+        self.assertLess(len(encoded), len(json.dumps(self.points)) / 5)
+        for point, result in zip(self.points, decoded):
+            self.assertEqual(set(result), {key for key, value in point.items() if value is not None})
+            for key, value in result.items():
+                if isinstance(value, float):
+                    self.assertAlmostEqual(value, point[key], places=6)
+                else:
+                    self.assertEqual(value, point[key])
+
+    def test_varints(self):
+        values = np.array([0, 1, 127, 128, 16384, 2 ** 41, 2 ** 64 - 1], dtype=np.uint64)
+        self.assertEqual(wire.encode_varints([300]), b'\xac\x02')
+        self.assertTrue((wire.decode_varints(wire.encode_varints(values)) == values).all())
+        signed = np.array([0, -1, 1, -(2 ** 40), 2 ** 40], dtype=np.int64)
+        self.assertTrue((wire.unzigzag(wire.zigzag(signed)) == signed).all())
+
+    def test_rejects_bad_payloads(self):
+        encoded = wire.encode_points(self.points)
+        for payload in (b'', b'{"points": []}', encoded[:-3], encoded[:2] + b'\x09' + encoded[3:]):
+            with self.assertRaises(wire.WireFormatError):
+                wire.decode_points(payload)
+
+    def test_rejects_oversized_counts_before_decoding(self):
+        huge = wire.MAGIC + bytes([wire.VERSION]) + wire.encode_varints([10 ** 9, 0])
+        with self.assertRaisesMessage(wire.WireFormatError, "can't fit"):
+            wire.decode_points(huge)
+        with self.assertRaisesMessage(wire.WireFormatError, 'At most 10 points'):
+            wire.decode_points(wire.encode_points(self.points), max_points=10)
+
+        response = self.client.post('/api/locations/update-location/batch/', huge, content_type=wire.MEDIA_TYPE)
+        self.assertEqual(response.status_code, 400)
+        with self.settings(LOCATION_BATCH_MAX_POINTS=10):
+            response = self.client.post(
+                '/api/locations/update-location/batch/', wire.encode_points(self.points), content_type=wire.MEDIA_TYPE
+            )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Location.objects.exists())
+
+    def test_rejects_overlong_key_lengths(self):
+        # One idempotency key whose length is 200 KB of continuation bytes
+        bit = [field.name for field in wire.FIELDS].index('idempotency_key')
+        keys = b'\xff' * 200_000
+        payload = (
+            wire.MAGIC + bytes([wire.VERSION]) + wire.encode_varints([1, 1 << bit, 0, len(keys)]) + keys
+        )
+        with self.assertRaisesMessage(wire.WireFormatError, 'Varint too long'):
+            wire.decode_points(payload)
+
+    def test_batch_upload(self):
+        payload = wire.encode_points(self.points)
+
+        response = self.client.post(
+            '/api/locations/update-location/batch/', payload, content_type=wire.MEDIA_TYPE
+        )
+        retry = self.client.post('/api/locations/update-location/batch/', payload, content_type=wire.MEDIA_TYPE)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['created'], retry.data['duplicates']), (40, 40))
+        newest = Location.objects.get(is_active=True)
+        self.assertEqual(newest.idempotency_key, '1792306800-0039')
+        self.assertEqual(newest.timestamp.timestamp(), 1792306800 + 39 * 5)
+        self.assertEqual(newest.latitude, Decimal('28.603900'))
+
+        single = self.client.post(
+            '/api/locations/update-location/', wire.encode_points([{**self.points[0], 'idempotency_key': 'one'}]),
+            content_type=wire.MEDIA_TYPE
+        )
+        self.assertEqual(single.status_code, 201)
+
+        bad = self.client.post('/api/locations/update-location/batch/', b'KP\x01\xff', content_type=wire.MEDIA_TYPE)
+        self.assertEqual(bad.status_code, 400)
+
+    def test_history_read(self):
+        for i in range(5):
+            self.make_location(
+                self.driver, 28.6 + i / 1000, 77.2, speed=30,
+                timestamp=datetime.datetime(2026, 10, 18, 7, 0, i, tzinfo=datetime.timezone.utc)
+            )
+
+        response = self.client.get('/api/locations/location-history/', HTTP_ACCEPT=wire.MEDIA_TYPE)
+
+        self.assertEqual(response['Content-Type'], wire.MEDIA_TYPE)
+        points = wire.decode_points(response.content)
+        self.assertEqual([point['latitude'] for point in points], [28.604, 28.603, 28.602, 28.601, 28.6])
+        self.assertEqual(points[0]['timestamp'], datetime.datetime(2026, 10, 18, 7, 0, 4).replace(
+            tzinfo=datetime.timezone.utc).timestamp())
+        self.assertEqual(self.client.get('/api/locations/location-history/')['Content-Type'], 'application/json')
+
+        # Errors stay readable
+        parent = User.objects.create(phone_number='+919876543211', user_type='parent')
+        error = self.authenticate(parent).get('/api/locations/location-history/', HTTP_ACCEPT=wire.MEDIA_TYPE)
+        self.assertEqual((error.status_code, error['Content-Type']), (403, 'application/json'))
+        self.assertIn('error', json.loads(error.content))
+
+
+class RosterImportTests(LocationTestMixin, TestCase):
+    HEADER = ['Van Number', 'Driver Phone', 'Driver First Name', 'Parent Phone', 'Parent First Name',
+              'Child Name', 'Child Grade', 'Pickup Time', 'Stop Latitude', 'Stop Longitude']
+
+    def setUp(self):
+        cache.clear()
+        self.school = School.objects.create(name='Delhi Public School', slug='dps')
+
+    def sheet(self, rows):
+        file = io.StringIO()
+        writer = csv.writer(file)
+        writer.writerow(self.HEADER)
+        writer.writerows(rows)
+        return io.BytesIO(file.getvalue().encode())
+
+    def roster(self, vans=10, children_per_van=30):
+        rows = []
+        for van in range(vans):
+            for child in range(children_per_van):
+                rows.append([
+                    f'DPS-{van:03d}', f'+91987650{van:04d}', f'Driver {van}',
+                    f'+91912340{van * children_per_van + child:04d}', f'Parent {child}',
+                    f'Child {child}', '4', '07:30', '28.6', '77.2'
+                ])
+        return rows
+
+    def run_import(self, rows, **kwargs):
+        file = self.sheet(rows)
+        return roster.import_roster(roster.read_rows(file, 'roster.csv'), **kwargs)
+
+    def test_import_creates_users_vans_and_children_in_a_few_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            report = self.run_import(self.roster(), school=self.school, chunk_size=500)
+
+        self.assertEqual(report.errors, [])
+        self.assertEqual(report.created, {"drivers": 10, "parents": 300, "vans": 10, "children": 300})
+        self.assertLess(len(queries), 20)
+        child = ChildVanAssignment.objects.select_related('van_assignment__driver').get(
+            parent__phone_number='+919123400031'
+        )
+        self.assertEqual((child.child_name, child.pickup_time, child.stop_latitude), (
+            'Child 1', datetime.time(7, 30), Decimal('28.6')
+        ))
+        self.assertEqual(child.van_assignment.van_number, 'DPS-001')
+        self.assertEqual(child.van_assignment.driver.school, self.school)
+        self.assertEqual(child.school_name, 'Delhi Public School')
+        self.assertFalse(child.van_assignment.driver.has_usable_password())
+
+    def test_reimport_updates_instead_of_duplicating(self):
+        rows = self.roster(vans=2, children_per_van=3)
+        self.run_import(rows)
+        rows[0][6] = '5'
+        rows[1][0] = 'DPS-001'
+
+        report = self.run_import(rows, chunk_size=2)
+
+        self.assertEqual(report.created, {"drivers": 0, "parents": 0, "vans": 0, "children": 0})
+        self.assertEqual(report.updated["children"], 2)
+        self.assertEqual(ChildVanAssignment.objects.count(), 6)
+        self.assertEqual(VanAssignment.objects.count(), 2)
+        self.assertEqual(ChildVanAssignment.objects.get(child_name='Child 0', parent__first_name='Parent 0',
+                                                        van_assignment__van_number='DPS-000').child_grade, '5')
+        self.assertEqual(ChildVanAssignment.objects.filter(van_assignment__van_number='DPS-001').count(), 4)
+
+    def test_bad_rows_are_reported_and_the_rest_imported(self):
+        User.objects.create(phone_number='+919123400001', user_type='driver')
+        rows = self.roster(vans=1, children_per_van=5)
+        rows[0][3] = '12345'
+        rows[1][3] = '+919123400001'
+        rows[3][8] = '123'
+        rows[4][1] = '+919876509999'
+
+        report = self.run_import(rows + [['DPS-001', '+919876500001', '', '+919123409999', '', 'Child 9']])
+
+        self.assertEqual([row for row, _ in report.errors], [2, 3, 5, 6])
+        self.assertIn('not a valid phone number', report.errors[0][1])
+        self.assertIn('already registered as a driver', report.errors[1][1])
+        self.assertIn('out of range', report.errors[2][1])
+        self.assertIn('more than one driver', report.errors[3][1])
+        self.assertEqual(report.as_dict()["imported"], 2)
+        self.assertEqual(
+            sorted(ChildVanAssignment.objects.values_list('child_name', flat=True)), ['Child 2', 'Child 9']
+        )
+
+    def test_non_finite_numbers_are_row_errors(self):
+        rows = self.roster(vans=1, children_per_van=3)
+        rows[0][8] = 'NaN'
+        rows[1][9] = '1e400'
+
+        report = self.run_import(rows)
+
+        self.assertEqual([row for row, _ in report.errors], [2, 3])
+        self.assertIn('not a number', report.errors[0][1])
+        self.assertEqual(report.as_dict()["imported"], 1)
+        record = {'van_number': 'DPS-000', 'driver_phone': '+919876500000', 'parent_phone': '+919123400002',
+                  'child_name': 'Child 2'}
+        for capacity in ('inf', '1e400', 'nan'):
+            with self.assertRaisesMessage(ValueError, 'capacity'):
+                roster.parse_row(2, {**record, 'capacity': capacity})
+
+    def test_file_that_stops_being_utf8_is_reported(self):
+        # Enough rows to fill the first read, then a Latin-1 name
+        file = self.sheet(self.roster(vans=1, children_per_van=200))
+        file = io.BytesIO(file.getvalue() + 'DPS-000,+919876500000,,+919123401999,,Zo\xeb,4\n'.encode('latin-1'))
+
+        report = roster.import_roster(roster.read_rows(file, 'roster.csv'))
+
+        self.assertIn('not valid UTF-8', report.errors[-1][1])
+        self.assertEqual(len(report.errors), 1)
+        self.assertGreater(report.rows, 0)
+        self.assertEqual(report.as_dict()["imported"], report.rows)
+        self.assertEqual(ChildVanAssignment.objects.count(), report.rows)
+
+        with self.assertRaisesMessage(roster.RosterError, 'not valid UTF-8'):
+            roster.read_rows(io.BytesIO('Van Number,Zo\xeb\n'.encode('latin-1')), 'roster.csv')
+
+    def test_missing_columns_and_dry_run(self):
+        with self.assertRaisesMessage(roster.RosterError, 'child_name'):
+            roster.read_rows(io.BytesIO(b'van_number,driver_phone,parent_phone\n'), 'roster.csv')
+
+        report = self.run_import(self.roster(vans=1, children_per_van=2), dry_run=True)
+
+        self.assertEqual(report.created["children"], 2)
+        self.assertFalse(User.objects.exists())
+        self.assertFalse(ChildVanAssignment.objects.exists())
+
+    @override_settings(ROSTER_IMPORT={"chunk_size": 2, "max_rows": 3})
+    def test_rows_past_the_limit_are_skipped(self):
+        report = self.run_import(self.roster(vans=1, children_per_van=5))
+
+        self.assertEqual(report.rows, 3)
+        self.assertEqual(report.errors[0][0], 5)
+        self.assertEqual(ChildVanAssignment.objects.count(), 3)
+
+    def test_import_drops_the_cached_missing_number(self):
+        self.assertIsNone(lookup_phone('+919123400000'))
+
+        self.run_import(self.roster(vans=1, children_per_van=1))
+
+        self.assertEqual(lookup_phone('+919123400000')['user_type'], 'parent')
+
+    def test_endpoint_is_staff_only(self):
+        rows = self.roster(vans=1, children_per_van=2)
+        upload = lambda: SimpleUploadedFile('roster.csv', self.sheet(rows).getvalue(), content_type='text/csv')
+        driver = self.make_driver('+919876543210')
+        response = self.authenticate(driver).post('/api/locations/roster/import/', {'file': upload()})
+        self.assertEqual(response.status_code, 403)
+
+        client = self.authenticate(User.objects.create(phone_number='+919876543219', user_type='parent',
+                                                       is_staff=True))
+        self.assertEqual(client.post('/api/locations/roster/import/', {}).status_code, 400)
+        response = client.post('/api/locations/roster/import/', {
+            'file': upload(), 'school_id': self.school.pk, 'dry_run': 'true'
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data["dry_run"], response.data["imported"]), (True, 2))
+        self.assertFalse(ChildVanAssignment.objects.exists())
+
+        response = client.post('/api/locations/roster/import/', {'file': upload(), 'school_id': self.school.pk})
+        self.assertEqual(response.data["created"]["children"], 2)
+        self.assertEqual(ChildVanAssignment.objects.filter(school=self.school).count(), 2)
+
+    def test_command(self):
+        path = self.enterContext(tempfile.TemporaryDirectory()) + '/roster.csv'
+        with open(path, 'wb') as file:
+            file.write(self.sheet(self.roster(vans=1, children_per_van=2)).getvalue())
+        out = StringIO()
+
+        call_command('import_roster', path, '--school', 'dps', stdout=out)
+
+        self.assertIn('2 of 2 rows imported', out.getvalue())
+        self.assertEqual(VanAssignment.objects.get().school, self.school)
+
+
+@override_settings(TIME_ZONE='UTC')
+class LocationExportTests(LocationTestMixin, TestCase):
+    def setUp(self):
+        self.school = School.objects.create(name='Delhi Public School', slug='dps')
+        self.driver = self.make_driver('+919876543210', school=self.school)
+        self.other = self.make_driver('+919876543212')
+        self.van = self.make_van(self.driver, 'DPS-001', school=self.school)
+        self.make_van(self.other, 'KV-002')
+        day = datetime.datetime(2026, 10, 18, 7, 0, tzinfo=datetime.timezone.utc)
+        for driver in (self.driver, self.other):
+            for i in range(5):
+                self.make_location(
+                    driver, 28.6 + i / 1000, 77.2, speed=30, timestamp=day + datetime.timedelta(minutes=i)
+                )
+        # The next day, outside a one-day export
+        self.make_location(self.driver, 28.7, 77.3, timestamp=day + datetime.timedelta(days=1))
+        staff = User.objects.create(phone_number='+919876543299', user_type='parent', is_staff=True)
+        self.client = self.authenticate(staff)
+
+    def read(self, response):
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_streams_a_van_in_chunks(self):
+        with self.settings(LOCATION_EXPORT={"max_days": 31, "chunk_size": 2}):
+            response = self.client.get(
+                '/api/locations/export/locations.csv', {'from': '2026-10-18', 'van_id': self.van.pk}
+            )
+            pieces = list(response.streaming_content)
+
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn('locations-2026-10-18-2026-10-18.csv', response['Content-Disposition'])
+        # Header, then three chunks of at most two points
+        self.assertEqual(len(pieces), 4)
+        rows = list(csv.DictReader(io.StringIO(b''.join(pieces).decode())))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual({row['van_number'] for row in rows}, {'DPS-001'})
+        self.assertEqual([row['latitude'] for row in rows], ['28.6', '28.601', '28.602', '28.603', '28.604'])
+        self.assertEqual(rows[0]['timestamp'], '2026-10-18T07:00:00+00:00')
+
+    def test_geojson_filters_by_school_and_range(self):
+        response = self.client.get('/api/locations/export/locations.geojson', {
+            'from': '2026-10-18', 'to': '2026-10-19', 'school_id': self.school.pk
+        })
+
+        self.assertEqual(response['Content-Type'], 'application/geo+json')
+        collection = json.loads(self.read(response))
+        features = collection['features']
+        self.assertEqual(len(features), 6)
+        self.assertEqual({feature['properties']['driver_id'] for feature in features}, {self.driver.pk})
+        self.assertEqual(features[-1]['geometry']['coordinates'], [77.3, 28.7])
+        self.assertEqual(features[0]['properties']['van_number'], 'DPS-001')
+        self.assertEqual(features[0]['properties']['timestamp'], '2026-10-18T07:00:00+00:00')
+
+        empty = self.client.get('/api/locations/export/locations.geojson', {'from': '2026-09-01'})
+        self.assertEqual(json.loads(self.read(empty)), {'type': 'FeatureCollection', 'features': []})
+
+    def test_geojson_without_orjson(self):
+        params = {'from': '2026-10-18', 'van_id': self.van.pk}
+        fast = self.read(self.client.get('/api/locations/export/locations.geojson', params))
+        self.addCleanup(setattr, renderers, 'orjson', renderers.orjson)
+        renderers.orjson = None
+
+        self.assertEqual(json.loads(self.read(self.client.get('/api/locations/export/locations.geojson', params))),
+                         json.loads(fast))
+
+    def test_everyone_in_constant_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            text = self.read(self.client.get('/api/locations/export/locations.csv', {'from': '2026-10-18'}))
+
+        self.assertEqual(len(text.splitlines()), 11)
+        self.assertLess(len(queries), 8)
+
+    def test_validation_and_staff_only(self):
+        url = '/api/locations/export/locations.csv'
+        self.assertEqual(self.client.get(url).status_code, 400)
+        self.assertEqual(self.client.get(url, {'from': '2026-10-18', 'to': '2026-10-01'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'from': '2026-01-01', 'to': '2026-03-01'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'from': '2026-10-18', 'van_id': 999}).status_code, 404)
+        self.assertEqual(
+            self.client.get('/api/locations/export/locations.xml', {'from': '2026-10-18'}).status_code, 404
+        )
+        driver = self.authenticate(self.driver)
+        self.assertEqual(driver.get(url, {'from': '2026-10-18'}).status_code, 403)
@@ -0,0 +1,136 @@
+"""
+Server-driven tracking policy for the driver app.
+
+The app asks how often to upload and how far the van must move between
+points. The answer depends on whether tracking is on, whether the van is
+inside its pickup/drop-off schedule, how fast it is going and how close it is
+to one of its children's stops. Parked and off-shift vans report rarely; vans
+approaching a stop report at the highest resolution.
+
+Thresholds live in ``settings.TRACKING_POLICY``.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .geo import haversine_m
+from .models import ChildVanAssignment, DriverTrackingState
+
+DISABLED = "disabled"
+OFF_SHIFT = "off_shift"
+PARKED = "parked"
+APPROACHING_STOP = "approaching_stop"
+MOVING = "moving"
+
+
+def _schedule_cache_key(driver_id):
+    return f"tracking:schedule:{driver_id}"
+
+
+def _enabled_cache_key(driver_id):
+    return f"tracking:enabled:{driver_id}"
+
+
+def invalidate_schedule(driver_id):
+    cache.delete(_schedule_cache_key(driver_id))
+
+
+def get_schedule(driver_id):
+    """Stops and pickup/drop-off times of the children on the driver's active vans"""
+    def load():
+        rows = ChildVanAssignment.objects.filter(
+            van_assignment__driver_id=driver_id,
+            van_assignment__is_active=True,
+            is_active=True
+        ).values_list('stop_latitude', 'stop_longitude', 'pickup_time', 'dropoff_time')
+        schedule = {"stops": [], "pickup_times": [], "dropoff_times": []}
+        for latitude, longitude, pickup_time, dropoff_time in rows:
+            if latitude is not None and longitude is not None:
+                schedule["stops"].append((float(latitude), float(longitude)))
+            if pickup_time:
+                schedule["pickup_times"].append(pickup_time)
+            if dropoff_time:
+                schedule["dropoff_times"].append(dropoff_time)
+        return schedule
+    return cache.get_or_set(_schedule_cache_key(driver_id), load, settings.TRACKING_SCHEDULE_CACHE_SECONDS)
+
+
+def is_tracking_enabled(driver_id):
+    enabled = cache.get(_enabled_cache_key(driver_id))
+    if enabled is None:
+        enabled = not DriverTrackingState.objects.filter(driver_id=driver_id, is_enabled=False).exists()
+        cache.set(_enabled_cache_key(driver_id), enabled, settings.TRACKING_SCHEDULE_CACHE_SECONDS)
+    return enabled
+
+
+def set_tracking_enabled(driver, is_enabled):
+    DriverTrackingState.objects.update_or_create(driver=driver, defaults={"is_enabled": is_enabled})
+    cache.set(_enabled_cache_key(driver.pk), is_enabled, settings.TRACKING_SCHEDULE_CACHE_SECONDS)
+
+
+def _minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def is_on_shift(schedule, now):
+    """True inside the pickup or drop-off window, or when no schedule is known"""
+    policy = settings.TRACKING_POLICY
+    if not schedule["pickup_times"] and not schedule["dropoff_times"]:
+        return True
+
+    current = _minutes(now)
+    for times in (schedule["pickup_times"], schedule["dropoff_times"]):
+        if not times:
+            continue
+        start = min(_minutes(t) for t in times) - policy["shift_lead_minutes"]
+        end = max(_minutes(t) for t in times) + policy["shift_tail_minutes"]
+        if start <= current <= end:
+            return True
+    return False
+
+
+def nearest_stop_distance(schedule, latitude, longitude):
+    if latitude is None or longitude is None or not schedule["stops"]:
+        return None
+    return min(haversine_m(latitude, longitude, lat, lon) for lat, lon in schedule["stops"])
+
+
+def get_tracking_policy(driver_id, latitude=None, longitude=None, speed=None, now=None):
+    """
+    Return the upload policy for a driver at the given position and speed
+    (km/h), as sent to the app.
+    """
+    policy = settings.TRACKING_POLICY
+
+    if not is_tracking_enabled(driver_id):
+        mode = DISABLED
+    else:
+        now = timezone.localtime(now or timezone.now())
+        schedule = get_schedule(driver_id)
+        stop_distance = nearest_stop_distance(schedule, latitude, longitude)
+
+        if not is_on_shift(schedule, now):
+            mode = OFF_SHIFT
+        elif stop_distance is not None and stop_distance <= policy["approach_radius_meters"]:
+            mode = APPROACHING_STOP
+        elif speed is not None and float(speed) < policy["parked_speed_kmh"]:
+            mode = PARKED
+        else:
+            mode = MOVING
+
+    settings_for_mode = policy["modes"][mode]
+    interval = settings_for_mode["interval_seconds"]
+    if mode == MOVING and speed:
+        # Keep roughly the same spacing between points whatever the speed
+        speed_mps = float(speed) / 3.6
+        interval = max(
+            policy["min_interval_seconds"],
+            min(interval, round(policy["moving_point_spacing_meters"] / speed_mps))
+        )
+
+    return {
+        "tracking_enabled": mode != DISABLED,
+        "mode": mode,
+        "interval_seconds": interval,
+        "distance_filter_meters": settings_for_mode["distance_filter_meters"],
+    }
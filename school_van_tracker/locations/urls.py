@@ -3,8 +3,16 @@ from . import views
 
 urlpatterns = [
     path('update-location/', views.update_location, name='update_location'),
+    path('update-location/batch/', views.update_location_batch, name='update_location_batch'),
     path('driver-location/', views.get_driver_location, name='get_driver_location'),
     path('van-location/', views.get_van_location, name='get_van_location'),
     path('location-history/', views.get_location_history, name='get_location_history'),
     path('toggle-gps/', views.toggle_gps_tracking, name='toggle_gps_tracking'),
+    path('tracking-policy/', views.get_tracking_policy_view, name='get_tracking_policy'),
+    path('routes/optimize/', views.optimize_route, name='optimize_route'),
+    path('heatmap/', views.get_heatmap_view, name='get_heatmap'),
+    path('playback/', views.get_trip_playback, name='get_trip_playback'),
+    path('reports/daily/', views.get_daily_report, name='get_daily_report'),
+    path('export/locations.<str:export_format>', views.export_locations, name='export_locations'),
+    path('roster/import/', views.import_roster_view, name='import_roster'),
 ]
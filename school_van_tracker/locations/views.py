@@ -1,18 +1,42 @@
+import datetime
 import logging
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.decorators import api_view, parser_classes, permission_classes, renderer_classes
+from rest_framework.exceptions import ParseError
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.settings import api_settings
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.db.models import Q
-from .models import Location, VanAssignment, ChildVanAssignment
-from .serializers import LocationSerializer, VanAssignmentSerializer, ChildVanAssignmentSerializer
+from accounts.models import School, User
+from school_van_tracker.tenancy import tenant_querysets, use_school
+from .models import Location, VanAssignment, ChildVanAssignment, DailyDriverStats
+from .serializers import (
+    LocationSerializer, VanAssignmentSerializer, ChildVanAssignmentSerializer, DailyDriverStatsSerializer
+)
+from .export import CONTENT_TYPES, export_points, stream_export, van_numbers
+from .heartbeat import record_heartbeat
+from .heatmap import get_heatmap
+from .ingest import ingest_points
+from .playback import trip_path
+from .roster import RosterError, import_roster, read_rows
+from .route_optimizer import apply_stop_order, load_van_stops, optimize_stops, serialize_result
+from .tracking import get_tracking_policy, set_tracking_enabled
+from .wire import PointsParser, PointsRenderer
+
+# JSON by default; the compact points format when the client asks for it
+POINTS_PARSERS = [*api_settings.DEFAULT_PARSER_CLASSES, PointsParser]
+POINTS_RENDERERS = [*api_settings.DEFAULT_RENDERER_CLASSES, PointsRenderer]
 
 logger = logging.getLogger(__name__)
 
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@parser_classes(POINTS_PARSERS)
 def update_location(request):
     """Update driver's current location"""
     try:
@@ -24,6 +48,14 @@ def update_location(request):
             )
         
         data = request.data
+        if isinstance(data, dict) and isinstance(data.get('points'), list) and len(data['points']) == 1:
+            # One point sent in the points format
+            data = data['points'][0]
+        if not isinstance(data, dict):
+            return Response(
+                {"error": "Expected a single location object"}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
         latitude = data.get('latitude')
         longitude = data.get('longitude')
         
@@ -33,28 +65,36 @@ def update_location(request):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Deactivate previous active location
-        Location.objects.filter(driver=request.user, is_active=True).update(is_active=False)
+        try:
+            result = ingest_points(request.user.pk, [data], request.user.school_id)
+        except (ValueError, TypeError, AttributeError) as e:
+            return Response(
+                {"error": str(e)}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        # Create new location
-        location = Location.objects.create(
-            driver=request.user,
-            latitude=latitude,
-            longitude=longitude,
-            accuracy=data.get('accuracy'),
-            speed=data.get('speed'),
-            heading=data.get('heading'),
-            altitude=data.get('altitude'),
-            is_active=True
-        )
+        location = result.locations[0]
+        created = location.pk in result.created
+        if created:
+            logger.info(f"📍 Location updated for driver {request.user.phone_number}: {latitude}, {longitude}")
+        if result.alerts:
+            logger.info(f"🔔 Sent {len(result.alerts)} proximity alerts for driver {request.user.phone_number}")
         
-        logger.info(f"📍 Location updated for driver {request.user.phone_number}: {latitude}, {longitude}")
+        policy = get_tracking_policy(request.user.pk, latitude=latitude, longitude=longitude, speed=location.speed)
+        record_heartbeat(request.user.pk, policy["interval_seconds"])
         
         return Response({
-            "message": "Location updated successfully",
-            "location": LocationSerializer(location).data
-        }, status=status.HTTP_201_CREATED)
+            "message": "Location updated successfully" if created else "Location already received",
+            "location": LocationSerializer(location).data,
+            "duplicate": not created,
+            "policy": policy
+        }, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
         
+    except ParseError as e:
+        return Response(
+            {"error": str(e.detail)}, 
+            status=status.HTTP_400_BAD_REQUEST
+        )
     except Exception as e:
         logger.error(f"❌ Error updating location: {str(e)}")
         return Response(
@@ -63,8 +103,73 @@ def update_location(request):
         )
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@parser_classes(POINTS_PARSERS)
+def update_location_batch(request):
+    """Upload points buffered on the device, oldest or newest first"""
+    try:
+        if request.user.user_type != 'driver':
+            return Response(
+                {"error": "Only drivers can update location"}, 
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        points = request.data.get('points') if isinstance(request.data, dict) else None
+        if not isinstance(points, list) or not points:
+            return Response(
+                {"error": "points must be a non-empty list"}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(points) > settings.LOCATION_BATCH_MAX_POINTS:
+            return Response(
+                {"error": f"At most {settings.LOCATION_BATCH_MAX_POINTS} points per batch"}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            result = ingest_points(request.user.pk, points, request.user.school_id)
+        except (ValueError, TypeError, AttributeError) as e:
+            return Response(
+                {"error": f"Invalid point: {str(e)}"}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        logger.info(
+            f"📍 Stored {len(result.created)} of {len(points)} buffered points for driver {request.user.phone_number}"
+        )
+        
+        latest = result.current or max(result.locations, key=lambda location: location.timestamp)
+        policy = get_tracking_policy(
+            request.user.pk, latitude=latest.latitude, longitude=latest.longitude, speed=latest.speed
+        )
+        record_heartbeat(request.user.pk, policy["interval_seconds"])
+        
+        return Response({
+            "message": "Locations received",
+            "received": len(points),
+            "created": len(result.created),
+            "duplicates": len(points) - len(result.created),
+            "location": LocationSerializer(result.current).data if result.current else None,
+            "policy": policy
+        }, status=status.HTTP_201_CREATED if result.created else status.HTTP_200_OK)
+        
+    except ParseError as e:
+        return Response(
+            {"error": str(e.detail)}, 
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    except Exception as e:
+        logger.error(f"❌ Error storing buffered locations: {str(e)}")
+        return Response(
+            {"error": "Failed to store locations"}, 
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@renderer_classes(POINTS_RENDERERS)
 def get_driver_location(request):
     """Get driver's current location (for driver)"""
     try:
@@ -100,7 +205,14 @@ def get_driver_location(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_van_location(request):
-    """Get van location for parents (their child's assigned van)"""
+    """
+    Get van locations for parents: every active van carrying one of their
+    children, with its current location and the children on it.
+    
+    Two queries however many children or vans are involved: one join for the
+    assignments, vans and drivers, one bulk lookup of the drivers' current
+    locations (one per school database when the drivers are spread out).
+    """
     try:
         if request.user.user_type != 'parent':
             return Response(
@@ -108,37 +220,58 @@ def get_van_location(request):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        # Get parent's child assignments
-        child_assignments = ChildVanAssignment.objects.filter(
+        # Get parent's child assignments together with their vans and drivers
+        child_assignments = list(ChildVanAssignment.objects.filter(
             parent=request.user,
-            is_active=True
-        ).select_related('van_assignment__driver')
+            is_active=True,
+            van_assignment__is_active=True
+        ).select_related('van_assignment__driver'))
         
-        if not child_assignments.exists():
+        if not child_assignments:
             return Response(
                 {"error": "No van assignments found for your children"}, 
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        # Get the van assignment (assuming one van per parent for simplicity)
-        van_assignment = child_assignments.first().van_assignment
+        # Group children by van, keeping the order they came back in
+        vans = {}
+        for child in child_assignments:
+            vans.setdefault(child.van_assignment_id, (child.van_assignment, []))[1].append(child)
         
-        # Get driver's current location
-        location = Location.objects.filter(
-            driver=van_assignment.driver,
-            is_active=True
-        ).first()
+        # Current location of every driver in one query per school database
+        schools = {}
+        for van, _ in vans.values():
+            schools.setdefault(van.driver.school_id, {})[van.driver_id] = van.driver
+        locations = {}
+        for school_id, drivers in schools.items():
+            with use_school(school_id):
+                for location in Location.objects.filter(driver_id__in=drivers, is_active=True):
+                    location.driver = drivers[location.driver_id]
+                    locations.setdefault(location.driver_id, location)
         
-        if not location:
+        if not locations:
             return Response(
                 {"error": "Van location not available"}, 
                 status=status.HTTP_404_NOT_FOUND
             )
         
+        van_data = []
+        for van_assignment, children in vans.values():
+            location = locations.get(van_assignment.driver_id)
+            van_data.append({
+                "van_assignment": VanAssignmentSerializer(van_assignment).data,
+                "location": LocationSerializer(location).data if location else None,
+                "children": ChildVanAssignmentSerializer(children, many=True).data
+            })
+        
+        # Top-level fields keep the single-van shape for older clients: the
+        # first van with a known location, plus all of the parent's children
+        primary = next(van for van in van_data if van["location"])
         return Response({
-            "van_assignment": VanAssignmentSerializer(van_assignment).data,
-            "location": LocationSerializer(location).data,
-            "children": ChildVanAssignmentSerializer(child_assignments, many=True).data
+            "vans": van_data,
+            "van_assignment": primary["van_assignment"],
+            "location": primary["location"],
+            "children": [child for van in van_data for child in van["children"]]
         })
         
     except Exception as e:
@@ -151,6 +284,7 @@ def get_van_location(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@renderer_classes(POINTS_RENDERERS)
 def get_location_history(request):
     """Get location history for driver"""
     try:
@@ -189,14 +323,16 @@ def toggle_gps_tracking(request):
             )
         
         is_enabled = request.data.get('enabled', False)
+        if isinstance(is_enabled, str):
+            is_enabled = is_enabled.lower() in ('true', '1', 'yes')
+        is_enabled = bool(is_enabled)
         
-        # Update driver's GPS tracking preference
-        # You might want to add a field to User model for this
-        # For now, we'll use the location update frequency as a proxy
+        set_tracking_enabled(request.user, is_enabled)
         
         return Response({
             "message": f"GPS tracking {'enabled' if is_enabled else 'disabled'}",
-            "enabled": is_enabled
+            "enabled": is_enabled,
+            "policy": get_tracking_policy(request.user.pk)
         })
         
     except Exception as e:
@@ -205,3 +341,416 @@ def toggle_gps_tracking(request):
             {"error": "Failed to toggle GPS tracking"}, 
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_tracking_policy_view(request):
+    """Get the GPS upload policy for the driver's current situation"""
+    try:
+        if request.user.user_type != 'driver':
+            return Response(
+                {"error": "Only drivers can access this endpoint"}, 
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        location = Location.objects.filter(
+            driver=request.user, 
+            is_active=True
+        ).only('latitude', 'longitude', 'speed').first()
+        
+        if location:
+            policy = get_tracking_policy(
+                request.user.pk,
+                latitude=location.latitude,
+                longitude=location.longitude,
+                speed=location.speed
+            )
+        else:
+            policy = get_tracking_policy(request.user.pk)
+        
+        return Response({"policy": policy})
+        
+    except Exception as e:
+        logger.error(f"❌ Error getting tracking policy: {str(e)}")
+        return Response(
+            {"error": "Failed to get tracking policy"}, 
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def optimize_route(request):
+    """Compute (and optionally save) the pickup order for a van. Staff only."""
+    try:
+        van_id = request.data.get('van_id')
+        if not van_id:
+            return Response(
+                {"error": "van_id is required"}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        van_assignment = VanAssignment.objects.select_related('route').filter(pk=van_id).first()
+        if van_assignment is None:
+            return Response(
+                {"error": "Van assignment not found"}, 
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        end = request.data.get('end')
+        if end is not None:
+            try:
+                end = (float(end[0]), float(end[1]))
+            except (TypeError, ValueError, IndexError):
+                return Response(
+                    {"error": "end must be [latitude, longitude]"}, 
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        
+        result = optimize_stops(load_van_stops(van_assignment), capacity=van_assignment.capacity, end=end)
+        
+        apply = request.data.get('apply', False)
+        if isinstance(apply, str):
+            apply = apply.lower() in ('true', '1', 'yes')
+        if apply and result.stops:
+            route = apply_stop_order(van_assignment, result)
+            logger.info(f"🗺️ Saved optimised stop order for van {van_assignment.van_number} (route {route.pk})")
+        
+        return Response({
+            "van_assignment_id": van_assignment.pk,
+            "capacity": van_assignment.capacity,
+            "applied": bool(apply and result.stops),
+            **serialize_result(result)
+        })
+        
+    except Exception as e:
+        logger.error(f"❌ Error optimising route: {str(e)}")
+        return Response(
+            {"error": "Failed to optimise route"}, 
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def get_daily_report(request):
+    """
+    Per-driver totals for a day (or a range) from the rollups, for every
+    school or one school_id. Staff only.
+    """
+    try:
+        try:
+            start = datetime.date.fromisoformat(request.query_params.get('date') or request.query_params.get('from'))
+        except (TypeError, ValueError):
+            start = timezone.localdate()
+        try:
+            end = datetime.date.fromisoformat(request.query_params.get('to'))
+        except (TypeError, ValueError):
+            end = start
+        
+        try:
+            school_id = int(request.query_params['school_id']) if request.query_params.get('school_id') else None
+        except ValueError:
+            return Response({"error": "Invalid school_id"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Drivers and vans live on default, so they are fetched separately
+        # rather than joined on a school's own database
+        stats = DailyDriverStats.objects.filter(
+            date__gte=start,
+            date__lte=end
+        ).prefetch_related('driver', 'van_assignment').order_by('date', 'driver_id')
+        
+        driver_id = request.query_params.get('driver_id')
+        if driver_id:
+            stats = stats.filter(driver_id=driver_id)
+        if school_id:
+            stats = stats.filter(driver_id__in=list(
+                User.objects.filter(school_id=school_id).values_list('pk', flat=True)
+            ))
+        
+        days = sorted(
+            (day for queryset in tenant_querysets(stats, school_id) for day in queryset),
+            key=lambda day: (day.date, day.driver_id)
+        )
+        return Response({
+            "from": start,
+            "to": end,
+            "days": DailyDriverStatsSerializer(days, many=True).data
+        })
+        
+    except Exception as e:
+        logger.error(f"❌ Error getting daily report: {str(e)}")
+        return Response(
+            {"error": "Failed to get daily report"}, 
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def get_heatmap_view(request):
+    """
+    Point counts and speeds per grid cell over a time window. Staff only.
+    Query params: from, to (ISO datetimes, default the last 24 hours),
+    cell_size (meters), bbox (south,west,north,east), driver_id, min_points,
+    school_id.
+    """
+    try:
+        options = settings.HEATMAP
+        params = request.query_params
+        now = timezone.now()
+        try:
+            end = parse_datetime(params['to']) if params.get('to') else now
+            start = parse_datetime(params['from']) if params.get('from') else end - datetime.timedelta(days=1)
+            cell_size = int(params.get('cell_size') or options["default_cell_size_meters"])
+            min_points = int(params.get('min_points') or 1)
+            bbox = tuple(float(value) for value in params['bbox'].split(',')) if params.get('bbox') else None
+            school_id = int(params['school_id']) if params.get('school_id') else None
+        except (TypeError, ValueError):
+            return Response(
+                {"error": "Invalid from, to, cell_size, min_points, bbox or school_id"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if start is None or end is None:
+            return Response({"error": "Invalid from or to"}, status=status.HTTP_400_BAD_REQUEST)
+        if timezone.is_naive(start):
+            start = timezone.make_aware(start)
+        if timezone.is_naive(end):
+            end = timezone.make_aware(end)
+        
+        if cell_size not in options["cell_sizes_meters"]:
+            return Response(
+                {"error": f"cell_size must be one of {options['cell_sizes_meters']}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if bbox is not None and len(bbox) != 4:
+            return Response({"error": "bbox must be south,west,north,east"}, status=status.HTTP_400_BAD_REQUEST)
+        if end <= start:
+            return Response({"error": "to must be after from"}, status=status.HTTP_400_BAD_REQUEST)
+        if end - start > datetime.timedelta(days=options["max_window_days"]):
+            return Response(
+                {"error": f"Window can be at most {options['max_window_days']} days"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        return Response(get_heatmap(
+            start,
+            end,
+            cell_size,
+            bbox=bbox,
+            driver_id=params.get('driver_id') or None,
+            min_points=max(min_points, 1),
+            school_id=school_id
+        ))
+        
+    except Exception as e:
+        logger.error(f"❌ Error getting heatmap: {str(e)}")
+        return Response(
+            {"error": "Failed to get heatmap"}, 
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+@renderer_classes(POINTS_RENDERERS)
+def get_trip_playback(request):
+    """
+    A driver's path over a time window for replaying a trip, downsampled to
+    at most max_points with stops kept. Staff only.
+    Query params: driver_id or van_id, from, to (ISO datetimes, to defaults
+    to now), max_points.
+    """
+    try:
+        options = settings.PLAYBACK
+        params = request.query_params
+        
+        try:
+            driver_id = int(params['driver_id']) if params.get('driver_id') else None
+            van_id = int(params['van_id']) if params.get('van_id') else None
+            start = parse_datetime(params.get('from') or '')
+            end = parse_datetime(params['to']) if params.get('to') else timezone.now()
+            max_points = int(params.get('max_points') or options["default_points"])
+        except (TypeError, ValueError):
+            return Response(
+                {"error": "Invalid driver_id, van_id, from, to or max_points"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        van = None
+        if van_id:
+            van = VanAssignment.objects.filter(pk=van_id).select_related('driver').first()
+            if not van:
+                return Response({"error": "Van not found"}, status=status.HTTP_404_NOT_FOUND)
+            driver_id = van.driver_id
+            school_id = van.driver.school_id
+        elif driver_id:
+            school_id = User.objects.filter(pk=driver_id).values_list('school_id', flat=True).first()
+        else:
+            return Response({"error": "driver_id or van_id is required"}, status=status.HTTP_400_BAD_REQUEST)
+        if start is None or end is None:
+            return Response({"error": "from and to must be ISO datetimes"}, status=status.HTTP_400_BAD_REQUEST)
+        if timezone.is_naive(start):
+            start = timezone.make_aware(start)
+        if timezone.is_naive(end):
+            end = timezone.make_aware(end)
+        if end <= start:
+            return Response({"error": "to must be after from"}, status=status.HTTP_400_BAD_REQUEST)
+        if end - start > datetime.timedelta(hours=options["max_window_hours"]):
+            return Response(
+                {"error": f"Window can be at most {options['max_window_hours']} hours"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        max_points = min(max(max_points, 3), options["max_points"])
+        
+        # The driver's points are on their school's database
+        with use_school(school_id):
+            raw_count, path, stops = trip_path(driver_id, start, end, max_points)
+        
+        return Response({
+            "driver_id": driver_id,
+            "van_number": van.van_number if van else None,
+            "from": start,
+            "to": end,
+            "raw_point_count": raw_count,
+            "points": [
+                {
+                    "timestamp": point.timestamp,
+                    "latitude": round(point.latitude, 6),
+                    "longitude": round(point.longitude, 6),
+                    "speed": point.speed,
+                    "dwell_seconds": point.dwell_seconds,
+                }
+                for point in path
+            ],
+            "stops": [stop._asdict() for stop in stops]
+        })
+        
+    except Exception as e:
+        logger.error(f"❌ Error getting trip playback: {str(e)}")
+        return Response(
+            {"error": "Failed to get trip playback"}, 
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def import_roster_view(request):
+    """
+    Import drivers, vans, parents and children from an uploaded CSV or XLSX
+    roster (multipart field ``file``), one row per child. Staff only.
+    Optional fields: school_id, dry_run.
+    """
+    try:
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"error": "file is required"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        school = None
+        if request.data.get('school_id'):
+            try:
+                school = School.objects.filter(pk=int(request.data['school_id'])).first()
+            except ValueError:
+                school = None
+            if school is None:
+                return Response({"error": "Invalid school_id"}, status=status.HTTP_400_BAD_REQUEST)
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true', 'yes')
+        
+        try:
+            report = import_roster(read_rows(upload, upload.name), school=school, dry_run=dry_run)
+        except RosterError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        summary = report.as_dict()
+        logger.info(
+            f"📋 Roster {upload.name} imported by {request.user.pk}: "
+            f"{summary['imported']}/{summary['rows']} rows{' (dry run)' if dry_run else ''}"
+        )
+        return Response({"dry_run": dry_run, **summary})
+        
+    except Exception as e:
+        logger.error(f"❌ Error importing roster: {str(e)}")
+        return Response(
+            {"error": "Failed to import roster"}, 
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def export_locations(request, export_format):
+    """
+    Stream the recorded points over a range of days as CSV
+    (locations.csv) or GeoJSON (locations.geojson). Staff only.
+    Query params: from, to (ISO dates, both included, to defaults to from),
+    van_id or driver_id, school_id.
+    """
+    try:
+        if export_format not in CONTENT_TYPES:
+            return Response(
+                {"error": f"Format must be one of {', '.join(CONTENT_TYPES)}"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        options = settings.LOCATION_EXPORT
+        params = request.query_params
+        try:
+            first_day = datetime.date.fromisoformat(params['from'])
+            last_day = datetime.date.fromisoformat(params['to']) if params.get('to') else first_day
+            driver_id = int(params['driver_id']) if params.get('driver_id') else None
+            van_id = int(params['van_id']) if params.get('van_id') else None
+            school_id = int(params['school_id']) if params.get('school_id') else None
+        except (KeyError, TypeError, ValueError):
+            return Response(
+                {"error": "Invalid from, to, van_id, driver_id or school_id"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if last_day < first_day:
+            return Response({"error": "to must not be before from"}, status=status.HTTP_400_BAD_REQUEST)
+        if (last_day - first_day).days >= options["max_days"]:
+            return Response(
+                {"error": f"An export can cover at most {options['max_days']} days"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        driver_ids = None
+        if van_id:
+            van = VanAssignment.objects.filter(pk=van_id).select_related('driver').first()
+            if not van:
+                return Response({"error": "Van not found"}, status=status.HTTP_404_NOT_FOUND)
+            driver_ids = [van.driver_id]
+            school_id = school_id or van.driver.school_id
+        elif driver_id:
+            driver_ids = [driver_id]
+            school_id = school_id or User.objects.filter(pk=driver_id).values_list('school_id', flat=True).first()
+        elif school_id:
+            driver_ids = list(User.objects.filter(school_id=school_id).values_list('pk', flat=True))
+        
+        # Whole local days
+        start = timezone.make_aware(datetime.datetime.combine(first_day, datetime.time.min))
+        end = timezone.make_aware(datetime.datetime.combine(last_day + datetime.timedelta(days=1), datetime.time.min))
+        querysets = export_points(start, end, driver_ids=driver_ids, school_id=school_id)
+        vans = van_numbers(driver_ids)
+        if van_id:
+            vans[van.driver_id] = van.van_number
+        
+        logger.info(
+            f"📤 Location export by {request.user.pk}: {first_day} to {last_day}, "
+            f"van {van_id}, driver {driver_id}, school {school_id}, {export_format}"
+        )
+        response = StreamingHttpResponse(
+            stream_export(querysets, vans, export_format),
+            content_type=CONTENT_TYPES[export_format]
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="locations-{first_day}-{last_day}.{export_format}"'
+        )
+        return response
+        
+    except Exception as e:
+        logger.error(f"❌ Error exporting locations: {str(e)}")
+        return Response(
+            {"error": "Failed to export locations"}, 
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
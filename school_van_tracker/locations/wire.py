@@ -0,0 +1,317 @@
+"""
+Compact binary encoding of GPS point arrays (``application/vnd.kumfort.points``).
+
+JSON spends ~200 bytes a point on field names, decimal strings and ISO
+dates. This format stores points column by column, each value as a scaled
+integer delta from the one before it, zigzag-folded and written as a LEB128
+varint. Consecutive points differ by a few meters and seconds, so most
+values take one or two bytes and a point costs 10-15 bytes before gzip.
+
+Layout (every integer below is an unsigned varint)::
+
+    b"KP" version(1)  count  field_mask
+    for each field in FIELDS whose bit is set in field_mask:
+        has_nulls (0 or 1)
+        [null bitmap, ceil(count / 8) bytes, bit i set = point i present]
+        byte_length  payload
+
+A numeric payload holds the present values as zigzag varint deltas of
+``round(value * scale)``. The ``idempotency_key`` payload is front-coded:
+for each key, the length of the prefix it shares with the previous key, the
+length of the rest, then the rest as UTF-8.
+
+Times are Unix milliseconds, coordinates micro-degrees, and the rest tenths
+(seconds for dwell). Varint coding is vectorised with NumPy, so decoding a
+batch is a handful of array operations per column.
+
+JSON stays the default. Clients opt in with ``Content-Type`` on uploads and
+``Accept`` (or ``?format=points``) on reads, see ``PointsParser`` and
+``PointsRenderer``.
+"""
+import datetime
+from collections import namedtuple
+
+import numpy as np
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer
+
+from school_van_tracker.renderers import FastJSONRenderer
+
+MEDIA_TYPE = "application/vnd.kumfort.points"
+MAGIC = b"KP"
+VERSION = 1
+
+Field = namedtuple("Field", ["name", "scale"])
+
+# Order is part of the format: append new fields, never reorder
+FIELDS = [
+    Field("id", 1),
+    Field("timestamp", 1000),
+    Field("latitude", 10 ** 6),
+    Field("longitude", 10 ** 6),
+    Field("accuracy", 10),
+    Field("speed", 10),
+    Field("heading", 10),
+    Field("altitude", 10),
+    Field("dwell_seconds", 1),
+    Field("idempotency_key", None),
+]
+
+
+class WireFormatError(ValueError):
+    pass
+
+
+def encode_varints(values):
+    """Unsigned LEB128 encoding of a uint64 array"""
+    values = np.asarray(values, dtype=np.uint64)
+    if not len(values):
+        return b""
+    sizes = np.ones(len(values), dtype=np.int64)
+    rest = values >> np.uint64(7)
+    while rest.any():
+        sizes += rest > 0
+        rest >>= np.uint64(7)
+
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    out = np.empty(int(sizes.sum()), dtype=np.uint8)
+    for k in range(int(sizes.max())):
+        has_byte = sizes > k
+        chunk = (values[has_byte] >> np.uint64(7 * k)) & np.uint64(0x7F)
+        more = (sizes[has_byte] - 1 > k).astype(np.uint64) << np.uint64(7)
+        out[starts[has_byte] + k] = chunk | more
+    return out.tobytes()
+
+
+def decode_varints(data):
+    """uint64 array from back-to-back LEB128 varints"""
+    raw = np.frombuffer(data, dtype=np.uint8)
+    if not len(raw):
+        return np.empty(0, dtype=np.uint64)
+    ends = np.flatnonzero(raw < 0x80)
+    if not len(ends) or ends[-1] != len(raw) - 1:
+        raise WireFormatError("Truncated varint")
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    if (ends - starts).max() > 9:
+        raise WireFormatError("Varint too long")
+    shifts = (np.arange(len(raw)) - np.repeat(starts, ends - starts + 1)) * 7
+    parts = (raw & 0x7F).astype(np.uint64) << shifts.astype(np.uint64)
+    return np.bitwise_or.reduceat(parts, starts)
+
+
+def zigzag(values):
+    values = np.asarray(values, dtype=np.int64)
+    return ((values << 1) ^ (values >> 63)).view(np.uint64)
+
+
+def unzigzag(values):
+    values = np.asarray(values, dtype=np.uint64)
+    return ((values >> np.uint64(1)).view(np.int64)) ^ -(values & np.uint64(1)).view(np.int64)
+
+
+class _Reader:
+    def __init__(self, data):
+        self.data = memoryview(data)
+        self.offset = 0
+
+    def varint(self):
+        result, shift = 0, 0
+        while True:
+            if self.offset >= len(self.data):
+                raise WireFormatError("Unexpected end of data")
+            byte = self.data[self.offset]
+            self.offset += 1
+            result |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return result
+            shift += 7
+            if shift > 63:
+                raise WireFormatError("Varint too long")
+
+    def take(self, size):
+        if self.offset + size > len(self.data):
+            raise WireFormatError("Unexpected end of data")
+        chunk = self.data[self.offset:self.offset + size]
+        self.offset += size
+        return chunk
+
+
+def _varint(value):
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _to_millis(value):
+    if isinstance(value, str):
+        value = parse_datetime(value)
+        if value is None:
+            raise WireFormatError("Invalid timestamp")
+    if isinstance(value, datetime.datetime):
+        return round(value.timestamp() * 1000)
+    # Already Unix time, seconds or milliseconds like locations.ingest accepts
+    value = float(value)
+    return round(value if value > 1e11 else value * 1000)
+
+
+def _encode_keys(keys):
+    out = bytearray()
+    previous = b""
+    for key in keys:
+        key = str(key).encode()
+        shared = 0
+        limit = min(len(key), len(previous))
+        while shared < limit and key[shared] == previous[shared]:
+            shared += 1
+        out += _varint(shared) + _varint(len(key) - shared) + key[shared:]
+        previous = key
+    return bytes(out)
+
+
+def _decode_keys(data, count):
+    reader = _Reader(bytes(data))
+    keys = []
+    previous = b""
+    for _ in range(count):
+        shared, size = reader.varint(), reader.varint()
+        if shared > len(previous):
+            raise WireFormatError("Invalid key")
+        key = previous[:shared] + bytes(reader.take(size))
+        try:
+            keys.append(key.decode())
+        except UnicodeDecodeError:
+            raise WireFormatError("Invalid key")
+        previous = key
+    return keys
+
+
+def encode_points(points):
+    """Encode a list of point dicts (missing or None fields are allowed)"""
+    count = len(points)
+    mask = 0
+    columns = []
+    for bit, field in enumerate(FIELDS):
+        values = [point.get(field.name) for point in points]
+        present = [value is not None for value in values]
+        if not any(present):
+            continue
+        mask |= 1 << bit
+
+        values = [value for value in values if value is not None]
+        if field.scale is None:
+            payload = _encode_keys(values)
+        else:
+            if field.name == "timestamp":
+                scaled = np.array([_to_millis(value) for value in values], dtype=np.int64)
+            else:
+                scaled = np.rint(np.array(values, dtype=float) * field.scale).astype(np.int64)
+            payload = encode_varints(zigzag(np.diff(scaled, prepend=0)))
+
+        if all(present):
+            column = _varint(0)
+        else:
+            column = _varint(1) + np.packbits(present, bitorder="little").tobytes()
+        columns.append(column + _varint(len(payload)) + payload)
+
+    return MAGIC + bytes([VERSION]) + _varint(count) + _varint(mask) + b"".join(columns)
+
+
+def decode_points(data, max_points=None):
+    """
+    List of point dicts from ``encode_points`` output; absent fields are left
+    out. Payloads declaring more than ``max_points`` points are rejected
+    before anything is allocated for them.
+    """
+    reader = _Reader(data)
+    if bytes(reader.take(2)) != MAGIC:
+        raise WireFormatError("Not a points payload")
+    version = reader.take(1)[0]
+    if version != VERSION:
+        raise WireFormatError(f"Unsupported points version {version}")
+    count = reader.varint()
+    mask = reader.varint()
+    if mask >> len(FIELDS):
+        raise WireFormatError("Unknown fields")
+    if max_points is not None and count > max_points:
+        raise WireFormatError(f"At most {max_points} points per payload")
+    # Every point takes at least a bit of each column's null bitmap, or a
+    # byte of its payload
+    if count and not mask or count > 8 * (len(reader.data) - reader.offset):
+        raise WireFormatError(f"{count} points can't fit in the payload")
+
+    # Only the rows a column actually has a value for are built
+    points = {}
+    for bit, field in enumerate(FIELDS):
+        if not mask & (1 << bit):
+            continue
+        if reader.varint():
+            bitmap = np.frombuffer(reader.take((count + 7) // 8), dtype=np.uint8)
+            rows = np.flatnonzero(np.unpackbits(bitmap, count=count, bitorder="little"))
+        else:
+            rows = np.arange(count)
+        payload = reader.take(reader.varint())
+
+        if field.scale is None:
+            values = _decode_keys(payload, len(rows))
+        else:
+            scaled = np.cumsum(unzigzag(decode_varints(payload)))
+            if len(scaled) != len(rows):
+                raise WireFormatError(f"Expected {len(rows)} values for {field.name}")
+            if field.scale == 1:
+                values = scaled.tolist()
+            else:
+                values = (scaled / field.scale).tolist()
+        for row, value in zip(rows.tolist(), values):
+            points.setdefault(row, {})[field.name] = value
+    return [points[row] for row in sorted(points)]
+
+
+class PointsParser(BaseParser):
+    """
+    Uploads in the points format. Parses to ``{"points": [...]}`` with
+    ``recorded_at`` in Unix seconds, the shape the JSON batch upload has.
+    """
+    media_type = MEDIA_TYPE
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            points = decode_points(stream.read(), max_points=settings.LOCATION_BATCH_MAX_POINTS)
+        except WireFormatError as e:
+            raise ParseError(f"Invalid points payload: {e}")
+        for point in points:
+            if "timestamp" in point:
+                point["recorded_at"] = point.pop("timestamp")
+        return {"points": points}
+
+
+class PointsRenderer(BaseRenderer):
+    """
+    Renders the point list of a response (``locations``, ``points`` or a
+    single ``location``) in the points format. Anything else, such as an
+    error, is rendered as JSON with a JSON content type.
+    """
+    media_type = MEDIA_TYPE
+    format = "points"
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        points = None
+        if isinstance(data, dict):
+            if isinstance(data.get("locations"), list):
+                points = data["locations"]
+            elif isinstance(data.get("points"), list):
+                points = data["points"]
+            elif isinstance(data.get("location"), dict):
+                points = [data["location"]]
+        if points is None:
+            response = (renderer_context or {}).get("response")
+            if response is not None:
+                response["Content-Type"] = "application/json"
+            return FastJSONRenderer().render(data, renderer_context=renderer_context)
+        return encode_points(points)
@@ -1,3 +1,20 @@
 from django.contrib import admin
+from .models import Notification, PushDevice
 
-# Register your models here.
+
+@admin.register(PushDevice)
+class PushDeviceAdmin(admin.ModelAdmin):
+    list_display = ('user', 'platform', 'is_active', 'created_at', 'updated_at')
+    list_filter = ('platform', 'is_active')
+    search_fields = ('user__phone_number', 'token')
+    raw_id_fields = ('user',)
+
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ('recipient', 'kind', 'title', 'status', 'attempts', 'created_at', 'sent_at')
+    list_filter = ('status', 'kind', 'created_at')
+    search_fields = ('recipient__phone_number', 'title', 'dedupe_key')
+    raw_id_fields = ('recipient',)
+    readonly_fields = ('created_at', 'sent_at', 'last_error')
+    ordering = ('-created_at',)
@@ -0,0 +1,44 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from notifications.outbox import dispatch_pending
+
+
+class Command(BaseCommand):
+    help = "Deliver queued notifications to the push provider in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=settings.NOTIFICATION_DISPATCH_LIMIT,
+            help="Notifications claimed per round (default: NOTIFICATION_DISPATCH_LIMIT)",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep running, polling the outbox when it is empty",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=2,
+            help="Seconds to wait between polls of an empty outbox with --loop",
+        )
+
+    def handle(self, *args, **options):
+        totals = {}
+        while True:
+            counts = dispatch_pending(limit=options["limit"])
+            for outcome, count in counts.items():
+                totals[outcome] = totals.get(outcome, 0) + count
+            if any(counts.values()):
+                continue
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
+
+        summary = ", ".join(f"{count} {outcome}" for outcome, count in totals.items())
+        self.stdout.write(self.style.SUCCESS(f"Notifications: {summary}"))
@@ -1,3 +1,83 @@
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 
-# Create your models here.
+
+class PushDevice(models.Model):
+    """A push token registered by the mobile app"""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='push_devices'
+    )
+    token = models.CharField(max_length=255, unique=True)
+    platform = models.CharField(max_length=20, blank=True)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'is_active']),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.platform or 'device'}"
+
+
+class Notification(models.Model):
+    """
+    One message for one recipient, queued in the outbox until the
+    ``send_notifications`` worker delivers it.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('coalesced', 'Replaced by a newer notification'),
+        ('failed', 'Failed'),
+        ('no_device', 'No device'),
+    ]
+
+    KIND_CHOICES = [
+        ('van_approaching', 'Van approaching'),
+        ('arrived_at_school', 'Arrived at school'),
+        ('general', 'General'),
+    ]
+
+    recipient = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='notifications'
+    )
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES, default='general')
+    title = models.CharField(max_length=200)
+    body = models.TextField()
+    data = models.JSONField(default=dict, blank=True)
+    # The same event is only ever queued once per recipient
+    dedupe_key = models.CharField(max_length=200, blank=True)
+    # A newer pending message with the same key replaces the older one
+    coalesce_key = models.CharField(max_length=200, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+            models.Index(fields=['recipient', '-created_at']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipient', 'dedupe_key'],
+                condition=~models.Q(dedupe_key=''),
+                name='unique_notification_dedupe_key'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} for {self.recipient} ({self.status})"
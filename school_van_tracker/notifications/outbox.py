@@ -0,0 +1,171 @@
+"""
+Notification outbox.
+
+Producers call ``queue_notifications`` which only inserts rows, so a request
+that has to notify hundreds of parents costs a couple of queries. The
+``send_notifications`` worker calls ``dispatch_pending``, which claims due
+rows, expands them to the recipients' devices and sends them to the push
+provider in batches of up to ``PUSH_BATCH_SIZE`` messages.
+
+- Deduplication: a recipient never gets two notifications with the same
+  ``dedupe_key`` (enforced by a unique constraint).
+- Coalescing: a new notification replaces a still-pending one for the same
+  recipient and ``coalesce_key``, so a backlog doesn't deliver stale updates.
+- Retries: failed sends are retried with exponential backoff up to
+  ``NOTIFICATION_MAX_ATTEMPTS``. Claimed rows carry a lease so a crashed
+  worker's rows are picked up again.
+"""
+import logging
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Notification, PushDevice
+from .providers import DEVICE_NOT_REGISTERED, get_provider
+
+logger = logging.getLogger(__name__)
+
+
+def queue_notifications(recipient_ids, title, body, kind='general', data=None, dedupe_key='', coalesce_key=''):
+    """Queue one notification per recipient. Returns how many were queued."""
+    recipient_ids = list(dict.fromkeys(recipient_ids))
+    if not recipient_ids:
+        return 0
+
+    with transaction.atomic():
+        if dedupe_key:
+            already_queued = set(Notification.objects.filter(
+                recipient_id__in=recipient_ids,
+                dedupe_key=dedupe_key
+            ).values_list('recipient_id', flat=True))
+            recipient_ids = [pk for pk in recipient_ids if pk not in already_queued]
+
+        if coalesce_key and recipient_ids:
+            Notification.objects.filter(
+                recipient_id__in=recipient_ids,
+                coalesce_key=coalesce_key,
+                status='pending'
+            ).update(status='coalesced')
+
+        Notification.objects.bulk_create(
+            [
+                Notification(
+                    recipient_id=recipient_id,
+                    kind=kind,
+                    title=title,
+                    body=body,
+                    data=data or {},
+                    dedupe_key=dedupe_key,
+                    coalesce_key=coalesce_key,
+                )
+                for recipient_id in recipient_ids
+            ],
+            batch_size=500,
+            # A concurrent producer may have queued the same event meanwhile
+            ignore_conflicts=bool(dedupe_key),
+        )
+    return len(recipient_ids)
+
+
+def _claim(limit):
+    """Lease up to ``limit`` due notifications to this worker"""
+    now = timezone.now()
+    lease_until = now + timezone.timedelta(seconds=settings.NOTIFICATION_LEASE_SECONDS)
+    with transaction.atomic():
+        ids = list(
+            Notification.objects.select_for_update(skip_locked=True).filter(
+                Q(status='pending') | Q(status='sending'),
+                next_attempt_at__lte=now
+            ).order_by('next_attempt_at').values_list('pk', flat=True)[:limit]
+        )
+        Notification.objects.filter(pk__in=ids).update(status='sending', next_attempt_at=lease_until)
+    return list(Notification.objects.filter(pk__in=ids).order_by('pk'))
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def dispatch_pending(limit=None, provider=None):
+    """
+    Send one round of due notifications. Returns counts of the outcomes,
+    e.g. ``{"sent": 120, "retrying": 2, "failed": 0, "no_device": 3}``.
+    """
+    provider = provider or get_provider()
+    notifications = _claim(limit or settings.NOTIFICATION_DISPATCH_LIMIT)
+    counts = {"sent": 0, "retrying": 0, "failed": 0, "no_device": 0}
+    if not notifications:
+        return counts
+
+    tokens = defaultdict(list)
+    for user_id, token in PushDevice.objects.filter(
+        user_id__in={n.recipient_id for n in notifications},
+        is_active=True
+    ).values_list('user_id', 'token'):
+        tokens[user_id].append(token)
+
+    messages = []
+    for notification in notifications:
+        for token in tokens[notification.recipient_id]:
+            messages.append((notification.pk, {
+                "to": token,
+                "title": notification.title,
+                "body": notification.body,
+                "data": {**notification.data, "notification_id": notification.pk, "kind": notification.kind},
+            }))
+
+    delivered = set()
+    errors = defaultdict(list)
+    unregistered = set()
+    batch_size = min(settings.PUSH_BATCH_SIZE, provider.max_batch_size)
+    for batch in _chunks(messages, batch_size):
+        try:
+            tickets = provider.send_batch([message for _, message in batch])
+        except Exception as e:
+            logger.warning(f"⚠️ Push batch of {len(batch)} failed: {str(e)}")
+            for notification_id, _ in batch:
+                errors[notification_id].append(str(e))
+            continue
+
+        for (notification_id, message), ticket in zip(batch, tickets):
+            if ticket["status"] == "ok":
+                delivered.add(notification_id)
+            elif ticket.get("error") == DEVICE_NOT_REGISTERED:
+                unregistered.add(message["to"])
+            else:
+                errors[notification_id].append(ticket.get("message") or ticket.get("error", "error"))
+
+    if unregistered:
+        PushDevice.objects.filter(token__in=unregistered).update(is_active=False)
+
+    now = timezone.now()
+    to_update = []
+    for notification in notifications:
+        if notification.pk in delivered:
+            notification.status = 'sent'
+            notification.sent_at = now
+            notification.attempts += 1
+        elif notification.pk in errors:
+            notification.attempts += 1
+            notification.last_error = "; ".join(errors[notification.pk])[:1000]
+            if notification.attempts >= settings.NOTIFICATION_MAX_ATTEMPTS:
+                notification.status = 'failed'
+            else:
+                notification.status = 'pending'
+                backoff = settings.NOTIFICATION_RETRY_BACKOFF * 2 ** (notification.attempts - 1)
+                notification.next_attempt_at = now + timezone.timedelta(seconds=backoff)
+        else:
+            # No active device, or every device was unregistered
+            notification.status = 'no_device'
+        counts["retrying" if notification.status == 'pending' else notification.status] += 1
+        to_update.append(notification)
+
+    Notification.objects.bulk_update(
+        to_update, ['status', 'sent_at', 'attempts', 'last_error', 'next_attempt_at'], batch_size=500
+    )
+    logger.info(f"🔔 Dispatched {len(notifications)} notifications in {len(messages)} push messages: {counts}")
+    return counts
@@ -0,0 +1,106 @@
+"""
+Push providers for the notification outbox.
+
+A provider takes a batch of messages and returns one ticket per message, in
+order. A ticket is ``{"status": "ok"}`` or ``{"status": "error", "error":
+"<code>", "message": "..."}``; the ``DeviceNotRegistered`` code makes the
+dispatcher deactivate the device. Raising means the whole batch failed and
+will be retried. The provider is chosen with ``PUSH_PROVIDER``.
+"""
+import json
+import logging
+import urllib.request
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+DEVICE_NOT_REGISTERED = "DeviceNotRegistered"
+
+# Batches "sent" through the locmem provider (tests)
+outbox = []
+
+
+class BasePushProvider:
+    """Interface every push provider implements"""
+
+    # Most messages the provider accepts in one request
+    max_batch_size = 100
+
+    def send_batch(self, messages):
+        """
+        Deliver ``messages`` (dicts with ``to``, ``title``, ``body`` and
+        ``data``). Returns a list of tickets, one per message.
+        """
+        raise NotImplementedError
+
+
+class ExpoPushProvider(BasePushProvider):
+    """Expo push service, which takes up to 100 messages per request"""
+
+    url = "https://exp.host/--/api/v2/push/send"
+
+    def __init__(self):
+        self.access_token = settings.EXPO_ACCESS_TOKEN
+        self.timeout = settings.PUSH_TIMEOUT_SECONDS
+
+    def send_batch(self, messages):
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps([{**message, "sound": "default"} for message in messages]).encode(),
+            headers={
+                "Accept": "application/json",
+                "Content-Type": "application/json",
+                **({"Authorization": f"Bearer {self.access_token}"} if self.access_token else {}),
+            },
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            payload = json.loads(response.read())
+
+        if payload.get("errors"):
+            raise RuntimeError(f"Expo rejected the batch: {payload['errors']}")
+        return [
+            {"status": "ok"} if ticket.get("status") == "ok" else {
+                "status": "error",
+                "error": ticket.get("details", {}).get("error", ""),
+                "message": ticket.get("message", ""),
+            }
+            for ticket in payload["data"]
+        ]
+
+
+class ConsoleProvider(BasePushProvider):
+    """Log messages instead of sending them (local development)"""
+
+    def send_batch(self, messages):
+        for message in messages:
+            logger.info(f"🔔 Push to {message['to']}: {message['title']} - {message['body']}")
+        return [{"status": "ok"} for _ in messages]
+
+
+class LocMemProvider(BasePushProvider):
+    """
+    Keep batches in ``notifications.providers.outbox`` (tests). Tokens listed
+    in ``unregistered`` get a DeviceNotRegistered ticket and ``fail_batches``
+    makes that many calls raise, to exercise the retry path.
+    """
+
+    unregistered = set()
+    fail_batches = 0
+
+    def send_batch(self, messages):
+        if LocMemProvider.fail_batches:
+            LocMemProvider.fail_batches -= 1
+            raise ConnectionError("push provider unavailable")
+        outbox.append(list(messages))
+        return [
+            {"status": "error", "error": DEVICE_NOT_REGISTERED, "message": "not registered"}
+            if message["to"] in self.unregistered else {"status": "ok"}
+            for message in messages
+        ]
+
+
+def get_provider():
+    return import_string(settings.PUSH_PROVIDER)()
@@ -0,0 +1,31 @@
+from django.dispatch import receiver
+
+from locations.alerts import proximity_alert
+
+from .outbox import queue_notifications
+
+
+@receiver(proximity_alert)
+def queue_proximity_notification(sender, alert, **kwargs):
+    children = " & ".join(alert.child_names)
+    if alert.eta_minutes is not None:
+        body = f"About {max(1, round(alert.eta_minutes))} min from {children}'s stop"
+    else:
+        body = f"{alert.distance_meters} m from {children}'s stop"
+
+    queue_notifications(
+        [alert.parent_id],
+        title=f"Van {alert.van_number} is nearly here",
+        body=body,
+        kind='van_approaching',
+        data={
+            "van_assignment_id": alert.van_assignment_id,
+            "child_assignment_ids": alert.child_assignment_ids,
+            "distance_meters": alert.distance_meters,
+            "eta_minutes": alert.eta_minutes,
+        },
+        dedupe_key=f"van_approaching:{alert.trip}:{alert.stop_latitude},{alert.stop_longitude}",
+        # Only the latest update about a van and stop is worth delivering;
+        # a parent's other stops on the same van keep their own alerts
+        coalesce_key=f"van:{alert.van_assignment_id}:stop:{alert.stop_latitude},{alert.stop_longitude}",
+    )
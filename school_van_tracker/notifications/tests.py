@@ -1,3 +1,168 @@
-from django.test import TestCase
+import datetime
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from locations import alerts
+from locations.models import ChildVanAssignment, VanAssignment
+from . import providers
+from .models import Notification, PushDevice
+from .outbox import dispatch_pending, queue_notifications
+
+
+@override_settings(
+    PUSH_PROVIDER="notifications.providers.LocMemProvider",
+    NOTIFICATION_RETRY_BACKOFF=0,
+    NOTIFICATION_MAX_ATTEMPTS=3,
+)
+class OutboxTests(TestCase):
+    def setUp(self):
+        providers.outbox.clear()
+        providers.LocMemProvider.unregistered = set()
+        providers.LocMemProvider.fail_batches = 0
+        self.parents = [
+            User.objects.create(phone_number=f"+9198765{i:05d}", user_type="parent") for i in range(250)
+        ]
+        PushDevice.objects.bulk_create([
+            PushDevice(user=parent, token=f"ExponentPushToken[{parent.pk}]") for parent in self.parents
+        ])
+
+    def test_fan_out_in_batches_of_100(self):
+        with CaptureQueriesContext(connection) as queries:
+            queued = queue_notifications([p.pk for p in self.parents], "Van DPS-001", "Arrived at school")
+
+        counts = dispatch_pending()
+
+        self.assertEqual(queued, 250)
+        # A handful of bulk inserts, not a query per parent
+        self.assertLess(len(queries), 10)
+        self.assertEqual(counts["sent"], 250)
+        self.assertEqual([len(batch) for batch in providers.outbox], [100, 100, 50])
+        self.assertFalse(Notification.objects.exclude(status="sent").exists())
+
+    def test_deduplicated_per_recipient(self):
+        parent = self.parents[0]
+        queue_notifications([parent.pk], "Van nearly here", "5 min", dedupe_key="trip-1:stop-1")
+
+        self.assertEqual(queue_notifications([parent.pk, parent.pk], "Van nearly here", "3 min", dedupe_key="trip-1:stop-1"), 0)
+        self.assertEqual(Notification.objects.count(), 1)
+
+    def test_newer_pending_notification_replaces_older(self):
+        parent = self.parents[0]
+        queue_notifications([parent.pk], "Van nearly here", "5 min away", coalesce_key="van:1")
+        queue_notifications([parent.pk], "Van arrived", "At school", coalesce_key="van:1")
+
+        dispatch_pending()
+
+        self.assertEqual([m["body"] for batch in providers.outbox for m in batch], ["At school"])
+        self.assertEqual(Notification.objects.filter(status="coalesced").count(), 1)
+
+    def test_failed_batch_is_retried_then_given_up(self):
+        queue_notifications([self.parents[0].pk], "Van DPS-001", "Arrived")
+        providers.LocMemProvider.fail_batches = 1
+
+        self.assertEqual(dispatch_pending()["retrying"], 1)
+        self.assertEqual(dispatch_pending()["sent"], 1)
+
+        queue_notifications([self.parents[1].pk], "Van DPS-001", "Arrived")
+        providers.LocMemProvider.fail_batches = 3
+        for _ in range(3):
+            dispatch_pending()
+        failed = Notification.objects.get(recipient=self.parents[1])
+        self.assertEqual((failed.status, failed.attempts), ("failed", 3))
+        self.assertIn("unavailable", failed.last_error)
+
+    def test_unregistered_devices_are_deactivated(self):
+        parent = self.parents[0]
+        providers.LocMemProvider.unregistered = {f"ExponentPushToken[{parent.pk}]"}
+        queue_notifications([parent.pk, self.parents[1].pk], "Van DPS-001", "Arrived")
+
+        counts = dispatch_pending()
+
+        self.assertEqual((counts["sent"], counts["no_device"]), (1, 1))
+        self.assertFalse(PushDevice.objects.get(user=parent).is_active)
+
+    def test_command_drains_outbox(self):
+        queue_notifications([p.pk for p in self.parents], "Van DPS-001", "Arrived")
+        out = StringIO()
+
+        call_command("send_notifications", "--limit=100", stdout=out)
+
+        self.assertIn("250 sent", out.getvalue())
+
+
+@override_settings(PUSH_PROVIDER="notifications.providers.LocMemProvider", TIME_ZONE="UTC")
+class NotificationEndpointTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.driver = User.objects.create(phone_number="+919876543210", user_type="driver")
+        self.parent = User.objects.create(phone_number="+919876543211", user_type="parent")
+        self.van = VanAssignment.objects.create(driver=self.driver, van_number="DPS-001")
+        ChildVanAssignment.objects.create(
+            parent=self.parent, child_name="Aarav", van_assignment=self.van,
+            stop_latitude=Decimal("28.600000"), stop_longitude=Decimal("77.200000")
+        )
+
+    def client_for(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=user).key}")
+        return client
+
+    def test_register_device(self):
+        client = self.client_for(self.parent)
+
+        response = client.post(
+            "/api/notifications/register-device/", {"token": "ExponentPushToken[abc]", "platform": "ios"}, format="json"
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(PushDevice.objects.get().user, self.parent)
+
+        response = client.post(
+            "/api/notifications/register-device/", {"token": "ExponentPushToken[def]", "platform": None}, format="json"
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(PushDevice.objects.get(token="ExponentPushToken[def]").platform, "")
+        response = client.post(
+            "/api/notifications/register-device/", {"token": "ExponentPushToken[ghi]", "platform": 7}, format="json"
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_arrived_at_school_queues_once(self):
+        client = self.client_for(self.driver)
+
+        first = client.post("/api/notifications/arrived-at-school/")
+        second = client.post("/api/notifications/arrived-at-school/")
+
+        self.assertEqual(first.status_code, 202)
+        self.assertEqual((first.data["queued"], second.data["queued"]), (1, 0))
+        self.assertEqual(Notification.objects.get().recipient, self.parent)
+
+    def test_proximity_alert_is_queued_for_parent(self):
+        morning = timezone.make_aware(datetime.datetime(2026, 10, 19, 7, 15))
+
+        alerts.check_proximity(self.driver.pk, 28.601, 77.2, now=morning)
+
+        notification = Notification.objects.get()
+        self.assertEqual((notification.recipient, notification.kind), (self.parent, "van_approaching"))
+        self.assertIn("Aarav", notification.body)
+
+    def test_alerts_for_different_stops_on_one_van_both_stay_pending(self):
+        ChildVanAssignment.objects.create(
+            parent=self.parent, child_name="Diya", van_assignment=self.van,
+            stop_latitude=Decimal("28.602000"), stop_longitude=Decimal("77.200000")
+        )
+        morning = timezone.make_aware(datetime.datetime(2026, 10, 19, 7, 15))
+
+        alerts.check_proximity(self.driver.pk, 28.601, 77.2, now=morning)
+
+        self.assertEqual(Notification.objects.filter(status="pending").count(), 2)
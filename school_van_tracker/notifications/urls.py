@@ -0,0 +1,8 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('register-device/', views.register_device, name='register_device'),
+    path('unregister-device/', views.unregister_device, name='unregister_device'),
+    path('arrived-at-school/', views.arrived_at_school, name='arrived_at_school'),
+]
@@ -1,3 +1,126 @@
-from django.shortcuts import render
+import logging
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework import status
+from locations.alerts import current_trip
+from locations.models import ChildVanAssignment, VanAssignment
+from django.utils import timezone
+from .models import PushDevice
+from .outbox import queue_notifications
 
-# Create your views here.
+logger = logging.getLogger(__name__)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def register_device(request):
+    """Register the app's push token for the current user"""
+    try:
+        token = request.data.get('token')
+        if not token:
+            return Response(
+                {"error": "Push token is required"}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        platform = request.data.get('platform') or ''
+        if not isinstance(token, str) or not isinstance(platform, str):
+            return Response(
+                {"error": "token and platform must be strings"}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # A token moves with the device, e.g. when someone else logs in on it
+        device, created = PushDevice.objects.update_or_create(
+            token=token,
+            defaults={
+                "user": request.user,
+                "platform": platform[:20],
+                "is_active": True
+            }
+        )
+        
+        return Response({
+            "message": "Device registered",
+            "created": created
+        }, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+        
+    except Exception as e:
+        logger.error(f"❌ Error registering push device: {str(e)}")
+        return Response(
+            {"error": "Failed to register device"}, 
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def unregister_device(request):
+    """Stop sending pushes to a token (e.g. on logout)"""
+    try:
+        token = request.data.get('token')
+        if not token:
+            return Response(
+                {"error": "Push token is required"}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        PushDevice.objects.filter(user=request.user, token=token).update(is_active=False)
+        
+        return Response({"message": "Device unregistered"})
+        
+    except Exception as e:
+        logger.error(f"❌ Error unregistering push device: {str(e)}")
+        return Response(
+            {"error": "Failed to unregister device"}, 
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def arrived_at_school(request):
+    """Tell every parent on the driver's vans that the van reached school"""
+    try:
+        if request.user.user_type != 'driver':
+            return Response(
+                {"error": "Only drivers can access this endpoint"}, 
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        vans = VanAssignment.objects.filter(driver=request.user, is_active=True)
+        parents = ChildVanAssignment.objects.filter(
+            van_assignment__in=vans,
+            is_active=True
+        ).values_list('van_assignment_id', 'parent_id').distinct()
+        
+        parents_by_van = {}
+        for van_id, parent_id in parents:
+            parents_by_van.setdefault(van_id, []).append(parent_id)
+        
+        trip = current_trip(timezone.localtime())
+        queued = 0
+        for van in vans:
+            queued += queue_notifications(
+                parents_by_van.get(van.pk, []),
+                title=f"Van {van.van_number} has arrived at school",
+                body="Your child has been dropped off at school.",
+                kind='arrived_at_school',
+                data={"van_assignment_id": van.pk},
+                dedupe_key=f"arrived_at_school:{van.pk}:{trip}",
+                coalesce_key=f"van:{van.pk}"
+            )
+        
+        logger.info(f"🏫 Queued {queued} arrival notifications for driver {request.user.phone_number}")
+        
+        return Response({
+            "message": "Parents will be notified",
+            "queued": queued
+        }, status=status.HTTP_202_ACCEPTED)
+        
+    except Exception as e:
+        logger.error(f"❌ Error queueing arrival notifications: {str(e)}")
+        return Response(
+            {"error": "Failed to notify parents"}, 
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
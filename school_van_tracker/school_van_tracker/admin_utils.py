@@ -0,0 +1,97 @@
+"""
+Admin helpers for tables too large for the default changelist.
+
+The stock changelist runs an exact ``COUNT(*)`` over the table (twice when
+filtered), builds sidebar filters from every related row and searches with
+``icontains``, which can't use an index. ``LargeTableAdminMixin`` replaces
+those with:
+
+- an estimated row count for the unfiltered list, read from the database's
+  statistics, and a count capped at ``exact_count_limit`` rows otherwise;
+- prefix search (``LIKE 'term%'``) over ``prefix_search_fields``, which a
+  B-tree index can serve;
+- opening on today's page of ``date_hierarchy`` instead of the whole table.
+"""
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.http import HttpResponseRedirect
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+
+def estimate_row_count(model, using="default"):
+    """Approximate number of rows in ``model``'s table, or None if unknown"""
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [table])
+        elif connection.vendor == "mysql":
+            cursor.execute(
+                "SELECT table_rows FROM information_schema.tables "
+                "WHERE table_schema = DATABASE() AND table_name = %s",
+                [table],
+            )
+        elif connection.vendor == "sqlite":
+            # Row ids only grow, so the largest is an upper bound found via the primary key
+            cursor.execute(f"SELECT MAX(rowid) FROM {connection.ops.quote_name(table)}")
+        else:
+            return None
+        row = cursor.fetchone()
+    if not row or row[0] is None or row[0] < 0:
+        # Postgres reports -1 for tables that were never analysed
+        return None
+    return int(row[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that never counts more than ``exact_count_limit`` rows"""
+
+    exact_count_limit = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimate_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > self.exact_count_limit:
+                return estimate
+        # COUNT over a LIMITed subquery stops reading after the limit
+        return queryset[:self.exact_count_limit].count()
+
+
+class LargeTableAdminMixin:
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    # Searched with startswith; use exact column values such as full phone numbers
+    prefix_search_fields = ()
+
+    def get_search_fields(self, request):
+        # The prefix search below replaces Django's icontains search, but the
+        # search box is only shown when search fields are set
+        return super().get_search_fields(request) or self.prefix_search_fields
+
+    def get_search_results(self, request, queryset, search_term):
+        if not self.prefix_search_fields:
+            return super().get_search_results(request, queryset, search_term)
+        for term in search_term.split():
+            variants = {term}
+            if term.isdigit():
+                # Phone numbers are stored as E.164
+                variants.add(f"+{term}")
+            condition = Q()
+            for field in self.prefix_search_fields:
+                for variant in variants:
+                    condition |= Q(**{f"{field}__startswith": variant})
+            queryset = queryset.filter(condition)
+        return queryset, False
+
+    def changelist_view(self, request, extra_context=None):
+        if self.date_hierarchy and not request.GET:
+            today = timezone.localdate()
+            field = self.date_hierarchy
+            return HttpResponseRedirect(
+                f"{request.path}?{field}__year={today.year}&{field}__month={today.month}&{field}__day={today.day}"
+            )
+        return super().changelist_view(request, extra_context)
@@ -0,0 +1,20 @@
+"""
+SQLite backend that applies the ``PRAGMAS`` entry of a DATABASES alias on
+every new connection.
+
+WAL mode lets parent reads run while a driver write is in progress, and
+``busy_timeout`` makes concurrent writers wait for the lock instead of
+failing with "database is locked".
+"""
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        if self.is_in_memory_db():
+            # Journal and mmap settings don't apply to in-memory test databases
+            return conn
+        for pragma, value in self.settings_dict.get("PRAGMAS", {}).items():
+            conn.execute(f"PRAGMA {pragma} = {value}")
+        return conn
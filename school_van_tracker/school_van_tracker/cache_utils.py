@@ -0,0 +1,19 @@
+"""
+Helpers for features that share state between workers through the cache.
+
+OTP codes, heartbeats and cache invalidations only work when every process
+sees the same cache. LocMem (the default without ``REDIS_URL``) is private
+to each process, so those features check ``is_process_local_cache()`` and
+fall back or refuse to start.
+"""
+from django.conf import settings
+
+PROCESS_LOCAL_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+def is_process_local_cache(alias="default"):
+    """Whether the ``alias`` cache is private to this process"""
+    return settings.CACHES[alias]["BACKEND"] in PROCESS_LOCAL_BACKENDS
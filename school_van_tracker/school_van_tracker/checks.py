@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.checks import Error, register
+
+from .cache_utils import is_process_local_cache
+
+
+@register()
+def check_replica_pin_cache(app_configs, **kwargs):
+    """The read-your-writes pin must be seen by whichever worker serves the next read"""
+    if settings.DATABASE_REPLICAS and is_process_local_cache():
+        return [
+            Error(
+                "DATABASE_REPLICAS is set but the cache is per process, so a client pinned to the "
+                "primary after a write can read from a lagging replica on another worker.",
+                hint="Set REDIS_URL.",
+                id="school_van_tracker.E001",
+            )
+        ]
+    return []
@@ -0,0 +1,137 @@
+"""
+Database routing for read replicas.
+
+``ReplicaReadMiddleware`` marks safe requests to ``REPLICA_READ_PATHS`` as
+replica-eligible, and ``ReplicaRouter`` then sends their reads to one of the
+``DATABASE_REPLICAS`` aliases. Everything else, and every write, uses the
+primary (``default``).
+
+A client that has just written (any unsafe request with its auth token) is
+pinned to the primary for ``REPLICA_PIN_SECONDS`` so it reads its own writes
+despite replication lag. The pin is kept in the cache, so it needs a cache
+shared by every worker (``school_van_tracker.E001``). A replica that fails to
+connect is skipped for ``REPLICA_RETRY_SECONDS``; one that connected is not
+checked again for ``REPLICA_HEALTH_SECONDS``. With no healthy replica, reads
+fall back to the primary.
+"""
+import hashlib
+import logging
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.utils import DatabaseError
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+_use_replica = ContextVar("use_replica", default=False)
+
+# alias -> time.monotonic() until which the replica is considered down
+_replica_down_until = {}
+# alias -> time.monotonic() until which the replica is considered up
+_replica_up_until = {}
+
+
+def mark_replica_down(alias):
+    _replica_up_until.pop(alias, None)
+    _replica_down_until[alias] = time.monotonic() + settings.REPLICA_RETRY_SECONDS
+    logger.warning(f"⚠️ Replica {alias} unavailable, using primary for {settings.REPLICA_RETRY_SECONDS}s")
+
+
+def healthy_replicas():
+    now = time.monotonic()
+    return [alias for alias in settings.DATABASE_REPLICAS if _replica_down_until.get(alias, 0) <= now]
+
+
+def choose_replica():
+    """Pick a reachable replica alias, or the primary if none is available"""
+    candidates = healthy_replicas()
+    random.shuffle(candidates)
+    now = time.monotonic()
+    for alias in candidates:
+        if _replica_up_until.get(alias, 0) > now:
+            return alias
+        try:
+            connections[alias].ensure_connection()
+        except DatabaseError:
+            mark_replica_down(alias)
+            continue
+        _replica_up_until[alias] = now + settings.REPLICA_HEALTH_SECONDS
+        return alias
+    return DEFAULT_DB_ALIAS
+
+
+class use_replica:
+    """Context manager allowing reads in the block to go to a replica"""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+
+    def __enter__(self):
+        self._token = _use_replica.set(self.enabled)
+        return self
+
+    def __exit__(self, *exc_info):
+        _use_replica.reset(self._token)
+
+
+class ReplicaRouter:
+    # Auth must see logins and logouts immediately
+    primary_only_apps = {"authtoken", "sessions"}
+
+    def db_for_read(self, model, **hints):
+        if not settings.DATABASE_REPLICAS or not _use_replica.get():
+            return None
+        if model._meta.app_label in self.primary_only_apps:
+            return DEFAULT_DB_ALIAS
+        return choose_replica()
+
+    def db_for_write(self, model, **hints):
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+def _pin_key(request):
+    authorization = request.META.get("HTTP_AUTHORIZATION")
+    if not authorization:
+        return None
+    return f"db:pin:{hashlib.sha256(authorization.encode()).hexdigest()}"
+
+
+class ReplicaReadMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+
+        pin_key = _pin_key(request)
+        if request.method in SAFE_METHODS:
+            eligible = (
+                request.path in settings.REPLICA_READ_PATHS
+                and not (pin_key and cache.get(pin_key))
+            )
+            with use_replica(eligible):
+                return self.get_response(request)
+
+        response = self.get_response(request)
+        if pin_key:
+            cache.set(pin_key, True, timeout=settings.REPLICA_PIN_SECONDS)
+        return response
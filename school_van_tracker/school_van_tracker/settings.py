@@ -5,6 +5,8 @@ Django settings for school_van_tracker project.
 from pathlib import Path
 import os
 
+from .database import database_config
+
 # Build paths inside the project like this: BASE_DIR / "subdir".
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -33,10 +35,13 @@ INSTALLED_APPS = [
     # Local apps
     "accounts",
     "locations",
+    "notifications",
 ]
 
 MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",
+    # Compresses what every middleware below produces, so keep it near the top
+    "school_van_tracker.compression.CompressionMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -44,6 +49,8 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "school_van_tracker.routers.ReplicaReadMiddleware",
+    "school_van_tracker.tenancy.TenantMiddleware",
 ]
 
 ROOT_URLCONF = "school_van_tracker.urls"
@@ -67,13 +74,73 @@ TEMPLATES = [
 WSGI_APPLICATION = "school_van_tracker.wsgi.application"
 
 # Database
+# See school_van_tracker/database.py for the SQLite pragmas and Postgres
+# connection settings applied on top of DATABASE_URL
 DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
-    }
+    "default": database_config(os.getenv("DATABASE_URL", "sqlite:///db.sqlite3"), BASE_DIR),
 }
 
+# Read replicas (comma separated URLs), used for parent-facing reads by
+# school_van_tracker.routers
+DATABASE_REPLICAS = []
+for index, replica_url in enumerate(filter(None, os.getenv("DATABASE_REPLICA_URLS", "").split(","))):
+    alias = f"replica{index + 1}"
+    DATABASES[alias] = database_config(replica_url.strip(), BASE_DIR)
+    DATABASES[alias]["TEST"] = {"MIRROR": "default"}
+    DATABASE_REPLICAS.append(alias)
+
+# Databases for schools moved off default (comma separated alias=URL pairs);
+# see school_van_tracker.tenancy and `manage.py move_school`
+TENANT_DATABASES = []
+for tenant_entry in filter(None, os.getenv("TENANT_DATABASE_URLS", "").split(",")):
+    alias, _, tenant_url = tenant_entry.partition("=")
+    DATABASES[alias.strip()] = database_config(tenant_url.strip(), BASE_DIR)
+    TENANT_DATABASES.append(alias.strip())
+
+# High-volume tables stored on each school's database
+TENANT_MODELS = ["locations.location", "locations.dailydriverstats", "locations.rollupwatermark"]
+# How long each process keeps its school -> database map
+TENANT_MAP_SECONDS = 30
+
+DATABASE_ROUTERS = [
+    "school_van_tracker.tenancy.TenantRouter",
+    "school_van_tracker.routers.ReplicaRouter",
+]
+
+# Read-only endpoints that may be served from a replica
+REPLICA_READ_PATHS = [
+    "/api/locations/van-location/",
+    "/api/auth/profile/",
+    "/api/locations/heatmap/",
+    "/api/locations/playback/",
+    "/api/locations/export/locations.csv",
+    "/api/locations/export/locations.geojson",
+]
+# After a write, the client reads from the primary for this many seconds
+REPLICA_PIN_SECONDS = 5
+# How long an unreachable replica is skipped before trying it again
+REPLICA_RETRY_SECONDS = 30
+# How long a replica that connected is used without checking it again
+REPLICA_HEALTH_SECONDS = 5
+
+# Cache
+# Rate limits and other shared counters need a cache every worker can see, so
+# point REDIS_URL at Redis in production. LocMem is per-process.
+SHARED_CACHE = bool(os.getenv("REDIS_URL"))
+if SHARED_CACHE:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.getenv("REDIS_URL"),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -106,11 +173,146 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 # Django REST Framework
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication",
+        # TokenAuthentication with a short-lived cache of token -> user lookups
+        "accounts.authentication.CachedTokenAuthentication",
     ],
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
+    "DEFAULT_RENDERER_CLASSES": [
+        # orjson when installed, DRF's JSONRenderer otherwise
+        "school_van_tracker.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+}
+
+# Response compression (see school_van_tracker.compression); brotli is used
+# when the brotli package is installed and the client accepts it
+COMPRESSION = {
+    "enabled": True,
+    "min_bytes": 1024,  # smaller bodies are sent uncompressed
+    "gzip_level": 6,
+    "brotli_quality": 5,  # 0-11; above ~5 costs much more CPU for little gain
+    "content_types": [
+        "application/json",
+        "application/geo+json",
+        "text/csv",
+        "text/html",
+        "text/plain",
+    ],
+}
+
+# Adaptive GPS upload policy sent to the driver app (see locations.tracking)
+TRACKING_POLICY = {
+    "modes": {
+        "disabled": {"interval_seconds": 300, "distance_filter_meters": 0},
+        "off_shift": {"interval_seconds": 300, "distance_filter_meters": 500},
+        "parked": {"interval_seconds": 120, "distance_filter_meters": 50},
+        "approaching_stop": {"interval_seconds": 5, "distance_filter_meters": 10},
+        "moving": {"interval_seconds": 30, "distance_filter_meters": 50},
+    },
+    "parked_speed_kmh": 2,
+    "approach_radius_meters": 800,
+    # While moving, upload about every this many meters (bounded by the
+    # "moving" interval and min_interval_seconds)
+    "moving_point_spacing_meters": 250,
+    "min_interval_seconds": 5,
+    # Tracking window around the earliest/latest pickup and drop-off times
+    "shift_lead_minutes": 30,
+    "shift_tail_minutes": 60,
+}
+TRACKING_SCHEDULE_CACHE_SECONDS = 300
+
+# Stale-van detection (see locations.heartbeat); run `manage.py monitor_heartbeats --loop`
+HEARTBEAT = {
+    "stale_after_seconds": 60,  # silence allowed whatever the upload interval
+    "missed_intervals": 2,  # or this many of the intervals the app was told to keep, if longer
+    "recheck_seconds": 30,  # how often a silent van is looked at again
+    "refresh_seconds": 60,  # how often the list of active vans is reloaded
+    "tick_seconds": 5,
+    "cache_seconds": 24 * 60 * 60,
+}
+
+# Streaming trip record exports (see locations.export)
+LOCATION_EXPORT = {
+    "max_days": 31,
+    "chunk_size": 2000,  # rows fetched per round trip and written per piece of the response
+}
+
+# Bulk roster import (locations.roster)
+ROSTER_IMPORT = {
+    "chunk_size": 500,  # rows written per transaction
+    "max_rows": 20000,  # rows after this are reported and skipped
+}
+
+# Location uploads (see locations.ingest)
+LOCATION_BATCH_MAX_POINTS = 500
+# recorded_at values further ahead of the server clock are clamped to it
+LOCATION_MAX_CLOCK_SKEW_SECONDS = 120
+
+# Daily driver rollups (see locations.rollups); run `manage.py rollup_locations --loop`
+LOCATION_ROLLUPS = {
+    "batch_size": 5000,  # Location rows per catch-up transaction
+    "settle_seconds": 30,  # only read rows at least this old
+    "max_gap_seconds": 300,  # longer gaps between points are not counted as driving or idling
+    "idle_speed_kmh": 3,
+    "max_speed_kmh": 150,  # faster implied speeds are GPS jumps
+}
+
+# Speed/idle heatmap for staff (see locations.heatmap)
+HEATMAP = {
+    "cell_sizes_meters": [100, 250, 500, 1000],  # allowed resolutions
+    "default_cell_size_meters": 250,
+    "max_window_days": 31,
+    "percentiles": [50, 90],
+    # Windows are widened to whole buckets of this size so requests share cache entries
+    "window_align_minutes": 15,
+    "cache_seconds": 24 * 60 * 60,  # windows that have ended
+    "live_cache_seconds": 60,  # windows that include now
+    "chunk_size": 5000,  # rows fetched per round trip
+}
+
+# Trip replay for support staff (see locations.playback)
+PLAYBACK = {
+    "default_points": 500,
+    "max_points": 5000,
+    "max_window_hours": 24,
+    # Staying within this radius for this long is shown as one stop
+    "stop_radius_meters": 30,
+    "stop_min_seconds": 60,
+    "chunk_size": 2000,  # rows fetched per round trip
+}
+
+# "Van is nearly here" alerts to parents (see locations.alerts)
+PROXIMITY_ALERTS = {
+    "enabled": True,
+    "radius_meters": 500,
+    "eta_minutes": 5,
+    # Upper bound on the search radius for fast vans; also the grid cell size
+    "max_radius_meters": 3000,
+    # How long a sent alert is remembered (longer than any single trip)
+    "dedupe_seconds": 12 * 60 * 60,
+}
+
+# Pickup-order optimiser (see locations.route_optimizer)
+ROUTE_OPTIMIZER = {
+    "speed_kmh": 25,  # average city speed used to estimate arrival times
+    "dwell_seconds": 60,  # time spent at each stop
+    "late_tolerance_minutes": 5,  # allowed lateness past a pickup time
+    "late_penalty_meters_per_minute": 2000,
+    "time_limit_seconds": 5,
+}
+
+# Seconds a token -> user lookup stays cached (accounts.authentication)
+AUTH_TOKEN_CACHE_TTL = 60
+
+# Cached check-user/ lookups (accounts.profiles); saves and
+# deletes invalidate them, the TTLs only bound changes made behind the ORM.
+# A per-process cache is only invalidated in the worker that saved, so
+# entries are kept briefly there.
+PROFILE_CACHE = {
+    "seconds": 24 * 60 * 60 if SHARED_CACHE else 60,
+    "missing_seconds": 10 * 60 if SHARED_CACHE else 60,  # unknown numbers, dropped when the user is created
 }
 
 # CORS settings
@@ -141,3 +343,50 @@ MSG91_SENDER_ID = os.getenv("MSG91_SENDER_ID", "SCHOOLVAN")
 OTP_EXPIRY_MINUTES = 10
 OTP_LENGTH = 6
 OTP_MAX_ATTEMPTS = 3
+# accounts.otp_store.CacheOTPStore keeps codes in the cache with a TTL;
+# accounts.otp_store.DatabaseOTPStore keeps them in OTPVerification rows.
+# The cache store needs a cache shared by every worker (check accounts.E001).
+OTP_STORE = os.getenv(
+    "OTP_STORE", "accounts.otp_store.CacheOTPStore" if SHARED_CACHE else "accounts.otp_store.DatabaseOTPStore"
+)
+# Also write every cache-stored OTP to OTPVerification as an audit trail
+OTP_AUDIT_DB = os.getenv("OTP_AUDIT_DB", "False") == "True"
+# OTPVerification rows older than this are removed by `manage.py purge_otps`
+OTP_RETENTION_HOURS = int(os.getenv("OTP_RETENTION_HOURS", "24"))
+OTP_PURGE_BATCH_SIZE = 5000
+
+# SMS delivery
+# Backends: accounts.sms.TwilioBackend, accounts.sms.ConsoleBackend, accounts.sms.LocMemBackend
+SMS_BACKEND = os.getenv("SMS_BACKEND", "accounts.sms.TwilioBackend")
+# Deliver from a background queue so OTP endpoints don't wait on the provider.
+# The queue is in memory: texts still queued when the process exits are lost
+SMS_ASYNC = os.getenv("SMS_ASYNC", "True") == "True"
+SMS_MAX_RETRIES = 3
+SMS_RETRY_BACKOFF = 1.0  # seconds, doubled on every retry
+
+# Push notifications (see notifications.outbox); run `manage.py send_notifications --loop`
+# Providers: notifications.providers.ExpoPushProvider, notifications.providers.ConsoleProvider,
+# notifications.providers.LocMemProvider
+PUSH_PROVIDER = os.getenv("PUSH_PROVIDER", "notifications.providers.ExpoPushProvider")
+EXPO_ACCESS_TOKEN = os.getenv("EXPO_ACCESS_TOKEN")
+PUSH_BATCH_SIZE = 100  # Expo accepts at most 100 messages per request
+PUSH_TIMEOUT_SECONDS = 10
+NOTIFICATION_DISPATCH_LIMIT = 1000  # notifications claimed per worker round
+NOTIFICATION_LEASE_SECONDS = 300  # a claimed batch is retried if not finished by then
+NOTIFICATION_MAX_ATTEMPTS = 5
+NOTIFICATION_RETRY_BACKOFF = 30  # seconds, doubled on every retry
+
+# Rate limiting for the public auth endpoints (see accounts.ratelimit)
+# Rates are "<count>/<period>" where period is s, m, h, d or e.g. 60s, 10m
+RATE_LIMIT_ENABLED = True
+# META key holding the client IP; use "HTTP_X_FORWARDED_FOR" behind a trusted proxy
+RATE_LIMIT_IP_HEADER = os.getenv("RATE_LIMIT_IP_HEADER", "REMOTE_ADDR")
+# Trusted proxies appending to X-Forwarded-For; the client IP is the entry
+# this many places from the right, as anything further left is client-supplied
+RATE_LIMIT_PROXY_HOPS = int(os.getenv("RATE_LIMIT_PROXY_HOPS", "1"))
+RATE_LIMITS = {
+    "send_otp": {"phone": "1/60s", "ip": "20/10m"},
+    "resend_otp": {"phone": "1/60s", "ip": "20/10m"},
+    "verify_otp": {"phone": "5/10m", "ip": "30/10m"},
+    "check_user_exists": {"ip": "30/m"},
+}
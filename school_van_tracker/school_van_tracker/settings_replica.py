@@ -0,0 +1,28 @@
+"""
+Settings with a local SQLite read replica, for exercising the replica router.
+
+    python manage.py test school_van_tracker --settings=school_van_tracker.settings_replica
+
+Both aliases use on-disk SQLite files and the replica mirrors ``default`` in
+tests, so separate connections see the same committed data. Tests that read through
+the replica must commit their data (TransactionTestCase). The cache is a
+file-based one, as replicas need a cache shared between processes.
+"""
+import tempfile
+from pathlib import Path
+
+from .settings import *  # noqa: F401,F403
+from .database import sqlite_config
+
+DATABASES["default"]["TEST"] = {"NAME": str(BASE_DIR / "test_db.sqlite3")}
+DATABASES["replica1"] = sqlite_config(str(BASE_DIR / "db_replica.sqlite3"))
+DATABASES["replica1"]["TEST"] = {"MIRROR": "default"}
+DATABASE_REPLICAS = ["replica1"]
+
+if CACHES["default"]["BACKEND"].endswith("LocMemCache"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": str(Path(tempfile.gettempdir()) / "school_van_tracker_cache"),
+        }
+    }
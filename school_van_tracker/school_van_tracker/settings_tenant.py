@@ -0,0 +1,11 @@
+"""
+Settings with a second SQLite database for schools moved off ``default``,
+for exercising the tenant router.
+
+    python manage.py test school_van_tracker --settings=school_van_tracker.settings_tenant
+"""
+from .settings import *  # noqa: F401,F403
+from .database import sqlite_config
+
+DATABASES["tenant1"] = sqlite_config(str(BASE_DIR / "db_tenant1.sqlite3"))
+TENANT_DATABASES = ["tenant1"]
@@ -0,0 +1,178 @@
+"""
+Per-school data placement.
+
+Every school (``accounts.School``) names the database alias its
+high-volume tables, ``TENANT_MODELS``, live on. Those are Location,
+DailyDriverStats and RollupWatermark. Users, vans, children and routes stay
+on ``default``. A busy school can be given its own database with ``manage.py
+move_school`` without touching the others.
+
+``TenantRouter`` picks the alias for a tenant model from, in order:
+
+1. the ``school_id`` of the instance being saved;
+2. the school activated for the current request or block. This is set
+   either by ``accounts.authentication`` from the authenticated user's
+   school (``TenantMiddleware`` resets it per request) or by ``use_school``;
+3. otherwise ``default``.
+
+School -> alias lookups are kept in process memory and refreshed every
+``TENANT_MAP_SECONDS``. After a move, every process is writing to the new
+alias within that time.
+
+Reports that span schools read every tenant database with
+``tenant_querysets``. Cache entries aggregated over a school (heatmaps) are
+keyed with ``school_cache_key``. Entries keyed by a driver, user, phone
+number or IP (schedules, stop indexes, matched routes, heartbeats, rate
+limits, check-user) are not: those ids are global, since users live on
+``default``, so the entries can't mix schools and stay valid after a move.
+"""
+import logging
+import time
+from contextvars import ContextVar
+
+from django.apps import apps
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, router
+
+logger = logging.getLogger(__name__)
+
+_school_id = ContextVar("school_id", default=None)
+
+# school id -> alias, and the time.monotonic() it was loaded at
+_databases = {}
+_loaded_at = None
+
+
+def current_school_id():
+    return _school_id.get()
+
+
+def activate_school(school_id):
+    """Make ``school_id`` the current school until the end of the request"""
+    _school_id.set(school_id)
+
+
+class use_school:
+    """Context manager routing tenant models in the block to a school's database"""
+
+    def __init__(self, school_id):
+        self.school_id = school_id
+
+    def __enter__(self):
+        self._token = _school_id.set(self.school_id)
+        return self
+
+    def __exit__(self, *exc_info):
+        _school_id.reset(self._token)
+
+
+def tenant_databases():
+    """Every alias that can hold tenant tables, ``default`` first"""
+    return [DEFAULT_DB_ALIAS, *settings.TENANT_DATABASES]
+
+
+def _load_databases():
+    global _databases, _loaded_at
+    School = apps.get_model("accounts", "School")
+    # Swapped in with one assignment: a thread reading the map meanwhile sees
+    # the old one or the new one, never an empty one
+    _databases = dict(School.objects.using(DEFAULT_DB_ALIAS).values_list("pk", "database"))
+    _loaded_at = time.monotonic()
+    return _databases
+
+
+def invalidate_school_databases():
+    global _loaded_at
+    _loaded_at = None
+
+
+def school_database(school_id):
+    """Alias holding ``school_id``'s tenant tables"""
+    if school_id is None:
+        return DEFAULT_DB_ALIAS
+    databases = _databases
+    stale = _loaded_at is None or time.monotonic() - _loaded_at > settings.TENANT_MAP_SECONDS
+    if stale or school_id not in databases:
+        databases = _load_databases()
+    alias = databases.get(school_id, DEFAULT_DB_ALIAS)
+    if alias not in tenant_databases():
+        logger.error(f"❌ School {school_id} is on unknown database {alias}, using {DEFAULT_DB_ALIAS}")
+        return DEFAULT_DB_ALIAS
+    return alias
+
+
+def tenant_querysets(queryset, school_id=None):
+    """
+    ``queryset`` pinned to the database holding ``school_id``'s rows, or to
+    every tenant database without a school. Reads of ``default`` still go
+    through the replica router. Several schools can share a database, so
+    callers filter to the school's drivers themselves.
+    """
+    aliases = [school_database(school_id)] if school_id else tenant_databases()
+    querysets = []
+    for alias in aliases:
+        if alias == DEFAULT_DB_ALIAS:
+            with use_school(None):
+                alias = router.db_for_read(queryset.model)
+        querysets.append(queryset.using(alias))
+    return querysets
+
+
+def school_cache_key(school_id, key):
+    """``key`` in ``school_id``'s namespace, for entries covering a whole school"""
+    return f"school:{school_id or 0}:{key}"
+
+
+def is_tenant_model(model):
+    return model._meta.label_lower in settings.TENANT_MODELS
+
+
+class TenantRouter:
+    def _db_for_tenant_model(self, model, **hints):
+        # Users and vans carry a school too, e.g. for driver.locations.all()
+        school_id = getattr(hints.get("instance"), "school_id", None)
+        if school_id is None:
+            school_id = current_school_id()
+        alias = school_database(school_id)
+        # Leave default reads to the replica router
+        return None if alias == DEFAULT_DB_ALIAS else alias
+
+    def db_for_read(self, model, **hints):
+        if is_tenant_model(model):
+            return self._db_for_tenant_model(model, **hints)
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db in settings.TENANT_DATABASES:
+            # e.g. location.driver: Django would otherwise look on the
+            # location's own database, which has no users
+            return router.db_for_read(model)
+        return None
+
+    def db_for_write(self, model, **hints):
+        if is_tenant_model(model):
+            return self._db_for_tenant_model(model, **hints)
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db in settings.TENANT_DATABASES:
+            return router.db_for_write(model)
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Tenant rows point at users and vans on default without constraints
+        if is_tenant_model(type(obj1)) or is_tenant_model(type(obj2)):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.TENANT_DATABASES:
+            return model_name is not None and f"{app_label}.{model_name}" in settings.TENANT_MODELS
+        return None
+
+
+class TenantMiddleware:
+    """Clears the current school around every request"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with use_school(None):
+            return self.get_response(request)
@@ -0,0 +1,340 @@
+import datetime
+import gzip
+import json
+from collections import namedtuple
+from contextlib import contextmanager
+from decimal import Decimal
+from io import StringIO
+from unittest import skipUnless
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connections, router
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from accounts.models import School, User
+from locations import rollups
+from locations.management.commands import move_school
+from locations.models import DailyDriverStats, Location, VanAssignment
+from . import checks, compression, renderers, routers, tenancy
+
+
+@skipUnless(settings.DATABASE_REPLICAS, "run with --settings=school_van_tracker.settings_replica")
+class ReplicaRouterTests(TransactionTestCase):
+    databases = {"default", *settings.DATABASE_REPLICAS}
+
+    def setUp(self):
+        cache.clear()
+        routers._replica_down_until.clear()
+        routers._replica_up_until.clear()
+        self.user = User.objects.create(phone_number="+919876543211", user_type="parent", first_name="Priya")
+
+    def test_reads_go_to_primary_by_default(self):
+        self.assertEqual(router.db_for_read(User), DEFAULT_DB_ALIAS)
+
+    def test_reads_go_to_replica_when_allowed(self):
+        with routers.use_replica():
+            self.assertEqual(router.db_for_read(User), "replica1")
+            self.assertEqual(User.objects.get(pk=self.user.pk).first_name, "Priya")
+
+    def test_tokens_always_read_from_primary(self):
+        with routers.use_replica():
+            self.assertEqual(router.db_for_read(Token), DEFAULT_DB_ALIAS)
+
+    def test_writes_go_to_primary(self):
+        with routers.use_replica():
+            self.assertEqual(router.db_for_write(User), DEFAULT_DB_ALIAS)
+
+    def test_failover_to_primary(self):
+        routers.mark_replica_down("replica1")
+
+        with routers.use_replica():
+            self.assertEqual(router.db_for_read(User), DEFAULT_DB_ALIAS)
+
+    def test_healthy_replica_is_not_rechecked_for_a_while(self):
+        self.assertEqual(routers.choose_replica(), "replica1")
+        connections["replica1"].close()
+
+        self.assertEqual(routers.choose_replica(), "replica1")
+        self.assertIsNone(connections["replica1"].connection)
+
+    def test_middleware_pins_client_to_primary_after_write(self):
+        token = Token.objects.create(user=self.user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+        seen = []
+        original = routers.choose_replica
+
+        def recording_choose_replica():
+            alias = original()
+            seen.append(alias)
+            return alias
+
+        routers.choose_replica = recording_choose_replica
+        try:
+            client.get("/api/locations/van-location/")
+            self.assertEqual(seen, ["replica1"])
+
+            seen.clear()
+            client.put("/api/auth/update-profile/", {"first_name": "Anita"}, format="json")
+            client.get("/api/locations/van-location/")
+        finally:
+            routers.choose_replica = original
+
+        self.assertEqual(seen, [])
+
+    @override_settings(TIME_ZONE="UTC")
+    def test_staff_reports_read_from_the_replica(self):
+        driver = User.objects.create(phone_number="+919876543212", user_type="driver")
+        van = VanAssignment.objects.create(driver=driver, van_number="DPS-001")
+        morning = datetime.datetime(2026, 10, 18, 7, 0, tzinfo=datetime.timezone.utc)
+        Location.objects.create(
+            driver=driver, latitude=Decimal("28.6"), longitude=Decimal("77.2"), speed=30, timestamp=morning
+        )
+        staff = User.objects.create(phone_number="+919876543299", user_type="parent", is_staff=True)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=staff).key}")
+
+        with mock_choose_replica() as seen:
+            heatmap = client.get("/api/locations/heatmap/", {
+                "from": "2026-10-18T00:00:00Z", "to": "2026-10-19T00:00:00Z", "cell_size": 250
+            })
+            playback = client.get("/api/locations/playback/", {
+                "van_id": van.pk, "from": "2026-10-18T06:00:00Z", "to": "2026-10-18T08:00:00Z"
+            })
+            export = client.get("/api/locations/export/locations.csv", {"from": "2026-10-18"})
+            rows = b"".join(export.streaming_content).decode().splitlines()
+
+        self.assertEqual((heatmap.status_code, playback.status_code, export.status_code), (200, 200, 200))
+        self.assertEqual(heatmap.data["cells"][0]["count"], 1)
+        self.assertEqual(playback.data["raw_point_count"], 1)
+        self.assertEqual(len(rows), 2)
+        self.assertIn("replica1", seen)
+
+
+@contextmanager
+def mock_choose_replica():
+    """Records the replicas routers.choose_replica picks inside the block"""
+    original = routers.choose_replica
+    seen = []
+
+    def recording_choose_replica():
+        alias = original()
+        seen.append(alias)
+        return alias
+
+    routers.choose_replica = recording_choose_replica
+    try:
+        yield seen
+    finally:
+        routers.choose_replica = original
+
+
+class ChecksTests(SimpleTestCase):
+    def test_replicas_need_a_shared_cache(self):
+        locmem = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+        with override_settings(DATABASE_REPLICAS=["replica1"], CACHES=locmem):
+            self.assertEqual(
+                [error.id for error in checks.check_replica_pin_cache(None)], ["school_van_tracker.E001"]
+            )
+        with override_settings(DATABASE_REPLICAS=[], CACHES=locmem):
+            self.assertEqual(checks.check_replica_pin_cache(None), [])
+
+
+class TenancyTests(TestCase):
+    def setUp(self):
+        tenancy.invalidate_school_databases()
+        self.school = School.objects.create(name="Delhi Public School", slug="dps")
+
+    def test_cache_keys_are_namespaced_by_school(self):
+        self.assertEqual(tenancy.school_cache_key(self.school.pk, "heatmap:x"), f"school:{self.school.pk}:heatmap:x")
+        self.assertEqual(tenancy.school_cache_key(None, "heatmap:x"), "school:0:heatmap:x")
+
+    def test_default_schools_leave_routing_to_the_replica_router(self):
+        with tenancy.use_school(self.school.pk):
+            self.assertIsNone(tenancy.TenantRouter().db_for_read(Location))
+        self.assertIsNone(tenancy.TenantRouter().db_for_read(User))
+
+    @override_settings(TENANT_DATABASES=["tenant1"])
+    def test_routes_tenant_models_to_school_database(self):
+        School.objects.filter(pk=self.school.pk).update(database="tenant1")
+        router_ = tenancy.TenantRouter()
+
+        with tenancy.use_school(self.school.pk):
+            self.assertEqual(router_.db_for_read(Location), "tenant1")
+            self.assertEqual(router_.db_for_write(DailyDriverStats), "tenant1")
+            self.assertIsNone(router_.db_for_read(VanAssignment))
+        self.assertIsNone(router_.db_for_write(Location))
+        # The instance's school wins over the current one
+        self.assertEqual(router_.db_for_write(Location, instance=Location(school_id=self.school.pk)), "tenant1")
+
+    def test_unknown_database_falls_back_to_default(self):
+        School.objects.filter(pk=self.school.pk).update(database="nowhere")
+
+        with self.assertLogs("school_van_tracker.tenancy", level="ERROR"):
+            self.assertEqual(tenancy.school_database(self.school.pk), DEFAULT_DB_ALIAS)
+
+    def test_school_map_is_reloaded_after_invalidation(self):
+        self.assertEqual(tenancy.school_database(self.school.pk), DEFAULT_DB_ALIAS)
+        School.objects.filter(pk=self.school.pk).update(database="tenant1")
+
+        with override_settings(TENANT_DATABASES=["tenant1"]):
+            self.assertEqual(tenancy.school_database(self.school.pk), DEFAULT_DB_ALIAS)
+            tenancy.invalidate_school_databases()
+            self.assertEqual(tenancy.school_database(self.school.pk), "tenant1")
+
+    @override_settings(TENANT_DATABASES=["tenant1"])
+    def test_only_tenant_tables_are_migrated_on_tenant_databases(self):
+        router_ = tenancy.TenantRouter()
+        self.assertTrue(router_.allow_migrate("tenant1", "locations", model_name="location"))
+        self.assertFalse(router_.allow_migrate("tenant1", "accounts", model_name="user"))
+        self.assertFalse(router_.allow_migrate("tenant1", "locations"))
+        self.assertIsNone(router_.allow_migrate(DEFAULT_DB_ALIAS, "accounts", model_name="user"))
+
+    def test_middleware_clears_the_school_after_the_request(self):
+        user = User.objects.create(phone_number="+919876543212", user_type="driver", school=self.school)
+        token = Token.objects.create(user=user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+        client.get("/api/locations/driver-location/")
+
+        self.assertIsNone(tenancy.current_school_id())
+
+
+@skipUnless(settings.TENANT_DATABASES, "run with --settings=school_van_tracker.settings_tenant")
+class TenantDatabaseTests(TestCase):
+    databases = {"default", *settings.TENANT_DATABASES}
+
+    def setUp(self):
+        cache.clear()
+        tenancy.invalidate_school_databases()
+        self.school = School.objects.create(name="Delhi Public School", slug="dps", database="tenant1")
+        self.driver = User.objects.create(phone_number="+919876543301", user_type="driver", school=self.school)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=self.driver).key}")
+
+    def post_point(self, key, latitude=28.6):
+        return self.client.post(
+            "/api/locations/update-location/",
+            {"latitude": latitude, "longitude": 77.2, "idempotency_key": key},
+            format="json",
+        )
+
+    def test_driver_points_are_stored_on_the_school_database(self):
+        response = self.post_point("a")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(Location.objects.using(DEFAULT_DB_ALIAS).exists())
+        location = Location.objects.using("tenant1").get()
+        self.assertEqual(location.school_id, self.school.pk)
+        self.assertTrue(location.is_active)
+
+    def test_driver_reads_come_from_the_school_database(self):
+        self.post_point("a")
+
+        response = self.client.get("/api/locations/driver-location/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["location"]["latitude"], "28.600000")
+
+    def test_rollups_run_per_database(self):
+        self.post_point("a")
+        Location.objects.using("tenant1").update(received_at=datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc))
+
+        self.assertEqual(rollups.catch_up(using=DEFAULT_DB_ALIAS), 0)
+        self.assertEqual(rollups.catch_up(using="tenant1"), 1)
+        self.assertEqual(DailyDriverStats.objects.using("tenant1").get().school_id, self.school.pk)
+
+    def test_move_school_copies_points_and_switches_database(self):
+        other = School.objects.create(name="Modern School", slug="modern")
+        driver = User.objects.create(phone_number="+919876543302", user_type="driver", school=other)
+        for index in range(5):
+            Location.objects.create(
+                driver=driver, latitude=Decimal("28.6"), longitude=Decimal("77.2"),
+                idempotency_key=str(index), is_active=index == 4
+            )
+
+        call_command(
+            "move_school", "modern", "tenant1", "--wait", "0", "--chunk-size", "2", "--delete-source", stdout=StringIO()
+        )
+
+        other.refresh_from_db()
+        self.assertEqual(other.database, "tenant1")
+        self.assertFalse(Location.objects.using(DEFAULT_DB_ALIAS).exists())
+        moved = Location.objects.using("tenant1").filter(driver=driver)
+        self.assertEqual(moved.count(), 5)
+        self.assertEqual(set(moved.values_list("school_id", flat=True)), {other.pk})
+        self.assertEqual(moved.filter(is_active=True).get().idempotency_key, "4")
+
+    def test_move_school_copy_can_be_rerun(self):
+        other = School.objects.create(name="Modern School", slug="modern")
+        driver = User.objects.create(phone_number="+919876543302", user_type="driver", school=other)
+        for index in range(5):
+            # update_location points carry no idempotency key
+            Location.objects.create(driver=driver, latitude=Decimal("28.6"), longitude=Decimal("77.2"))
+        command = move_school.Command()
+
+        first, _ = command.copy(other, [driver.pk], DEFAULT_DB_ALIAS, "tenant1", 0, 2)
+        again, _ = command.copy(other, [driver.pk], DEFAULT_DB_ALIAS, "tenant1", 0, 2)
+
+        self.assertEqual((first, again), (5, 0))
+        self.assertEqual(Location.objects.using("tenant1").filter(driver=driver).count(), 5)
+
+
+class FastJSONRendererTests(TestCase):
+    def test_matches_drf_json_renderer(self):
+        Point = namedtuple("Point", ["latitude", "longitude"])
+        data = {
+            "decimal": Decimal("28.612345"),
+            "datetime": datetime.datetime(2026, 10, 18, 7, 0, 1, 250000, tzinfo=datetime.timezone.utc),
+            "date": datetime.date(2026, 10, 18),
+            "point": Point(28.6, 77.2),
+            "lazy": gettext_lazy("Location updated"),
+            "text": "Priya \u2028 ड्राइवर",
+            1: None,
+        }
+
+        fast = renderers.FastJSONRenderer().render(data)
+
+        self.assertEqual(json.loads(fast), json.loads(JSONRenderer().render(data)))
+        self.assertIn(b"\\u2028", fast)
+
+    def test_indented_output_falls_back(self):
+        rendered = renderers.FastJSONRenderer().render({"a": 1}, "application/json; indent=4")
+        self.assertEqual(rendered, b'{\n    "a": 1\n}')
+
+
+class CompressionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.driver = User.objects.create(phone_number="+919876543210", user_type="driver", first_name="Ravi")
+        for i in range(50):
+            Location.objects.create(driver=self.driver, latitude=Decimal("28.6") + i, longitude=Decimal("77.2"))
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=self.driver).key}")
+
+    def test_choose_encoding(self):
+        self.assertEqual(compression.choose_encoding("gzip, deflate"), "gzip")
+        self.assertEqual(compression.choose_encoding("gzip;q=0, deflate"), None)
+        self.assertEqual(compression.choose_encoding("*"), "br" if compression.brotli else "gzip")
+        self.assertEqual(compression.choose_encoding("br;q=0.5, gzip"), "gzip")
+        self.assertEqual(compression.choose_encoding(""), None)
+
+    def test_large_json_is_gzipped(self):
+        plain = self.client.get("/api/locations/location-history/")
+        response = self.client.get("/api/locations/location-history/", HTTP_ACCEPT_ENCODING="gzip")
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertLess(len(response.content), len(plain.content) / 4)
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+    def test_small_responses_are_not_compressed(self):
+        response = self.client.get("/api/locations/driver-location/", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertFalse(response.has_header("Content-Encoding"))
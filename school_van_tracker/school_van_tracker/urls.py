@@ -22,5 +22,6 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/auth/', include('accounts.urls')),
     path('api/locations/', include('locations.urls')),
+    path('api/notifications/', include('notifications.urls')),
     path('api/', include('rest_framework.urls')),
 ]